@@ -0,0 +1,167 @@
+# app/backend/benchmarks/agent_tier_benchmark.py
+"""
+Per-stage latency of the agent pipeline under different model tier maps.
+
+Usage (from the repository root):
+    python -m app.backend.benchmarks.agent_tier_benchmark [--tiers baseline,mini-light-stages] [--profile full] [--topics 4]
+
+A tier map assigns models to stages exactly like the AGENT_STAGE_MODELS setting (stage output
+key -> model id, or an object with "model" plus options such as "api_base"); stages without an
+entry use AGENT_DEFAULT_MODEL. Named maps are read from benchmarks/model_tiers.json.
+
+Every tier runs the same topics (the formulas of benchmarks/corpus/formulas.json, so OCR is
+not part of the measurement) through a freshly built pipeline and reports, per stage, the model,
+p50/p95 latency and mean prompt/completion tokens, plus end-to-end pipeline latency. Stage
+timings come from the same StageMetricsRecorder the service stores per job.
+
+This calls the configured LLM APIs (OPENAI_API_KEY etc.) and is not free.
+Results are written as JSON (default benchmarks/results/agent-tiers-<timestamp>.json).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.backend.benchmarks.bench_utils import percentile
+from app.backend.config import settings
+from app.backend.services.agent_stage_cache import stage_model_name
+from app.backend.services.llm_http_client import llm_http_client
+from app.backend.services.root_agent.agent import PIPELINE_PROFILES, build_root_agent
+from app.backend.services.stage_metrics import StageMetricsRecorder
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCHMARKS_DIR / "results"
+TIERS_PATH = BENCHMARKS_DIR / "model_tiers.json"
+FORMULAS_PATH = BENCHMARKS_DIR / "corpus" / "formulas.json"
+APP_NAME = "agent-tier-benchmark"
+
+
+def _load_topics(count: int) -> list[str]:
+    formulas = json.loads(FORMULAS_PATH.read_text(encoding="utf-8"))["formulas"]
+    return [formula["text"] for formula in formulas[:count]]
+
+
+async def _run_pipeline(runner: Runner, session_service: InMemorySessionService, recorder: StageMetricsRecorder, run_id: str, topic: str):
+    session_service.create_session(app_name=APP_NAME, user_id=run_id, session_id=run_id, state={"topic": topic, "user_prompt": ""})
+    try:
+        message = types.Content(role="user", parts=[types.Part(text=f"Process this image with text: {topic}. User prompt: ")])
+        async for event in runner.run_async(user_id=run_id, session_id=run_id, new_message=message):
+            recorder.observe(event)
+    finally:
+        session_service.delete_session(app_name=APP_NAME, user_id=run_id, session_id=run_id)
+
+
+def _summarize(stage_records: dict[str, list[dict]], models: dict[str, str]) -> list[dict]:
+    summary = []
+    for stage, records in stage_records.items():
+        durations = [r["duration_ms"] for r in records if r["duration_ms"] is not None]
+        prompt_tokens = [r["prompt_tokens"] for r in records if r["prompt_tokens"] is not None]
+        completion_tokens = [r["completion_tokens"] for r in records if r["completion_tokens"] is not None]
+        summary.append({
+            "stage": stage,
+            "model": models.get(stage),
+            "runs": len(records),
+            "llm_calls": sum(r["llm_calls"] for r in records),
+            "latency_ms_p50": percentile(durations, 50),
+            "latency_ms_p95": percentile(durations, 95),
+            "prompt_tokens_mean": statistics.mean(prompt_tokens) if prompt_tokens else None,
+            "completion_tokens_mean": statistics.mean(completion_tokens) if completion_tokens else None,
+        })
+    return summary
+
+
+async def _run_tier(name: str, tier_map: dict, profile: str, topics: list[str], repeat: int) -> dict:
+    # Builders read the stage models from settings, so build the pipeline under this tier's map
+    settings.AGENT_STAGE_MODELS = json.dumps(tier_map)
+    root_agent = build_root_agent(profile)
+    output_keys = {agent.name: agent.output_key for agent in root_agent.sub_agents}
+    models = {agent.name: stage_model_name(agent) for agent in root_agent.sub_agents}
+    session_service = InMemorySessionService()
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+
+    stage_records: dict[str, list[dict]] = {agent.name: [] for agent in root_agent.sub_agents}
+    pipeline_ms, errors = [], []
+    for run in range(repeat):
+        for index, topic in enumerate(topics):
+            recorder = StageMetricsRecorder(output_keys, models)
+            started = time.perf_counter()
+            try:
+                await _run_pipeline(runner, session_service, recorder, f"{name}-{run}-{index}", topic)
+            except Exception as e:
+                errors.append({"topic": topic, "error": str(e)})
+                print(f"{name:<22} failed on {topic!r}: {e}")
+                continue
+            pipeline_ms.append((time.perf_counter() - started) * 1000)
+            for record in recorder.records():
+                stage_records.setdefault(record["stage"], []).append(record)
+
+    return {
+        "tier": name,
+        "profile": profile,
+        "stage_models": tier_map,
+        "pipelines": len(pipeline_ms),
+        "pipeline_ms_p50": percentile(pipeline_ms, 50),
+        "pipeline_ms_p95": percentile(pipeline_ms, 95),
+        "stages": _summarize(stage_records, models),
+        "errors": errors,
+    }
+
+
+async def run_benchmark(tiers: dict[str, dict], profile: str, topics: list[str], repeat: int) -> list[dict]:
+    llm_http_client.start()
+    try:
+        results = []
+        for name, tier_map in tiers.items():
+            result = await _run_tier(name, tier_map, profile, topics, repeat)
+            results.append(result)
+            print(f"\n{name}: {result['pipelines']} pipeline(s), p50 {result['pipeline_ms_p50']:.0f} ms, p95 {result['pipeline_ms_p95']:.0f} ms")
+            print(f"{'stage':<26} {'model':<32} {'p50 ms':>8} {'p95 ms':>8} {'in tok':>7} {'out tok':>7}")
+            for stage in result["stages"]:
+                print(
+                    f"{stage['stage']:<26} {str(stage['model']):<32} {stage['latency_ms_p50']:>8.0f} {stage['latency_ms_p95']:>8.0f} "
+                    f"{stage['prompt_tokens_mean'] or 0:>7.0f} {stage['completion_tokens_mean'] or 0:>7.0f}"
+                )
+        return results
+    finally:
+        await llm_http_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiers", default="baseline,mini-light-stages", help="Names from the tier file")
+    parser.add_argument("--tier-file", type=Path, default=TIERS_PATH, help="JSON object of tier name -> stage model map")
+    parser.add_argument("--profile", default="full", choices=PIPELINE_PROFILES)
+    parser.add_argument("--topics", type=int, default=4, help="Number of corpus formulas used as topics")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per topic and tier")
+    parser.add_argument("--output", type=Path, help="JSON results file (default benchmarks/results/agent-tiers-<timestamp>.json)")
+    args = parser.parse_args()
+
+    available = json.loads(args.tier_file.read_text(encoding="utf-8"))
+    names = [name.strip() for name in args.tiers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise SystemExit(f"Unknown tier(s) {unknown}; {args.tier_file} defines {list(available)}")
+    topics = _load_topics(args.topics)
+
+    print(f"{len(topics)} topic(s) x {args.repeat}, profile '{args.profile}', tiers {names}, default model {settings.AGENT_DEFAULT_MODEL}")
+    results = asyncio.run(run_benchmark({name: available[name] for name in names}, args.profile, topics, args.repeat))
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(), "default_model": settings.AGENT_DEFAULT_MODEL, "topics": topics, "repeat": args.repeat},
+        "tiers": results,
+    }
+    output = args.output or RESULTS_DIR / f"agent-tiers-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# app/backend/benchmarks/bench_utils.py
+"""Shared helpers for the OCR benchmark scripts."""
+import json
+import re
+from pathlib import Path
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so layout differences don't count as recognition errors."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,  # deletion
+                current[j - 1] + 1,  # insertion
+                previous[j - 1] + (char_a != char_b),  # substitution
+            ))
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(predicted: str, expected: str) -> float:
+    predicted, expected = normalize_text(predicted), normalize_text(expected)
+    if not expected:
+        return 0.0 if not predicted else 1.0
+    return levenshtein(predicted, expected) / len(expected)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_corpus(corpus_dir: Path) -> list[tuple[Path, bytes, str]]:
+    """
+    Loads (path, image bytes, expected text) triples.
+    The corpus directory must contain an `expected.json` mapping image file names to their text.
+    """
+    expected = json.loads((corpus_dir / "expected.json").read_text(encoding="utf-8"))
+    corpus = []
+    for file_name, text in sorted(expected.items()):
+        path = corpus_dir / file_name
+        corpus.append((path, path.read_bytes(), text))
+    if not corpus:
+        raise SystemExit(f"No images listed in {corpus_dir / 'expected.json'}")
+    return corpus
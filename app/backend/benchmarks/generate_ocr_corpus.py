@@ -0,0 +1,107 @@
+# app/backend/benchmarks/generate_ocr_corpus.py
+"""
+Renders the OCR benchmark corpus from benchmarks/corpus/formulas.json.
+
+Usage (from the repository root):
+    python -m app.backend.benchmarks.generate_ocr_corpus [--output app/backend/benchmarks/corpus/images] [--font path/to/font.ttf]
+
+Every formula is rendered in three variants that mimic what users upload:
+  clean  - a crisp screenshot-like PNG
+  photo  - a large, slightly rotated, noisy and blurred JPEG with paper-coloured margins
+  small  - a low-resolution, heavily compressed JPEG
+Rendering is seeded, so the same manifest and font always produce the same images.
+The output directory gets an `expected.json` in the format bench_utils.load_corpus expects.
+"""
+import argparse
+import io
+import json
+import random
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+MANIFEST_PATH = CORPUS_DIR / "formulas.json"
+DEFAULT_OUTPUT_DIR = CORPUS_DIR / "images"
+DEFAULT_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+)
+
+
+def _load_font(font_path: str | None, size: int) -> ImageFont.ImageFont:
+    for candidate in [font_path] if font_path else DEFAULT_FONTS:
+        if candidate and Path(candidate).exists():
+            return ImageFont.truetype(candidate, size)
+    if font_path:
+        raise SystemExit(f"Font not found: {font_path}")
+    return ImageFont.load_default(size=size)  # Pillow >= 10.1 ships a scalable default font
+
+
+def _render_text(text: str, font: ImageFont.ImageFont, padding: int) -> Image.Image:
+    probe = ImageDraw.Draw(Image.new("L", (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), text, font=font, spacing=font.size // 2)
+    image = Image.new("L", (right - left + 2 * padding, bottom - top + 2 * padding), 255)
+    ImageDraw.Draw(image).multiline_text((padding - left, padding - top), text, fill=0, font=font, spacing=font.size // 2)
+    return image
+
+
+def _encode(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def _photo_variant(text: str, font_path: str | None, rng: random.Random) -> bytes:
+    image = _render_text(text, _load_font(font_path, 96), padding=48).convert("RGB")
+    # Paper-coloured margins around the text, like a photo of a worksheet
+    paper = (rng.randint(225, 245), rng.randint(220, 240), rng.randint(200, 225))
+    canvas = Image.new("RGB", (image.width + 600, image.height + 500), paper)
+    canvas.paste(image, (rng.randint(200, 400), rng.randint(150, 350)))
+    canvas = canvas.rotate(rng.uniform(-4, 4), resample=Image.Resampling.BICUBIC, expand=True, fillcolor=paper)
+    noise = Image.effect_noise(canvas.size, 18).convert("RGB")
+    canvas = Image.blend(canvas, noise, 0.08).filter(ImageFilter.GaussianBlur(1.2))
+    # Upscale to phone-camera resolution
+    scale = 3000 / max(canvas.size)
+    canvas = canvas.resize((round(canvas.width * scale), round(canvas.height * scale)), Image.Resampling.BICUBIC)
+    return _encode(canvas, "JPEG", quality=70)
+
+
+def _variants(text: str, font_path: str | None, rng: random.Random) -> dict[str, bytes]:
+    clean = _render_text(text, _load_font(font_path, 48), padding=32)
+    small = _render_text(text, _load_font(font_path, 20), padding=12)
+    return {
+        "clean.png": _encode(clean, "PNG"),
+        "photo.jpg": _photo_variant(text, font_path, rng),
+        "small.jpg": _encode(small, "JPEG", quality=40),
+    }
+
+
+def generate_corpus(output_dir: Path = DEFAULT_OUTPUT_DIR, font_path: str | None = None) -> Path:
+    """Renders all manifest formulas into `output_dir` and writes its expected.json."""
+    manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    rng = random.Random(manifest["seed"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    expected = {}
+    for formula in manifest["formulas"]:
+        for suffix, data in _variants(formula["text"], font_path, rng).items():
+            file_name = f"{formula['name']}_{suffix}"
+            (output_dir / file_name).write_bytes(data)
+            expected[file_name] = formula["text"]
+    (output_dir / "expected.json").write_text(json.dumps(expected, indent=2, sort_keys=True), encoding="utf-8")
+    print(f"Rendered {len(expected)} image(s) into {output_dir}")
+    return output_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--font", help="TrueType font to render with (default: DejaVu Sans / Arial if installed)")
+    args = parser.parse_args()
+    generate_corpus(args.output, args.font)
+
+
+if __name__ == "__main__":
+    main()
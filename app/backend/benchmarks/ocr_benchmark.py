@@ -0,0 +1,228 @@
+# app/backend/benchmarks/ocr_benchmark.py
+"""
+OCR latency, throughput, memory and accuracy benchmark over the fixed formula corpus.
+
+Usage (from the repository root):
+    python -m app.backend.benchmarks.ocr_benchmark [--backends easyocr,onnx] [--preprocess default,raw] [--workers 1,2,4]
+
+For every OCR backend (services/ocr_backends.py) and preprocessing configuration
+(PREPROCESS_CONFIGS below) it reports, per image and end to end (preprocessing + recognition,
+like run_ocr in the service):
+  - p50/p95 latency on one warmed reader,
+  - character error rate against the corpus' expected text,
+  - peak resident memory of the process that ran the backend,
+and, for the service's default preprocessing, throughput in images/s with N worker processes.
+
+Each backend runs in a fresh process so peak memory isn't inflated by earlier backends.
+Results are written as JSON (default benchmarks/results/ocr-<timestamp>.json) for trend tracking.
+The corpus is rendered from benchmarks/corpus/formulas.json on first use (generate_ocr_corpus.py).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.backend.benchmarks.bench_utils import character_error_rate, load_corpus, percentile
+from app.backend.benchmarks.generate_ocr_corpus import DEFAULT_OUTPUT_DIR, MANIFEST_PATH, generate_corpus
+from app.backend.services.ocr_backends import OCR_BACKEND_LABELS, OCR_BACKENDS
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Overrides on top of settings.OCR_* (see ocr_preprocessing.build_preprocess_options)
+PREPROCESS_CONFIGS = {
+    "default": {},
+    "raw": {"enabled": False},
+    "edge_2400": {"max_long_edge": 2400},
+    "edge_1200": {"max_long_edge": 1200},
+    "edge_960": {"max_long_edge": 960},
+    "color": {"grayscale": False},
+    "no_autocrop": {"autocrop": False},
+    "deskew": {"deskew": True},
+}
+
+# Per-process state of the benchmark workers
+_reader = None
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _init_worker(backend: str, threads: int):
+    global _reader
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        import torch
+        torch.set_num_threads(threads)
+    from app.backend.config import settings
+    from app.backend.services.ocr_backends import create_reader
+    _reader = create_reader(settings.ocr_languages_list, gpu=False, backend=backend)
+
+
+def _ocr_text(image_bytes: bytes, overrides: dict) -> tuple[str, float]:
+    """End-to-end OCR of one image on this process' reader; returns (text, preprocess seconds)."""
+    from app.backend.services.ocr_preprocessing import build_preprocess_options, preprocess_image
+    started = time.perf_counter()
+    image = preprocess_image(image_bytes, build_preprocess_options(**overrides))
+    preprocess_seconds = time.perf_counter() - started
+    # Joined the same way as ocr_service._recognize_with_cache
+    return " ".join(text for _, text, _ in _reader.readtext(image)), preprocess_seconds
+
+
+def _latency_run(backend: str, threads: int, configs: dict[str, dict], corpus_dir: str, repeat: int) -> dict:
+    """Runs in a fresh process: loads the backend, then times every config over the corpus."""
+    started = time.perf_counter()
+    _init_worker(backend, threads)
+    load_seconds = time.perf_counter() - started
+
+    corpus = load_corpus(Path(corpus_dir))
+    results = []
+    for config_name, overrides in configs.items():
+        latencies, preprocess_latencies, errors = [], [], []
+        for _, image_bytes, expected in corpus:
+            # Warm-up run, not timed; OCR is deterministic, so its text is the one scored
+            text, _ = _ocr_text(image_bytes, overrides)
+            errors.append(character_error_rate(text, expected))
+            for _ in range(repeat):
+                started = time.perf_counter()
+                _, preprocess_seconds = _ocr_text(image_bytes, overrides)
+                latencies.append((time.perf_counter() - started) * 1000)
+                preprocess_latencies.append(preprocess_seconds * 1000)
+        results.append({
+            "backend": backend,
+            "backend_label": OCR_BACKEND_LABELS[backend],
+            "preprocess": config_name,
+            "images": len(corpus),
+            "latency_ms_mean": round(statistics.mean(latencies), 2),
+            "latency_ms_p50": round(percentile(latencies, 50), 2),
+            "latency_ms_p95": round(percentile(latencies, 95), 2),
+            "preprocess_ms_mean": round(statistics.mean(preprocess_latencies), 2),
+            "cer_mean": round(statistics.mean(errors), 4),
+            "cer_max": round(max(errors), 4),
+        })
+    return {"load_seconds": round(load_seconds, 2), "peak_rss_mib": _peak_rss_mib(), "results": results}
+
+
+def _throughput_task(image_bytes: bytes, overrides: dict) -> float:
+    _ocr_text(image_bytes, overrides)
+    return _peak_rss_mib()
+
+
+def _throughput_run(backend: str, workers: int, corpus: list, overrides: dict, repeat: int) -> dict:
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(backend, threads),
+    ) as pool:
+        # Load the models in every worker before the clock starts
+        list(pool.map(_throughput_task, [corpus[0][1]] * workers, [overrides] * workers))
+        tasks = [image_bytes for _ in range(repeat) for _, image_bytes, _ in corpus]
+        started = time.perf_counter()
+        peaks = list(pool.map(_throughput_task, tasks, [overrides] * len(tasks)))
+        wall_seconds = time.perf_counter() - started
+    return {
+        "backend": backend,
+        "backend_label": OCR_BACKEND_LABELS[backend],
+        "preprocess": "default",
+        "workers": workers,
+        "torch_threads_per_worker": threads,
+        "images": len(tasks),
+        "wall_seconds": round(wall_seconds, 2),
+        "images_per_second": round(len(tasks) / wall_seconds, 2),
+        "peak_rss_mib_per_worker_max": max(peaks),
+    }
+
+
+def _metadata(corpus_dir: Path, corpus: list, args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    versions = {}
+    for package in ("easyocr", "torch", "onnxruntime", "cv2", "PIL"):
+        try:
+            versions[package] = __import__(package).__version__
+        except Exception:
+            versions[package] = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "corpus": {"dir": str(corpus_dir), "manifest": str(MANIFEST_PATH), "images": len(corpus)},
+        "repeat": args.repeat,
+        "threads": args.threads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_OUTPUT_DIR, help="Directory with images and expected.json")
+    parser.add_argument("--backends", default=",".join(OCR_BACKENDS))
+    parser.add_argument("--preprocess", default=",".join(PREPROCESS_CONFIGS), help="Names from PREPROCESS_CONFIGS")
+    parser.add_argument("--workers", default="1,2,4", help="Worker counts for the throughput run; empty to skip")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per image (after one warm-up run)")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads for the latency run (0 = torch default)")
+    parser.add_argument("--output", type=Path, help="JSON results file (default benchmarks/results/ocr-<timestamp>.json)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if not (args.corpus / "expected.json").exists():
+        generate_corpus(args.corpus)
+    corpus = load_corpus(args.corpus)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    configs = {name: PREPROCESS_CONFIGS[name] for name in [c.strip() for c in args.preprocess.split(",") if c.strip()]}
+    worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+
+    report = {"meta": _metadata(args.corpus, corpus, args), "latency": [], "throughput": [], "backends": {}, "skipped": []}
+    print(f"{len(corpus)} image(s), backends {backends}, preprocessing {list(configs)}")
+    print(f"{'backend':<14} {'preprocess':<12} {'p50 ms':>8} {'p95 ms':>8} {'CER':>7}")
+    for backend in backends:
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                run = pool.submit(_latency_run, backend, args.threads, configs, str(args.corpus), args.repeat).result()
+        except Exception as e:
+            print(f"{backend:<14} skipped: {e}")
+            report["skipped"].append({"backend": backend, "error": str(e)})
+            continue
+        report["backends"][backend] = {"label": OCR_BACKEND_LABELS[backend], "load_seconds": run["load_seconds"], "peak_rss_mib": run["peak_rss_mib"]}
+        report["latency"].extend(run["results"])
+        for result in run["results"]:
+            print(
+                f"{backend:<14} {result['preprocess']:<12} {result['latency_ms_p50']:>8.1f} "
+                f"{result['latency_ms_p95']:>8.1f} {result['cer_mean']:>7.3f}"
+            )
+        print(f"{backend:<14} ({OCR_BACKEND_LABELS[backend]}) load {run['load_seconds']:.1f}s, peak RSS {run['peak_rss_mib']:.0f} MiB")
+
+        for workers in worker_counts:
+            throughput = _throughput_run(backend, workers, corpus, PREPROCESS_CONFIGS["default"], args.repeat)
+            report["throughput"].append(throughput)
+            print(
+                f"{backend:<14} {workers} worker(s): {throughput['images_per_second']:.2f} images/s, "
+                f"peak RSS/worker {throughput['peak_rss_mib_per_worker_max']:.0f} MiB"
+            )
+
+    output = args.output or RESULTS_DIR / f"ocr-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# app/backend/benchmarks/ocr_memory_report.py
+"""
+Per-worker memory of the API under gunicorn, with and without OCR_PRELOAD_MODELS.
+
+Usage (from the repository root, Linux only; needs the usual .env / DATABASE_URL):
+    python -m app.backend.benchmarks.ocr_memory_report --workers 8 --output memory_report.json
+
+For each mode the script starts gunicorn with app/backend/gunicorn.conf.py, waits until the
+workers have loaded their OCR models, then reads /proc/<pid>/smaps_rollup of the master and
+every worker. RSS counts shared pages in full for every process that maps them; PSS divides
+them between the sharers, so the PSS sum is the real memory cost of the whole server.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+GUNICORN_CONF = Path(__file__).resolve().parent.parent / "gunicorn.conf.py"
+
+
+def read_smaps_rollup(pid: int) -> dict[str, int]:
+    """Memory counters of a process in KiB (Rss, Pss, Shared_Clean, Private_Dirty, ...)."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values
+
+
+def child_pids(pid: int) -> list[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_ready(port: int, workers: int, timeout: float):
+    """Polls /health until enough consecutive answers (spread over the workers) report OCR ready."""
+    deadline = time.monotonic() + timeout
+    healthy_in_a_row = 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5) as response:
+                healthy = json.load(response).get("ocr_ready", False)
+        except Exception:
+            healthy = False
+        healthy_in_a_row = healthy_in_a_row + 1 if healthy else 0
+        if healthy_in_a_row >= workers * 4:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"Workers did not report OCR ready within {timeout}s")
+
+
+def measure(preload: bool, workers: int, port: int, settle_seconds: float, timeout: float) -> dict:
+    env = dict(
+        os.environ,
+        OCR_PRELOAD_MODELS=str(preload).lower(),
+        # Same OCR layout in both modes (in-process readers), so only the preload differs
+        OCR_EXECUTOR_WORKERS="0",
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+    )
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(GUNICORN_CONF), "app.backend.main:app"],
+        env=env,
+    )
+    try:
+        wait_until_ready(port, workers, timeout)
+        time.sleep(settle_seconds)
+        worker_pids = child_pids(master.pid)
+        master_mem = read_smaps_rollup(master.pid)
+        worker_mems = {pid: read_smaps_rollup(pid) for pid in worker_pids}
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+    def mib(kib: int) -> float:
+        return round(kib / 1024, 1)
+
+    return {
+        "preload": preload,
+        "workers": len(worker_mems),
+        "master": {"pid": master.pid, "rss_mib": mib(master_mem.get("Rss", 0)), "pss_mib": mib(master_mem.get("Pss", 0))},
+        "per_worker": [
+            {
+                "pid": pid,
+                "rss_mib": mib(mem.get("Rss", 0)),
+                "pss_mib": mib(mem.get("Pss", 0)),
+                "shared_mib": mib(mem.get("Shared_Clean", 0) + mem.get("Shared_Dirty", 0)),
+                "private_mib": mib(mem.get("Private_Clean", 0) + mem.get("Private_Dirty", 0)),
+            }
+            for pid, mem in worker_mems.items()
+        ],
+        "total_rss_mib": mib(master_mem.get("Rss", 0) + sum(mem.get("Rss", 0) for mem in worker_mems.values())),
+        "total_pss_mib": mib(master_mem.get("Pss", 0) + sum(mem.get("Pss", 0) for mem in worker_mems.values())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle-seconds", type=float, default=5.0, help="Wait after the workers are ready before measuring")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    reports = [measure(preload, args.workers, args.port, args.settle_seconds, args.timeout) for preload in (False, True)]
+
+    print(f"{'mode':<12} {'workers':>7} {'worker RSS avg':>15} {'worker PSS avg':>15} {'total RSS':>10} {'total PSS':>10}")
+    for report in reports:
+        per_worker = report["per_worker"] or [{"rss_mib": 0, "pss_mib": 0}]
+        print(
+            f"{'preload' if report['preload'] else 'no preload':<12} {report['workers']:>7} "
+            f"{sum(w['rss_mib'] for w in per_worker) / len(per_worker):>12.1f} MiB "
+            f"{sum(w['pss_mib'] for w in per_worker) / len(per_worker):>12.1f} MiB "
+            f"{report['total_rss_mib']:>6.0f} MiB {report['total_pss_mib']:>6.0f} MiB"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(reports, indent=2))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
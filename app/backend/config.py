@@ -9,6 +9,16 @@ import json
 load_dotenv()
 # Remove redundant startup prints from here, main.py will handle them
 
+def _parse_token_budgets(value: str) -> dict[str, int]:
+    """Parses a JSON object of stage -> token budget; invalid input or non-positive budgets mean no budget."""
+    try:
+        parsed = json.loads(value) if value else {}
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {str(stage): int(tokens) for stage, tokens in parsed.items() if isinstance(tokens, (int, float)) and tokens > 0}
+
 class Settings(BaseSettings):
     """
     Application settings loaded from environment variables with defaults.
@@ -28,6 +38,85 @@ class Settings(BaseSettings):
     # Optional: AI API settings
     GEMINI_API_KEY: Optional[str] = None # Renamed from GOOGLE_API_KEY to match common naming
 
+    # Agent pipeline settings
+    AGENT_LLM_BACKEND: str = "litellm"  # litellm | stub (offline canned outputs, services/stub_llm.py; no API key or network needed)
+    AGENT_STUB_LATENCY_DISTRIBUTION: str = "lognormal"  # constant | uniform (±50%) | lognormal
+    AGENT_STUB_LATENCY_MS: float = 400.0  # Per-call latency: the value (constant), mean (uniform) or median (lognormal)
+    AGENT_STUB_LATENCY_SIGMA: float = 0.5  # Shape of the lognormal tail
+    AGENT_STUB_STAGE_LATENCY_MS: str = "{}"  # JSON map of stage output key -> latency overriding AGENT_STUB_LATENCY_MS
+    AGENT_STUB_FAILURE_RATE: float = 0.0  # Probability that a stub call raises
+    AGENT_STUB_SEED: Optional[int] = None  # Set for a reproducible latency/failure sequence per stage
+    AGENT_DEFAULT_MODEL: str = "openai/gpt-4o"  # LiteLLM model id of every stage without an entry in AGENT_STAGE_MODELS
+    # JSON map of stage output key -> LiteLLM model id, or an object with "model" plus LiteLLM call options
+    # such as "api_base"/"api_key" (e.g. a local OpenAI-compatible endpoint), e.g.
+    # {"concepts": "openai/gpt-4o-mini", "review_comments": {"model": "openai/llama3.1", "api_base": "http://localhost:11434/v1"}}
+    AGENT_STAGE_MODELS: str = "{}"
+    AGENT_STREAM_TOKENS: bool = True  # Stream LLM output to WebSocket subscribers as "stream_delta" frames
+    AGENT_STREAM_FLUSH_INTERVAL_MS: int = 100  # Coalesce deltas into one frame per interval...
+    AGENT_STREAM_FLUSH_BYTES: int = 512  # ...or as soon as this much text is buffered
+    AGENT_STAGE_CACHE_ENABLED: bool = True  # Memoize stage outputs by (topic, prompt, stage, model, instruction)
+    AGENT_STAGE_CACHE_MEMORY_ENTRIES: int = 1024  # Size of the in-process LRU tier
+    AGENT_STAGE_CACHE_PERSISTENT: bool = True  # Also store outputs in the agent_stage_cache_entries table
+    AGENT_STAGE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 0 = entries never expire
+    AGENT_STAGE_CACHE_MAX_ENTRIES: int = 100_000  # Rows kept in the persistent tier (oldest pruned first)
+    AGENT_STAGE_CACHE_VERSION: str = "1"  # Bump to invalidate all cached stage outputs
+    AGENT_STATIC_VALIDATION_ENABLED: bool = True  # Only run the LLM review/refactor stages when the Manim code validator finds problems
+    AGENT_CONTEXT_PRUNING_ENABLED: bool = True  # Trim upstream outputs injected into stage prompts to AGENT_STAGE_MAX_CONTEXT_TOKENS
+    # Per-stage budgets as JSON maps keyed by the stage's output key; token counts are estimated (4 chars/token)
+    AGENT_STAGE_MAX_CONTEXT_TOKENS: str = '{"concepts": 1500, "storyboard": 1000, "enhanced_storyboard": 1500, "generated_code": 2500, "review_comments": 3000, "refactored_code": 4000, "fixed_code": 4000}'
+    # Completion caps truncate outputs mid-way (e.g. code that no longer parses), so none are set by default;
+    # e.g. '{"explanation": 1500, "generated_code": 8000}' caps only those stages
+    AGENT_STAGE_MAX_OUTPUT_TOKENS: str = '{}'
+    # Shared LLM HTTP client (services/llm_http_client.py)
+    LLM_HTTP_MAX_CONNECTIONS: int = 100  # Concurrent connections to the LLM API per worker process
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    LLM_HTTP_TIMEOUT_SECONDS: float = 120.0
+    LLM_HTTP2_ENABLED: bool = True  # Used only if the 'h2' package is installed
+    LLM_HTTP_PREWARM_URLS: str = "https://api.openai.com/v1/models"  # Comma-separated; the api_base of every AGENT_STAGE_MODELS entry is pre-warmed too
+    LLM_HTTP_PREWARM_CONNECTIONS: int = 4  # Connections opened per URL at startup (1 with HTTP/2); 0 disables pre-warming
+    MANIM_REPAIR_MAX_ATTEMPTS: int = 2  # Fixer-agent repairs of code that failed to render; 0 disables the repair loop
+    MANIM_TRACEBACK_MAX_CHARS: int = 2000  # Tail of the Manim traceback kept in manim_error and sent to the fixer
+    AGENT_TOPIC_SIMILARITY_ENABLED: bool = True  # Reuse explanation/concepts/storyboard of near-identical topics
+    AGENT_TOPIC_SIMILARITY_THRESHOLD: float = 0.8  # Min estimated Jaccard similarity of the topics' character 3-grams
+    AGENT_TOPIC_SIMILARITY_NUM_PERM: int = 64  # MinHash permutations (signature length)
+    AGENT_TOPIC_SIMILARITY_MAX_ENTRIES: int = 200_000  # ~530 bytes each, in memory per worker (~105 MB per worker at 200k)
+
+    # Image upload settings (POST /jobs/upload)
+    UPLOAD_DIR: str = ""  # Defaults to app/backend/uploads
+    MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_RETENTION_DAYS: int = 7  # Stored uploads unused for this long are deleted (0 keeps them; the directory then grows with every distinct image)
+
+    # OCR settings
+    OCR_LANGUAGES: str = "en"  # Comma-separated EasyOCR language codes, e.g. "en,de"
+    OCR_USE_GPU: bool = False
+    OCR_BACKEND: str = "easyocr_int8"  # easyocr (fp32) | easyocr_int8 | onnx | onnx_int8 (see services/ocr_backends.py); easyocr_int8 matches EasyOCR's own CPU default
+    OCR_ONNX_MODEL_DIR: str = ""  # Where exported ONNX models are cached; defaults to app/backend/ocr_models/onnx
+    OCR_READER_POOL_SIZE: int = 1  # Preloaded EasyOCR readers kept warm for in-process OCR; only applies with OCR_EXECUTOR_WORKERS=0 (or OCR_PRELOAD_MODELS), each OCR worker process holds exactly one
+    OCR_READER_CHECKOUT_TIMEOUT_SECONDS: float = 60.0
+    OCR_EXECUTOR_WORKERS: int = 2  # OCR worker processes; 0 runs OCR in a thread of the API process
+    OCR_PRELOAD_MODELS: bool = False  # Load OCR models once in the gunicorn master and share them copy-on-write (see gunicorn.conf.py); implies OCR_EXECUTOR_WORKERS=0
+    OCR_TORCH_THREADS_PER_WORKER: int = 0  # 0 = cpu_count // OCR_EXECUTOR_WORKERS
+    OCR_MAX_QUEUED_JOBS: int = 8  # OCR calls allowed to wait for a worker before POST /jobs answers 429
+    OCR_RETRY_AFTER_SECONDS: int = 5  # Retry-After hint used until OCR timings are known
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_MEMORY_ENTRIES: int = 512  # Size of the in-process LRU tier
+    OCR_CACHE_PERSISTENT: bool = True  # Also store results in the ocr_cache_entries table
+    OCR_CACHE_VERSION: str = "1"  # Bump to invalidate all cached OCR results
+    OCR_PREPROCESS_ENABLED: bool = True
+    OCR_MAX_LONG_EDGE: int = 1600  # Long edge cap in pixels before detection; 0 = no cap
+    OCR_GRAYSCALE: bool = True
+    OCR_AUTOCROP: bool = True  # Trim blank borders
+    OCR_DESKEW: bool = False
+    OCR_TILE_PARALLEL: bool = False  # Detect once, then fan region recognition out across OCR workers
+    OCR_TILE_PARALLEL_MIN_REGIONS: int = 8  # Below this many text regions, recognize in the detecting worker
+    OCR_PHASH_ENABLED: bool = True  # Reuse OCR text of near-duplicate uploads (perceptual hash)
+    OCR_PHASH_MAX_DISTANCE: int = 6  # Max Hamming distance (of 64 bits) that counts as the same image
+    OCR_PHASH_INDEX_MAX_ENTRIES: int = 1_000_000  # ~100 bytes each, in memory per worker (each gunicorn worker loads its own copy)
+    OCR_PHASH_REUSE_PIPELINE_OUTPUT: bool = False  # Also reuse a completed near-duplicate job's outputs (same prompt)
+    OCR_BATCH_MAX_IMAGES: int = 32  # Max images per POST /jobs/batch request
+    OCR_RECOGNIZER_BATCH_SIZE: int = 8  # Text crops recognized together by readtext_batched
+
     @property
     def VERSIONED_API_PREFIX(self) -> str:
         """Constructs the versioned API prefix, e.g., /api/v1."""
@@ -47,7 +136,57 @@ class Settings(BaseSettings):
             except json.JSONDecodeError:
                 pass
         return [origin.strip() for origin in self.CORS_ORIGINS.split(',') if origin.strip()]
-    
+
+    @property
+    def ocr_languages_list(self) -> List[str]:
+        """Parse OCR_LANGUAGES from string to list when accessed."""
+        return [lang.strip() for lang in self.OCR_LANGUAGES.split(',') if lang.strip()] or ["en"]
+
+    @property
+    def llm_http_prewarm_urls_list(self) -> List[str]:
+        """LLM_HTTP_PREWARM_URLS plus each distinct api_base configured in AGENT_STAGE_MODELS, in order."""
+        urls = [url.strip() for url in self.LLM_HTTP_PREWARM_URLS.split(',') if url.strip()]
+        urls += [str(spec["api_base"]).strip() for spec in self.agent_stage_models.values() if spec.get("api_base")]
+        return list(dict.fromkeys(urls))
+
+    @property
+    def agent_stage_models(self) -> dict[str, dict[str, Any]]:
+        """Parse AGENT_STAGE_MODELS into stage output key -> LiteLlm keyword arguments (always including "model")."""
+        try:
+            parsed = json.loads(self.AGENT_STAGE_MODELS) if self.AGENT_STAGE_MODELS else {}
+        except json.JSONDecodeError as e:
+            raise ValueError(f"AGENT_STAGE_MODELS is not valid JSON: {e}")
+        if not isinstance(parsed, dict):
+            raise ValueError("AGENT_STAGE_MODELS must be a JSON object of stage output key -> model")
+        models = {}
+        for stage, spec in parsed.items():
+            spec = {"model": spec} if isinstance(spec, str) else dict(spec)
+            if not spec.get("model"):
+                raise ValueError(f"AGENT_STAGE_MODELS entry for '{stage}' has no model")
+            models[str(stage)] = spec
+        return models
+
+    @property
+    def agent_stub_stage_latency_ms(self) -> dict[str, float]:
+        """Parse AGENT_STUB_STAGE_LATENCY_MS (JSON object of stage output key -> ms) when accessed."""
+        try:
+            parsed = json.loads(self.AGENT_STUB_STAGE_LATENCY_MS) if self.AGENT_STUB_STAGE_LATENCY_MS else {}
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        return {str(stage): float(ms) for stage, ms in parsed.items() if isinstance(ms, (int, float)) and ms >= 0}
+
+    @property
+    def agent_stage_max_context_tokens(self) -> dict[str, int]:
+        """Parse AGENT_STAGE_MAX_CONTEXT_TOKENS (JSON object of stage output key -> tokens) when accessed."""
+        return _parse_token_budgets(self.AGENT_STAGE_MAX_CONTEXT_TOKENS)
+
+    @property
+    def agent_stage_max_output_tokens(self) -> dict[str, int]:
+        """Parse AGENT_STAGE_MAX_OUTPUT_TOKENS (JSON object of stage output key -> tokens) when accessed."""
+        return _parse_token_budgets(self.AGENT_STAGE_MAX_OUTPUT_TOKENS)
+
     # Keep validator for CORS_ORIGINS if it serves a purpose for manual instantiation
     # For Pydantic V2, @field_validator is preferred over @validator
     @field_validator("CORS_ORIGINS", mode='before')
@@ -0,0 +1,54 @@
+# app/backend/gunicorn.conf.py
+"""
+Gunicorn settings for running the API with several worker processes.
+
+Usage (from the repository root):
+    OCR_PRELOAD_MODELS=true gunicorn -c app/backend/gunicorn.conf.py app.backend.main:app
+
+With OCR_PRELOAD_MODELS the EasyOCR/torch weights are loaded once in the master process before
+the workers are forked, so every worker shares the same physical pages copy-on-write instead of
+holding its own copy. Each worker then runs OCR in-process (OCR_EXECUTOR_WORKERS is ignored).
+Without it every worker loads the models itself, as under plain uvicorn.
+
+Compare both modes with:
+    python -m app.backend.benchmarks.ocr_memory_report --workers 8
+"""
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Import the app in the master so the forked workers inherit it (and the preloaded OCR models)
+preload_app = True
+
+
+def _preload_enabled() -> bool:
+    from app.backend.config import settings
+    return settings.OCR_PRELOAD_MODELS
+
+
+def when_ready(server):
+    if not _preload_enabled():
+        return
+    from app.backend.services.ocr_reader_pool import ocr_reader_pool
+    # Load weights only: running inference here would start torch's OpenMP thread pool,
+    # and worker processes forked after that can deadlock on their first inference.
+    ocr_reader_pool.warm_up(run_inference=False)
+    # Move everything allocated so far out of the garbage collector's reach, so collections in
+    # the workers don't write to (and thereby un-share) the pages holding these objects.
+    gc.collect()
+    gc.freeze()
+    server.log.info("OCR models preloaded in master (pid %s); workers will share them copy-on-write.", os.getpid())
+
+
+def post_fork(server, worker):
+    if not _preload_enabled():
+        return
+    import torch
+    from app.backend.config import settings
+    from app.backend.services.ocr_reader_pool import ocr_reader_pool
+    # Split the cores between the workers instead of every worker using all of them
+    torch.set_num_threads(settings.OCR_TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // server.cfg.workers))
+    ocr_reader_pool.prime()
@@ -4,9 +4,19 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from app.backend.config import settings
 from app.backend.database import engine, Base
-from app.backend.models import agent_job
+from app.backend.models import agent_job, agent_job_stage_metric, ocr_cache_entry, agent_stage_cache_entry
 from app.backend.routes import agent_router
 from app.backend.websockets import ws_router
+from app.backend.services.ocr_reader_pool import ocr_reader_pool
+from app.backend.services.ocr_executor import ocr_executor
+from app.backend.services.ocr_cache import ocr_result_cache
+from app.backend.services.image_fingerprint import phash_index
+from app.backend.services.agent_stage_cache import agent_stage_cache
+from app.backend.services.prompt_budget import prompt_budget_stats
+from app.backend.services.llm_http_client import llm_http_client
+from app.backend.services.topic_similarity_index import topic_similarity_index
+from app.backend.services.upload_service import prune_uploads
+import asyncio
 import time
 from fastapi.staticfiles import StaticFiles
 import os
@@ -68,13 +78,52 @@ async def on_startup():
         print("Database tables created (DEBUG mode).")
     else:
         print("Database tables NOT created (production mode - use migrations).")
+    # Start the OCR workers (each warms its EasyOCR reader) in the background so startup
+    # isn't blocked; /health reports "starting" until the readers are loaded.
+    asyncio.create_task(ocr_executor.start())
+    # One pooled LLM HTTP client per worker, shared by all agents; connect to the API ahead of the first job
+    llm_http_client.start()
+    if settings.llm_http_prewarm_urls_list and settings.LLM_HTTP_PREWARM_CONNECTIONS > 0 and settings.AGENT_LLM_BACKEND != "stub":
+        asyncio.create_task(llm_http_client.warm_up(settings.llm_http_prewarm_urls_list, settings.LLM_HTTP_PREWARM_CONNECTIONS))
+    asyncio.create_task(asyncio.to_thread(prune_uploads))
+    if settings.OCR_PHASH_ENABLED:
+        asyncio.create_task(asyncio.to_thread(phash_index.load_recent_jobs))
+    if settings.AGENT_TOPIC_SIMILARITY_ENABLED:
+        asyncio.create_task(asyncio.to_thread(topic_similarity_index.load_recent_jobs))
     print("Application startup complete.")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    ocr_executor.shutdown()
+    await llm_http_client.close()
+
 # Health check endpoint
 @app.get("/health", tags=["health"])
 async def health_check():
-    """Check if the API is running."""
-    return {"status": "healthy", "version": settings.API_VERSION}
+    """Check if the API is running and the OCR readers are warmed up."""
+    ocr_ready = ocr_executor.ready
+    return {
+        "status": "healthy" if ocr_ready else "starting",
+        "version": settings.API_VERSION,
+        "ocr_ready": ocr_ready,
+    }
+
+# Metrics endpoint for sizing worker pools
+@app.get("/metrics", tags=["health"])
+async def metrics():
+    """Expose runtime metrics, e.g. OCR queue depth and reader checkout wait times."""
+    return {
+        "ocr_executor": ocr_executor.stats(),
+        # Readers are only checked out when OCR runs in-process (OCR_EXECUTOR_WORKERS=0 or OCR_PRELOAD_MODELS);
+        # OCR worker processes each own one reader, so the API process' pool would only report zeros
+        **({"ocr_reader_pool": ocr_reader_pool.stats()} if ocr_executor.workers == 0 else {}),
+        "ocr_cache": ocr_result_cache.stats(),
+        "image_phash_index": phash_index.stats(),
+        "agent_stage_cache": agent_stage_cache.stats(),
+        "prompt_budget": prompt_budget_stats.stats(),
+        "llm_http_client": llm_http_client.stats(),
+        "topic_similarity_index": topic_similarity_index.stats(),
+    }
 
 # CORS test endpoint to verify CORS headers
 @app.options("/cors-test")
@@ -6,6 +6,12 @@ class AgentJob(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     input_image_data_url = Column(Text, nullable=True)
+    # Set instead of input_image_data_url for binary uploads (POST /jobs/upload)
+    input_image_path = Column(String, nullable=True)
+    input_image_sha256 = Column(String(64), nullable=True, index=True)
+    input_image_phash = Column(String(16), nullable=True) # 64-bit dHash (hex) for near-duplicate lookup
+    user_prompt = Column(Text, nullable=True)
+    pipeline_profile = Column(String, nullable=False, default="full", server_default="full") # full | fast | text-only
     input_text = Column(Text, nullable=False)
     status = Column(String, default="pending", index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -19,6 +25,8 @@ class AgentJob(Base):
     generated_code = Column(Text, nullable=True)
     review_comments = Column(Text, nullable=True)
     refactored_code = Column(Text, nullable=True)
-    # manim_video_path = Column(String, nullable=True) # For later
+    video_url = Column(String, nullable=True)
+    render_attempts = Column(Integer, nullable=True) # Manim renders run, including fixer-agent repairs
+    repair_latency_ms = Column(Integer, nullable=True) # Time spent repairing and re-rendering after the first failed render
 
     error_message = Column(Text, nullable=True) 
\ No newline at end of file
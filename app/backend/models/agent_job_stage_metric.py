@@ -0,0 +1,20 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from app.backend.database import Base
+
+class AgentJobStageMetric(Base):
+    """Wall time and token usage of one pipeline stage of a job (see services/stage_metrics.py)."""
+    __tablename__ = "agent_job_stage_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("agent_jobs.id", ondelete="CASCADE"), index=True, nullable=False)
+    stage = Column(String, nullable=False) # Agent name, e.g. "ClearExplanationAgent", or "ManimRender"
+    attempt = Column(Integer, nullable=False, default=1) # > 1 for render repairs (CodeFixerAgent / ManimRender)
+    output_key = Column(String, nullable=True) # State key / AgentJob column the stage wrote
+    model = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True) # None when the stage made no LLM call
+    completion_tokens = Column(Integer, nullable=True)
+    llm_calls = Column(Integer, nullable=False, default=0)
+    cached = Column(Boolean, nullable=False, default=False) # Output came from the stage cache / similar-topic reuse
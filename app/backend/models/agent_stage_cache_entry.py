@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from app.backend.database import Base
+
+class AgentStageCacheEntry(Base):
+    """Persistent tier of the agent stage output cache (see services/agent_stage_cache.py)."""
+    __tablename__ = "agent_stage_cache_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Chained sha256 over (normalized topic, user prompt, stage, model, instruction hash) of this and all upstream stages
+    cache_key = Column(String(64), unique=True, index=True, nullable=False)
+    stage = Column(String, index=True, nullable=False) # Output key, e.g. "explanation"
+    model = Column(String, nullable=True)
+    output = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from app.backend.database import Base
+
+class OCRCacheEntry(Base):
+    """Persistent tier of the OCR result cache, shared by all API/OCR worker processes."""
+    __tablename__ = "ocr_cache_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 over (namespace, image hash, variant); see services/ocr_cache.py
+    cache_key = Column(String(64), unique=True, index=True, nullable=False)
+    # Identifies OCR model/languages; entries from an old namespace are never read again
+    namespace = Column(String(64), index=True, nullable=False)
+    image_sha256 = Column(String(64), index=True, nullable=False)
+    extracted_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response, Query
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
 
 from app.backend.database import get_db
 from app.backend.models.agent_job import AgentJob
-from app.backend.schemas.agent_processing import AgentProcessRequest, AgentJobInitResponse
-from app.backend.services.agent_service import process_agent_job
-from app.backend.services.ocr_service import extract_text_from_image
+from app.backend.config import settings
+from app.backend.schemas.agent_processing import (
+    CropBox,
+    PipelineProfile,
+    AgentProcessRequest,
+    AgentJobInitResponse,
+    AgentBatchProcessRequest,
+    AgentBatchItemResult,
+    AgentBatchJobInitResponse
+)
+from app.backend.services.agent_service import process_agent_job, process_agent_job_batch
+from app.backend.services.ocr_executor import ocr_executor, OCRQueueFullError
+from app.backend.services.ocr_cache import ocr_result_cache
+from app.backend.services.agent_stage_cache import agent_stage_cache
+from app.backend.services.upload_service import store_upload_stream, EmptyUploadError, UploadTooLargeError
 
 # Remove the prefix from APIRouter; it will be handled by main.py
 router = APIRouter(
@@ -54,44 +67,243 @@ async def create_agent_job(
             response.headers["Access-Control-Allow-Credentials"] = "true"
             print(f"Added CORS headers for origin: {origin} directly in /jobs POST handler")
         
+    ocr_slot = None
     try:
-        # 1. Perform OCR
-        extracted_text = await extract_text_from_image(request_data.image_data_url)
         user_prompt = request_data.user_prompt
-        print(f"--- Agent Router (/jobs): Received user_prompt: '{user_prompt}', extracted_text (first 50): '{extracted_text[:50]}' ---")
+        print(f"--- Agent Router (/jobs): Received user_prompt: '{user_prompt}', image data URL (first 50): '{request_data.image_data_url[:50]}' ---")
 
-        if not extracted_text and extracted_text != "":
-            print(f"OCR Service returned no text for image data: {request_data.image_data_url[:100]}...")
-            pass # Allow processing even if OCR fails for now
+        # 1. Reserve a place in the OCR queue now, so an overloaded server answers 429
+        #    instead of accepting jobs it can't OCR in reasonable time
+        ocr_slot = ocr_executor.reserve_slot()
 
-        # 2. Create AgentJob with original image URL and extracted text
+        # 2. Create AgentJob with the original image; OCR runs as the first stage of
+        #    the background pipeline and fills in input_text
         new_job = AgentJob(
             input_image_data_url=request_data.image_data_url,
-            input_text=extracted_text,
+            user_prompt=request_data.user_prompt,
+            pipeline_profile=request_data.pipeline_profile,
+            input_text="",
             status="PENDING"
         )
         db.add(new_job)
         db.commit()
         db.refresh(new_job)
 
-        # 3. Start agent pipeline with extracted text and user_prompt
+        # 3. Start OCR + agent pipeline in the background and return the job id immediately
         background_tasks.add_task(
             process_agent_job,
             new_job.id,
-            extracted_text,
-            user_prompt
+            user_prompt,
+            request_data.crop_box,
+            ocr_slot
         )
 
         return AgentJobInitResponse(job_id=new_job.id)
+    except OCRQueueFullError as queue_exc:
+        # OCR backlog is at capacity; tell the client when to try again instead of queueing forever
+        print(f"OCR queue full in create_agent_job, rejecting with 429: {queue_exc}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(queue_exc),
+            headers={"Retry-After": str(queue_exc.retry_after_seconds)}
+        )
     except HTTPException as http_exc:
         print(f"HTTPException in create_agent_job: {http_exc.detail}")
         raise http_exc
     except Exception as e:
         db.rollback()
+        if ocr_slot:
+            ocr_slot.release()
         print(f"Error in create_agent_job (/jobs): {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to create agent job: {str(e)}")
 
+@router.post("/jobs/upload", response_model=AgentJobInitResponse)
+async def create_agent_job_from_upload(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user_prompt: str | None = Query(None),
+    crop_x: int | None = Query(None, ge=0),
+    crop_y: int | None = Query(None, ge=0),
+    crop_width: int | None = Query(None, gt=0),
+    crop_height: int | None = Query(None, gt=0),
+    pipeline_profile: PipelineProfile = Query("full")
+):
+    """
+    Binary alternative to POST /jobs: the request body is the raw image (Content-Type: image/*),
+    other inputs are query parameters. The body is streamed to disk with a size cap instead of
+    being base64-encoded into JSON, and the OCR worker reads the stored file directly.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Request body must be an image (Content-Type: image/*).")
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {settings.MAX_UPLOAD_BYTES} bytes.")
+    if declared_length == "0":
+        raise HTTPException(status_code=400, detail="Request body is empty; send the image bytes.")
+
+    crop_values = [crop_x, crop_y, crop_width, crop_height]
+    if any(value is not None for value in crop_values) and not all(value is not None for value in crop_values):
+        raise HTTPException(status_code=422, detail="crop_x, crop_y, crop_width and crop_height must be given together.")
+    crop_box = CropBox(x=crop_x, y=crop_y, width=crop_width, height=crop_height) if crop_x is not None else None
+
+    ocr_slot = None
+    try:
+        # Reserve the OCR slot before reading the body so overloaded servers reject early
+        ocr_slot = ocr_executor.reserve_slot()
+        image_path, image_sha256, image_size = await store_upload_stream(request.stream(), content_type, settings.MAX_UPLOAD_BYTES)
+        print(f"--- Agent Router (/jobs/upload): Received user_prompt: '{user_prompt}', image of {image_size} bytes ({image_sha256[:12]}) ---")
+
+        new_job = AgentJob(
+            input_image_path=str(image_path),
+            input_image_sha256=image_sha256,
+            user_prompt=user_prompt,
+            pipeline_profile=pipeline_profile,
+            input_text="",
+            status="PENDING"
+        )
+        db.add(new_job)
+        db.commit()
+        db.refresh(new_job)
+
+        background_tasks.add_task(
+            process_agent_job,
+            new_job.id,
+            user_prompt,
+            crop_box,
+            ocr_slot
+        )
+        return AgentJobInitResponse(job_id=new_job.id)
+    except OCRQueueFullError as queue_exc:
+        print(f"OCR queue full in create_agent_job_from_upload, rejecting with 429: {queue_exc}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(queue_exc),
+            headers={"Retry-After": str(queue_exc.retry_after_seconds)}
+        )
+    except UploadTooLargeError as size_exc:
+        ocr_slot.release()
+        raise HTTPException(status_code=413, detail=str(size_exc))
+    except EmptyUploadError as empty_exc:
+        # Chunked request without a Content-Length; only known to be empty once read
+        ocr_slot.release()
+        raise HTTPException(status_code=400, detail=str(empty_exc))
+    except Exception as e:
+        db.rollback()
+        if ocr_slot:
+            ocr_slot.release()
+        print(f"Error in create_agent_job_from_upload (/jobs/upload): {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to create agent job: {str(e)}")
+
+def _image_data_url_error(image_data_url: str) -> str | None:
+    """Cheap structural check of a data URL; full decoding happens in the OCR stage."""
+    header, separator, encoded_data = image_data_url.partition(",")
+    if not separator or not header.startswith("data:image/") or ";base64" not in header:
+        return "Invalid Data URL format, expected data:image/<type>;base64,<data>"
+    if not encoded_data.strip():
+        return "Data URL contains no image data"
+    return None
+
+@router.post("/jobs/batch", response_model=AgentBatchJobInitResponse)
+async def create_agent_jobs_batch(
+    request_data: AgentBatchProcessRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Creates one job per image in a single DB transaction. The images are OCR'd together
+    through EasyOCR's batched API, then every job runs the normal agent pipeline.
+    """
+    if len(request_data.items) > settings.OCR_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images in batch ({len(request_data.items)}), the maximum is {settings.OCR_BATCH_MAX_IMAGES}."
+        )
+
+    results: list[AgentBatchItemResult] = []
+    accepted: list[tuple[int, AgentProcessRequest]] = []
+    for index, item in enumerate(request_data.items):
+        error = _image_data_url_error(item.image_data_url)
+        if error:
+            results.append(AgentBatchItemResult(index=index, error=error))
+        else:
+            accepted.append((index, item))
+
+    if not accepted:
+        return AgentBatchJobInitResponse(jobs=results, message="No valid images in batch; no jobs were created.")
+
+    ocr_slot = None
+    try:
+        # One batched OCR call for the whole request, so one queue slot
+        ocr_slot = ocr_executor.reserve_slot()
+
+        new_jobs = [
+            AgentJob(
+                input_image_data_url=item.image_data_url,
+                user_prompt=item.user_prompt,
+                pipeline_profile=item.pipeline_profile,
+                input_text="",
+                status="PENDING"
+            )
+            for _, item in accepted
+        ]
+        db.add_all(new_jobs)
+        db.commit()
+        for job in new_jobs:
+            db.refresh(job)
+
+        background_tasks.add_task(
+            process_agent_job_batch,
+            [job.id for job in new_jobs],
+            [item.user_prompt for _, item in accepted],
+            [item.crop_box for _, item in accepted],
+            ocr_slot
+        )
+        results.extend(AgentBatchItemResult(index=index, job_id=job.id) for (index, _), job in zip(accepted, new_jobs))
+        results.sort(key=lambda result: result.index)
+        print(f"--- Agent Router (/jobs/batch): Created {len(new_jobs)} job(s), rejected {len(request_data.items) - len(new_jobs)} image(s) ---")
+        return AgentBatchJobInitResponse(jobs=results)
+    except OCRQueueFullError as queue_exc:
+        print(f"OCR queue full in create_agent_jobs_batch, rejecting with 429: {queue_exc}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(queue_exc),
+            headers={"Retry-After": str(queue_exc.retry_after_seconds)}
+        )
+    except Exception as e:
+        db.rollback()
+        if ocr_slot:
+            ocr_slot.release()
+        print(f"Error in create_agent_jobs_batch (/jobs/batch): {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to create agent jobs: {str(e)}")
+
+@router.delete("/ocr/cache")
+async def invalidate_ocr_cache(all_namespaces: bool = False):
+    """
+    Drops cached OCR results. By default only entries from stale namespaces (older OCR
+    model/language settings) are deleted; pass all_namespaces=true to clear everything.
+    """
+    try:
+        deleted = ocr_result_cache.invalidate(all_namespaces=all_namespaces)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to invalidate OCR cache: {str(e)}")
+    return {"deleted_entries": deleted, "namespace": ocr_result_cache.namespace}
+
+@router.delete("/stage-cache")
+async def invalidate_stage_cache(stage: str | None = None):
+    """Drops memoized agent stage outputs, either for one stage (e.g. stage=explanation) or all of them."""
+    try:
+        deleted = await asyncio.to_thread(agent_stage_cache.invalidate, stage=stage)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to invalidate stage cache: {str(e)}")
+    return {"deleted_entries": deleted, "stage": stage}
+
 # Note on passing DB session to background tasks is now handled:
 # process_agent_job in agent_service.py creates its own SessionLocal(). 
\ No newline at end of file
@@ -1,8 +1,22 @@
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
+
+# Agent pipeline variants (see services/root_agent/agent.py PROFILE_STAGE_BUILDERS):
+# full = all seven stages, fast = merged outline stage and no review/refactor, text-only = no code/video
+PipelineProfile = Literal["full", "fast", "text-only"]
+
+class CropBox(BaseModel):
+    """Region of the uploaded image to run OCR on, in pixels of the original image."""
+    x: int = Field(ge=0)
+    y: int = Field(ge=0)
+    width: int = Field(gt=0)
+    height: int = Field(gt=0)
 
 class AgentProcessRequest(BaseModel):
     image_data_url: str
     user_prompt: str | None = None
+    crop_box: CropBox | None = None
+    pipeline_profile: PipelineProfile = "full"
 
 class AgentProcessResponse(BaseModel):
     job_id: int
@@ -11,4 +25,16 @@ class AgentProcessResponse(BaseModel):
 
 class AgentJobInitResponse(BaseModel):
     job_id: int
-    message: str = "Agent job initiated. Connect to WebSocket for updates." 
\ No newline at end of file
+    message: str = "Agent job initiated. Connect to WebSocket for updates." 
+
+class AgentBatchProcessRequest(BaseModel):
+    items: list[AgentProcessRequest] = Field(min_length=1)
+
+class AgentBatchItemResult(BaseModel):
+    index: int # Position of the image in the request
+    job_id: int | None = None
+    error: str | None = None
+
+class AgentBatchJobInitResponse(BaseModel):
+    jobs: list[AgentBatchItemResult]
+    message: str = "Agent jobs initiated. Connect to WebSocket for updates per job."
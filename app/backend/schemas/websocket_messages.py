@@ -23,11 +23,31 @@ class WebSocketPartialResult(WebSocketMessageBase):
     ]
     content: str # The actual partial result content
 
+class WebSocketStreamDelta(WebSocketMessageBase):
+    type: Literal["stream_delta"] = "stream_delta"
+    result_type: str # Output key of the stage being streamed, e.g. "explanation" or "refactored_code"
+    delta: str # Text generated since the previous frame; the stage's partial/final result stays authoritative
+    seq: int # Frame counter per result_type, starting at 0
+
+class AgentStageMetric(BaseModel):
+    stage: str # Agent name, or "ManimRender"
+    attempt: int = 1
+    output_key: str | None = None
+    model: str | None = None
+    started_at: str # ISO 8601
+    finished_at: str | None = None
+    duration_ms: int | None = None
+    prompt_tokens: int | None = None # None when the stage made no LLM call
+    completion_tokens: int | None = None
+    llm_calls: int = 0
+    cached: bool = False
+
 class WebSocketFinalResult(WebSocketMessageBase):
     type: Literal["final_result"] = "final_result"
     refactored_code: str | None = None
     video_url: str | None = None # For Manim video link
     manim_error: str | None = None # For any errors during Manim processing
+    stage_metrics: list[AgentStageMetric] | None = None # Per-stage wall time and token usage, in execution order
     message: str = "Processing completed successfully."
 
 class WebSocketError(WebSocketMessageBase):
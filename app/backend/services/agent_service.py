@@ -1,25 +1,47 @@
 from sqlalchemy.orm import Session
 from app.backend.database import SessionLocal # For creating new sessions in background tasks
 from app.backend.models.agent_job import AgentJob
-from app.backend.services.root_agent.agent import root_agent # The actual agent
+from app.backend.services.root_agent.agent import (
+    root_agent,
+    build_root_agent,
+    build_code_fixer_agent,
+    DEFAULT_PIPELINE_PROFILE,
+    PIPELINE_PROFILES,
+    PROFILE_FINAL_CODE_KEYS
+)
 from app.backend.websockets.connection_manager import manager
 from app.backend.schemas.websocket_messages import (
     WebSocketStatusUpdate,
     WebSocketPartialResult,
+    WebSocketStreamDelta,
     WebSocketFinalResult,
     WebSocketError
 )
+import json
 import traceback # For logging full error trace
 import re # For extracting placeholders from instruction templates
 import asyncio # Add asyncio for the sleep
+import time
+from datetime import datetime, timezone
 
 # Import Google ADK dependencies
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types
 
 # Import the new Manim service
 from .manim_service import execute_manim_code
+from .manim_validator import format_findings, scene_class_names, validate_manim_code
+from .ocr_service import decode_image_data_url, extract_text_from_image, extract_text_from_image_file, extract_texts_from_images
+from .image_fingerprint import compute_dhash, phash_index, phash_to_hex
+from app.backend.config import settings
+from .stream_coalescer import StreamDeltaCoalescer
+from .agent_stage_cache import agent_stage_cache, stage_model_name
+from .topic_similarity_index import topic_similarity_index
+from .stage_metrics import StageMetricsRecorder
+from .ocr_executor import OCRSlot
+from app.backend.schemas.agent_processing import CropBox
 
 # Define status constants for clarity
 JOB_STATUS_PROCESSING = "PROCESSING"
@@ -27,7 +49,12 @@ JOB_STATUS_COMPLETED = "COMPLETED"
 JOB_STATUS_FAILED = "FAILED"
 
 # Define detailed status messages for different agent stages
+OCR_STAGE_MESSAGE = "Reading image..."
+OCR_REUSED_MESSAGE = "Reusing text from an earlier upload of this image..."
+REUSED_OUTPUT_MESSAGE = "Reusing results from an earlier upload of this image..."
+
 AGENT_STAGES = {
+    "OutlineAgent": "Writing explanation, concepts and storyboard...",
     "ClearExplanationAgent": "Generating clear explanation...",
     "ConceptSeparatorAgent": "Separating concepts...",
     "StoryboardCreatorAgent": "Creating storyboard...",
@@ -36,10 +63,79 @@ AGENT_STAGES = {
     "CodeReviewerAgent": "Reviewing code...",
     "CodeRefactorerAgent": "Refactoring code..."
 }
+REPAIR_STAGE_MESSAGE = "Render failed, repairing code (attempt {attempt}/{max_attempts})..."
 
 # Constants for ADK integration
 APP_NAME = "braynr-app"
 
+# One pipeline per profile (full / fast / text-only), one shared session service, and one
+# runner per pipeline for all jobs. Jobs are kept apart by their own session
+# (user_id = job id, session_id = "job-<id>"), which is deleted when the job finishes.
+# The default profile reuses the module's root_agent (kept for ADK tooling) instead of building it twice
+root_agents = {
+    profile: root_agent if profile == DEFAULT_PIPELINE_PROFILE else build_root_agent(profile)
+    for profile in PIPELINE_PROFILES
+}
+session_service = InMemorySessionService()
+runners = {
+    profile: Runner(agent=agent, app_name=APP_NAME, session_service=session_service)
+    for profile, agent in root_agents.items()
+}
+# Render repairs run the fixer agent alone, in a short-lived session per attempt
+code_fixer_agent = build_code_fixer_agent()
+fixer_runner = Runner(agent=code_fixer_agent, app_name=APP_NAME, session_service=session_service)
+
+_all_stage_agents = [agent for root in root_agents.values() for agent in root.sub_agents]
+# Map agent names to the state key (and AgentJob column) their output is stored under
+AGENT_OUTPUT_KEYS = {agent.name: agent.output_key for agent in _all_stage_agents if agent.output_key}
+STAGE_MODELS = {agent.output_key: stage_model_name(agent) for agent in _all_stage_agents if agent.output_key}
+# Agents whose runner events are turned into per-stage metrics (the pipelines' stages and the render fixer)
+METRIC_AGENT_OUTPUT_KEYS = {**AGENT_OUTPUT_KEYS, code_fixer_agent.name: code_fixer_agent.output_key}
+AGENT_MODELS = {agent.name: stage_model_name(agent) for agent in [*_all_stage_agents, code_fixer_agent]}
+RENDER_STAGE_NAME = "ManimRender"
+# Every state key holding a stage output, including the parts split out of the fast profile's outline
+STAGE_OUTPUT_KEYS = set(AGENT_OUTPUT_KEYS.values())
+# Stages that depend only on the topic, reusable from a job with a near-identical topic
+SIMILAR_TOPIC_REUSABLE_KEYS = ('explanation', 'concepts', 'storyboard')
+# refactored_code is delivered with the final result, not as a partial result
+PARTIAL_RESULT_KEYS = {'explanation', 'concepts', 'storyboard', 'enhanced_storyboard', 'generated_code', 'review_comments'}
+# Stages whose token deltas are streamed to the client (the fast profile's JSON outline is not)
+STREAMED_KEYS = PARTIAL_RESULT_KEYS | {'refactored_code'}
+
+
+# Token streaming (SSE) makes the model yield partial events with text deltas before each final response
+RUN_CONFIG = RunConfig(streaming_mode=StreamingMode.SSE if settings.AGENT_STREAM_TOKENS else StreamingMode.NONE)
+
+
+def _session_id(job_id: int) -> str:
+    return f"job-{job_id}"
+
+
+def _state_text(value) -> str:
+    """Stage outputs are text, except structured (output_schema) ones, which are stored as JSON."""
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _stage_output(event, output_key: str) -> str | None:
+    """The output an agent's final event carries: the state delta ADK writes for output_key, else the event text."""
+    state_delta = event.actions.state_delta if event.actions else {}
+    if output_key in state_delta:
+        return _state_text(state_delta[output_key])
+    if event.content and event.content.parts:
+        return "".join(part.text or "" for part in event.content.parts)
+    return None
+
+
+async def deliver_stage_output(db: Session, job_id: int, job_id_str: str, output_key: str, content: str):
+    """Saves a finished stage's output on the job and, unless it is the final code, pushes it to subscribers."""
+    if output_key in PARTIAL_RESULT_KEYS:
+        await send_partial_result_and_save(db, job_id, job_id_str, output_key, content, output_key)
+    else:
+        job = db.query(AgentJob).filter(AgentJob.id == job_id).first()
+        if job and hasattr(job, output_key):
+            setattr(job, output_key, content)
+            db.commit()
+
 async def update_job_status_and_broadcast(db: Session, job_id: int, job_id_str: str, status: str, message: str = None, data_to_save: dict = None):
     """Helper to update job status in DB and broadcast to WebSocket."""
     job = db.query(AgentJob).filter(AgentJob.id == job_id).first()
@@ -78,6 +174,86 @@ async def send_partial_result_and_save(db: Session, job_id: int, job_id_str: str
         print(f"Job {job_id} not found for sending partial result.")
 
 
+def find_scene_name(code: str, default: str = "ManimScene") -> str:
+    """Name of the first scene class in the code, by the validator's `*Scene` rule (the default if none is found)."""
+    names = scene_class_names(code)
+    return names[0] if names else default
+
+
+async def repair_manim_code(job_id: int, attempt: int, failing_code: str, render_error: str, metrics: StageMetricsRecorder | None = None) -> str | None:
+    """Asks the fixer agent for a repaired version of code that failed to render; None if it produced nothing."""
+    session_id = f"{_session_id(job_id)}-repair-{attempt}"
+    session_service.create_session(
+        app_name=APP_NAME,
+        user_id=str(job_id),
+        session_id=session_id,
+        state={
+            "failing_code": failing_code,
+            "render_error": render_error,
+            "validation_findings": format_findings(validate_manim_code(failing_code)),
+        }
+    )
+    try:
+        user_message = types.Content(role="user", parts=[types.Part(text="Fix this Manim script so it renders.")])
+        async for event in fixer_runner.run_async(user_id=str(job_id), session_id=session_id, new_message=user_message):
+            if metrics:
+                metrics.observe(event, attempt=attempt)
+        session = session_service.get_session(app_name=APP_NAME, user_id=str(job_id), session_id=session_id)
+        fixed_code = session.state.get(code_fixer_agent.output_key) if session else None
+        return fixed_code if isinstance(fixed_code, str) and fixed_code.strip() else None
+    finally:
+        session_service.delete_session(app_name=APP_NAME, user_id=str(job_id), session_id=session_id)
+
+
+async def _timed_render(job_id_str: str, code: str, attempt: int, metrics: StageMetricsRecorder | None) -> tuple[str | None, str | None]:
+    started_at = datetime.now(timezone.utc)
+    result = await execute_manim_code(job_id_str, code, find_scene_name(code))
+    if metrics:
+        metrics.record_span(RENDER_STAGE_NAME, started_at, datetime.now(timezone.utc), attempt=attempt)
+    return result
+
+
+async def render_with_repair(db: Session, job_id: int, job_id_str: str, code: str, metrics: StageMetricsRecorder | None = None) -> tuple[str | None, str | None, str, int, int | None]:
+    """
+    Renders the code and, when Manim fails, sends the trimmed traceback and the failing code to
+    the fixer agent and re-renders, up to MANIM_REPAIR_MAX_ATTEMPTS times. Only the code step is
+    retried; the earlier stages' outputs are kept.
+
+    Returns (video path, last render error, code that was rendered last, render attempts,
+    repair latency in ms or None if no repair was needed).
+    """
+    print(f"Job {job_id}: Attempting Manim execution for scene: {find_scene_name(code)}")
+    video_path, render_error = await _timed_render(job_id_str, code, 1, metrics)
+    attempts = 1
+    if video_path or not render_error:
+        return video_path, render_error, code, attempts, None
+
+    repair_started = time.perf_counter()
+    max_attempts = max(0, settings.MANIM_REPAIR_MAX_ATTEMPTS)
+    for attempt in range(1, max_attempts + 1):
+        await update_job_status_and_broadcast(
+            db, job_id, job_id_str,
+            JOB_STATUS_PROCESSING,
+            REPAIR_STAGE_MESSAGE.format(attempt=attempt, max_attempts=max_attempts)
+        )
+        try:
+            fixed_code = await repair_manim_code(job_id, attempt, code, render_error, metrics)
+        except Exception as e:
+            print(f"Job {job_id}: Code fixer failed on attempt {attempt}: {e}")
+            break
+        if not fixed_code:
+            print(f"Job {job_id}: Code fixer returned no code on attempt {attempt}")
+            break
+        code = fixed_code
+        attempts += 1
+        video_path, render_error = await _timed_render(job_id_str, code, attempts, metrics)
+        if video_path or not render_error:
+            print(f"Job {job_id}: Render succeeded after {attempt} repair(s)")
+            break
+    repair_latency_ms = int((time.perf_counter() - repair_started) * 1000)
+    return video_path, render_error, code, attempts, repair_latency_ms
+
+
 def extract_placeholders(instruction: str) -> list:
     """Extract placeholders from an instruction template string."""
     if not instruction:
@@ -87,20 +263,263 @@ def extract_placeholders(instruction: str) -> list:
     return list(set(placeholders))  # Remove duplicates
 
 
-async def process_agent_job(job_id: int, input_text: str, user_prompt: str | None = None):
+def _fingerprint_job_image(job: AgentJob) -> int | None:
+    """Perceptual hash of the job's input image, or None if it can't be decoded."""
+    try:
+        source = job.input_image_path or decode_image_data_url(job.input_image_data_url)
+        return compute_dhash(source)
+    except Exception as e:
+        print(f"Job {job.id}: Could not compute perceptual hash: {e}")
+        return None
+
+
+def _find_near_duplicate_job(db: Session, job: AgentJob, phash: int) -> AgentJob | None:
+    """Closest earlier job whose image is within OCR_PHASH_MAX_DISTANCE bits and whose OCR succeeded."""
+    matches = [(job_id, distance) for job_id, distance in phash_index.find_within(phash, settings.OCR_PHASH_MAX_DISTANCE) if job_id != job.id]
+    if not matches:
+        return None
+    candidates = {
+        prior_job.id: prior_job
+        for prior_job in db.query(AgentJob).filter(AgentJob.id.in_([job_id for job_id, _ in matches])).all()
+    }
+    # Closest first; skip jobs that are gone or have no usable text
+    for job_id, distance in matches:
+        prior_job = candidates.get(job_id)
+        if prior_job and prior_job.input_text and not prior_job.input_text.startswith("Error:"):
+            print(f"Job {job.id}: Image is a near-duplicate of job {prior_job.id} (Hamming distance {distance}).")
+            return prior_job
+    return None
+
+
+async def run_ocr_stage(db: Session, job_id: int, job_id_str: str, crop_box: CropBox | None = None, ocr_slot: OCRSlot | None = None) -> tuple[str, int | None]:
+    """
+    First pipeline stage: OCR the stored input image and save the text on the job.
+    If the image is a near-duplicate of an earlier upload (perceptual hash), that job's text is
+    reused instead. Returns the text and the id of the reused job, if any.
+    """
+    await update_job_status_and_broadcast(db, job_id, job_id_str, JOB_STATUS_PROCESSING, OCR_STAGE_MESSAGE)
+
+    job = db.query(AgentJob).filter(AgentJob.id == job_id).first()
+    if not job:
+        raise ValueError(f"Job {job_id} not found for OCR.")
+
+    # A crop changes the text, so only whole-image uploads take part in near-duplicate matching
+    phash = None
+    if settings.OCR_PHASH_ENABLED and crop_box is None:
+        phash = await asyncio.to_thread(_fingerprint_job_image, job)
+        if phash is not None:
+            prior_job = _find_near_duplicate_job(db, job, phash)
+            if prior_job:
+                if ocr_slot:
+                    ocr_slot.release()
+                job.input_image_phash = phash_to_hex(phash)
+                job.input_text = prior_job.input_text
+                db.commit()
+                await update_job_status_and_broadcast(db, job_id, job_id_str, JOB_STATUS_PROCESSING, OCR_REUSED_MESSAGE)
+                return prior_job.input_text, prior_job.id
+
+    if job.input_image_path:
+        # Binary upload spooled to disk; the OCR worker reads the file itself
+        extracted_text = await extract_text_from_image_file(job.input_image_path, job.input_image_sha256, crop_box, ocr_slot=ocr_slot)
+    else:
+        extracted_text = await extract_text_from_image(job.input_image_data_url, crop_box, ocr_slot=ocr_slot)
+    if not extracted_text:
+        print(f"Job {job_id}: OCR Service returned no text for the input image.") # Allow processing even if OCR finds nothing
+
+    # Only fingerprint jobs with usable text: the index (and its reload on startup) is for reusing text
+    ocr_succeeded = bool(extracted_text) and not extracted_text.startswith("Error:")
+    if phash is not None and ocr_succeeded:
+        job.input_image_phash = phash_to_hex(phash)
+    job.input_text = extracted_text
+    db.commit()
+    if phash is not None and ocr_succeeded:
+        phash_index.add(phash, job_id)
+    return extracted_text, None
+
+
+def find_similar_topic_outputs(db: Session, topic: str, user_prompt: str | None) -> dict[str, str]:
+    """Explanation/concepts/storyboard of an earlier job with a near-identical topic and the same prompt, if any."""
+    match = topic_similarity_index.find_similar(topic, user_prompt)
+    if not match:
+        return {}
+    prior_job = db.query(AgentJob).filter(AgentJob.id == match[0]).first()
+    if not prior_job:
+        return {}
+    outputs = {key: getattr(prior_job, key) for key in SIMILAR_TOPIC_REUSABLE_KEYS}
+    if not all(outputs.values()):
+        return {}
+    print(f"Agent Service: Topic is similar to job {prior_job.id} (estimated Jaccard {match[1]:.2f}); reusing its {list(outputs)}.")
+    return outputs
+
+
+async def reuse_completed_job_output(db: Session, job_id: int, job_id_str: str, prior_job_id: int, user_prompt: str | None, pipeline_profile: str) -> bool:
+    """
+    Copies the outputs of a completed near-duplicate job (same user prompt and pipeline profile)
+    onto this job and sends them over the WebSocket, skipping the agent pipeline. Returns False if not reusable.
+    """
+    prior_job = db.query(AgentJob).filter(AgentJob.id == prior_job_id).first()
+    if (
+        not prior_job
+        or prior_job.status != JOB_STATUS_COMPLETED
+        or (prior_job.pipeline_profile or DEFAULT_PIPELINE_PROFILE) != pipeline_profile
+        or (not prior_job.refactored_code and PROFILE_FINAL_CODE_KEYS[pipeline_profile])
+        or (prior_job.user_prompt or "") != (user_prompt or "")
+    ):
+        return False
+
+    await update_job_status_and_broadcast(db, job_id, job_id_str, JOB_STATUS_PROCESSING, REUSED_OUTPUT_MESSAGE)
+    for key in ('explanation', 'concepts', 'storyboard', 'enhanced_storyboard', 'generated_code', 'review_comments'):
+        content = getattr(prior_job, key)
+        if content is not None:
+            await send_partial_result_and_save(db, job_id, job_id_str, key, content, key)
+
+    await update_job_status_and_broadcast(
+        db, job_id, job_id_str,
+        JOB_STATUS_COMPLETED,
+        "Agent pipeline completed.",
+        data_to_save={'refactored_code': prior_job.refactored_code, 'video_url': prior_job.video_url}
+    )
+    ws_final_msg = WebSocketFinalResult(
+        job_id=job_id,
+        refactored_code=prior_job.refactored_code,
+        video_url=prior_job.video_url,
+        manim_error=None
+    ).model_dump()
+    await asyncio.sleep(0.2) # Same grace period as the regular final result
+    await manager.broadcast_to_job(job_id_str, ws_final_msg)
+    print(f"Job {job_id}: Reused completed output of near-duplicate job {prior_job_id}.")
+    return True
+
+
+async def fail_job(db: Session, job_id: int, job_id_str: str, error_message: str):
+    """Marks a job FAILED with `error_message` and tells its WebSocket subscribers."""
+    print(f"Job {job_id}: {error_message}")
+    await update_job_status_and_broadcast(
+        db, job_id, job_id_str,
+        JOB_STATUS_FAILED,
+        error_message,
+        data_to_save={'error_message': error_message}
+    )
+    ws_err_msg = WebSocketError(job_id=job_id, error_message=error_message).model_dump()
+    await manager.broadcast_to_job(job_id_str, ws_err_msg)
+
+
+async def process_agent_job_batch(job_ids: list[int], user_prompts: list[str | None], crop_boxes: list[CropBox | None], ocr_slot: OCRSlot | None = None):
+    """
+    Processes jobs created together by POST /jobs/batch: all images are OCR'd in one
+    batched call, then each job continues through the regular agent pipeline.
+    Like single jobs, whole-image uploads that are near-duplicates of an earlier image
+    (perceptual hash) reuse its text and are left out of the OCR batch. Missing jobs are
+    skipped and jobs whose OCR failed are marked FAILED instead of entering the pipeline.
+    """
+    print(f"--- Agent Service: process_agent_job_batch received job_ids: {job_ids} ---")
+    db: Session = SessionLocal()
+    texts: dict[int, str] = {}
+    duplicates: dict[int, int] = {}  # job id -> near-duplicate job whose text was reused
+    phashes: dict[int, int] = {}
+    try:
+        jobs = {job.id: job for job in db.query(AgentJob).filter(AgentJob.id.in_(job_ids)).all()}
+        for job_id in job_ids:
+            if job_id not in jobs:
+                print(f"Batch: job {job_id} not found, skipping it.")
+                continue
+            await update_job_status_and_broadcast(db, job_id, str(job_id), JOB_STATUS_PROCESSING, OCR_STAGE_MESSAGE)
+
+        to_recognize = []  # (job id, crop box)
+        for job_id, crop_box in zip(job_ids, crop_boxes):
+            job = jobs.get(job_id)
+            if not job:
+                continue
+            if settings.OCR_PHASH_ENABLED and crop_box is None:
+                phash = await asyncio.to_thread(_fingerprint_job_image, job)
+                if phash is not None:
+                    phashes[job_id] = phash
+                    prior_job = _find_near_duplicate_job(db, job, phash)
+                    if prior_job:
+                        job.input_image_phash = phash_to_hex(phash)
+                        texts[job_id] = prior_job.input_text
+                        duplicates[job_id] = prior_job.id
+                        await update_job_status_and_broadcast(db, job_id, str(job_id), JOB_STATUS_PROCESSING, OCR_REUSED_MESSAGE)
+                        continue
+            to_recognize.append((job_id, crop_box))
+        db.commit()
+
+        if to_recognize:
+            try:
+                recognized = await extract_texts_from_images(
+                    [jobs[job_id].input_image_data_url for job_id, _ in to_recognize],
+                    [crop_box for _, crop_box in to_recognize],
+                    ocr_slot=ocr_slot
+                )
+            except Exception as e:
+                print(f"Batch OCR for jobs {[job_id for job_id, _ in to_recognize]} failed: {e}")
+                print(traceback.format_exc())
+                recognized = [f"Error: OCR processing failed - {e}"] * len(to_recognize)
+            for (job_id, _), text in zip(to_recognize, recognized):
+                texts[job_id] = text
+                if job_id in phashes and text and not text.startswith("Error:"):
+                    jobs[job_id].input_image_phash = phash_to_hex(phashes[job_id])
+                    phash_index.add(phashes[job_id], job_id)
+            db.commit()
+
+        # Jobs whose OCR failed stop here rather than running the LLM pipeline on the error text
+        for job_id, text in list(texts.items()):
+            if text and text.startswith("Error:"):
+                jobs[job_id].input_text = text
+                db.commit()
+                await fail_job(db, job_id, str(job_id), text)
+                del texts[job_id]
+    finally:
+        if ocr_slot:
+            ocr_slot.release()
+        db.close()
+
+    await asyncio.gather(*[
+        process_agent_job(job_id, user_prompt, input_text=texts[job_id], duplicate_of_job_id=duplicates.get(job_id))
+        for job_id, user_prompt in zip(job_ids, user_prompts)
+        if job_id in texts
+    ])
+
+
+async def process_agent_job(job_id: int, user_prompt: str | None = None, crop_box: CropBox | None = None, ocr_slot: OCRSlot | None = None, input_text: str | None = None, duplicate_of_job_id: int | None = None):
     """
     Process an agent job using Google ADK infrastructure.
-    This function correctly initializes ADK session management and runners.
+    OCR of the stored input image runs first (unless `input_text` was already extracted,
+    e.g. by a batch, which also passes the near-duplicate job the text came from), then the
+    agent pipeline. A failed OCR fails the job without running the pipeline.
+    Runs on the shared ADK runner in a per-job session, driven by the async runner API so
+    many jobs can overlap on one event loop.
     """
-    print(f"--- Agent Service: process_agent_job received job_id: {job_id}, input_text (first 50): '{input_text[:50]}...', user_prompt: '{user_prompt}' ---")
+    print(f"--- Agent Service: process_agent_job received job_id: {job_id}, user_prompt: '{user_prompt}' ---")
     job_id_str = str(job_id) # For WebSocket manager
     db: Session = SessionLocal() # Create a new session for this background task
-    
-    # Create session service for ADK
-    session_service = InMemorySessionService()
-    
+    session_id = _session_id(job_id)
+    session_created = False
+    metrics = None
+
     try:
-        await update_job_status_and_broadcast(db, job_id, job_id_str, JOB_STATUS_PROCESSING, "Initializing agent pipeline...")
+        # Stage 0: OCR (uses the queue slot reserved when the job was accepted)
+        if input_text is None:
+            input_text, duplicate_of_job_id = await run_ocr_stage(db, job_id, job_id_str, crop_box, ocr_slot)
+        else:
+            job = db.query(AgentJob).filter(AgentJob.id == job_id).first()
+            if job:
+                job.input_text = input_text
+                db.commit()
+        print(f"--- Agent Service: OCR for job {job_id} extracted (first 50): '{input_text[:50]}...' ---")
+        if input_text.startswith("Error:"):
+            await fail_job(db, job_id, job_id_str, input_text)
+            return
+
+        job = db.query(AgentJob).filter(AgentJob.id == job_id).first()
+        pipeline_profile = (job.pipeline_profile if job else None) or DEFAULT_PIPELINE_PROFILE
+        stage_agents = root_agents[pipeline_profile].sub_agents
+
+        if duplicate_of_job_id and settings.OCR_PHASH_REUSE_PIPELINE_OUTPUT:
+            if await reuse_completed_job_output(db, job_id, job_id_str, duplicate_of_job_id, user_prompt, pipeline_profile):
+                return
+
+        await update_job_status_and_broadcast(db, job_id, job_id_str, JOB_STATUS_PROCESSING, f"Initializing agent pipeline ({pipeline_profile})...")
 
         # Initial state for the session
         initial_state = {
@@ -109,23 +528,61 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
         }
         print(f"--- Agent Service: Initial agent state for job {job_id}: {initial_state} ---")
 
+        # Resume from the deepest cached stage: cached outputs are put into the session state,
+        # and their agents skip the LLM call (see skip_if_output_in_state in root_agent)
+        stage_cache_keys, cached_outputs = {}, {}
+        if settings.AGENT_STAGE_CACHE_ENABLED:
+            stage_cache_keys, cached_outputs = await asyncio.to_thread(agent_stage_cache.lookup_prefix, input_text, user_prompt, stage_agents)
+
+        # OCR text of the same formula varies slightly, so also look for a job with a near-identical topic
+        if (
+            settings.AGENT_TOPIC_SIMILARITY_ENABLED
+            and not all(key in cached_outputs for key in SIMILAR_TOPIC_REUSABLE_KEYS)
+        ):
+            similar_outputs = find_similar_topic_outputs(db, input_text, user_prompt)
+            if similar_outputs:
+                for key, content in similar_outputs.items():
+                    if key in stage_cache_keys:
+                        # Cache under this topic too, so the exact-key lookup chains from here next time
+                        await asyncio.to_thread(agent_stage_cache.put, key, stage_cache_keys[key], content, STAGE_MODELS.get(key))
+                # Anything cached beyond these stages was derived from different upstream text
+                cached_outputs = similar_outputs
+        if cached_outputs:
+            initial_state.update(cached_outputs)
+            print(f"Job {job_id}: Reusing cached output for stage(s): {list(cached_outputs)}")
+
         # Create ADK session with initial state
         session = session_service.create_session(
             app_name=APP_NAME,
             user_id=str(job_id),  # Use job_id as user_id to keep sessions separate
-            session_id="session-1",  # Fixed session_id for simplicity
+            session_id=session_id,
             state=initial_state
         )
+        session_created = True
 
-        # Create a runner for the agent
-        runner = Runner(
-            agent=root_agent,
-            app_name=APP_NAME,
-            session_service=session_service
+        # Track which agents have been processed and which outputs were already delivered
+        processed_agents = set()
+        delivered_keys = set()
+
+        async def send_stream_delta(result_type: str, delta: str, seq: int):
+            ws_delta_msg = WebSocketStreamDelta(job_id=job_id, result_type=result_type, delta=delta, seq=seq).model_dump()
+            await manager.broadcast_to_job(job_id_str, ws_delta_msg)
+
+        coalescer = StreamDeltaCoalescer(
+            send_stream_delta,
+            flush_interval_ms=settings.AGENT_STREAM_FLUSH_INTERVAL_MS,
+            flush_bytes=settings.AGENT_STREAM_FLUSH_BYTES
         )
 
-        # Track which agents have been processed
-        processed_agents = set()
+        async def deliver(output_key: str, content: str, author: str):
+            await coalescer.flush()
+            delivered_keys.add(output_key)
+            await deliver_stage_output(db, job_id, job_id_str, output_key, content)
+            if content and output_key in stage_cache_keys and output_key not in cached_outputs:
+                await asyncio.to_thread(agent_stage_cache.put, output_key, stage_cache_keys[output_key], content, STAGE_MODELS.get(output_key))
+            if output_key == 'storyboard' and output_key not in cached_outputs and settings.AGENT_TOPIC_SIMILARITY_ENABLED:
+                topic_similarity_index.add(input_text, user_prompt, job_id)
+            print(f"Job {job_id}: Delivered '{output_key}' from {author}")
         
         # Create a simple user input message to start the agent
         user_message = types.Content(
@@ -133,13 +590,19 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
             parts=[types.Part(text=f"Process this image with text: {input_text}. User prompt: {user_prompt or ''}")]
         )
         
-        # Run the agent pipeline and process events
+        # Per-stage wall time and tokens, stored in agent_job_stage_metrics and sent with the final result
+        metrics = StageMetricsRecorder(METRIC_AGENT_OUTPUT_KEYS, AGENT_MODELS)
+
+        # Run the agent pipeline and process events. The async runner awaits the LLM calls,
+        # so other jobs and requests keep being served while this pipeline runs.
         try:
-            for event in runner.run(
+            async for event in runners[pipeline_profile].run_async(
                 user_id=str(job_id),
-                session_id="session-1",
-                new_message=user_message
+                session_id=session_id,
+                new_message=user_message,
+                run_config=RUN_CONFIG
             ):
+                metrics.observe(event)
                 # Process events from agents (could be text outputs, thoughts, etc.)
                 if hasattr(event, 'author') and event.author not in processed_agents:
                     # A new agent is being processed
@@ -155,56 +618,65 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
                         )
                         print(f"Job {job_id}: Processing agent: {agent_name}")
 
+                output_key = AGENT_OUTPUT_KEYS.get(getattr(event, 'author', None))
+                if event.partial:
+                    # Streamed token delta; frames are coalesced, the final event below is authoritative
+                    if output_key in STREAMED_KEYS and event.content and event.content.parts:
+                        await coalescer.add(output_key, "".join(part.text or "" for part in event.content.parts))
+                    continue
+
+                # Deliver each stage's output as soon as it is written to the state: an agent's
+                # output_key, or the parts a callback split out of the fast profile's outline
+                state_delta = event.actions.state_delta if event.actions else {}
+                for key, value in state_delta.items():
+                    if key in STAGE_OUTPUT_KEYS and key not in delivered_keys and value is not None:
+                        await deliver(key, _state_text(value), event.author)
+
+                # Agents skipped via the stage cache only carry their output as event text
+                if output_key and output_key not in delivered_keys and event.is_final_response():
+                    content = _stage_output(event, output_key)
+                    if content is not None:
+                        await deliver(output_key, content, event.author)
+
+            await coalescer.close()
+            metrics.mark_cached(cached_outputs)
+            if coalescer.deltas_received:
+                print(f"Job {job_id}: Streamed {coalescer.deltas_received} token delta(s) in {coalescer.frames_sent} frame(s)")
+
             # After all agents processed, get the final state
             final_session = session_service.get_session(
                 app_name=APP_NAME,
                 user_id=str(job_id),
-                session_id="session-1"
+                session_id=session_id
             )
             
             # Extract results from final state
             final_state = final_session.state
             print(f"Job {job_id}: Final state keys: {list(final_state.keys())}")
             
-            # Map output keys to database fields
-            db_field_map = {
-                'explanation': 'explanation',
-                'concepts': 'concepts',
-                'storyboard': 'storyboard',
-                'enhanced_storyboard': 'enhanced_storyboard',
-                'generated_code': 'generated_code',
-                'review_comments': 'review_comments',
-                'refactored_code': 'refactored_code'
-            }
-            
-            # Send partial results for each output
-            for key, db_field in db_field_map.items():
-                if key in final_state and key != 'refactored_code': # Exclude refactored_code from partial results
-                    content = str(final_state[key])
-                    await send_partial_result_and_save(db, job_id, job_id_str, key, content, db_field)
+            # Send any stage output whose final event didn't come through while streaming
+            for key in PARTIAL_RESULT_KEYS - delivered_keys:
+                if key in final_state:
+                    await send_partial_result_and_save(db, job_id, job_id_str, key, _state_text(final_state[key]), key)
             
-            # Get the final code (or empty string if not available)
-            final_code = final_state.get('refactored_code', 'No refactored code produced.')
+            # Get the final code for this profile (None for text-only pipelines)
+            final_code_key = PROFILE_FINAL_CODE_KEYS[pipeline_profile]
+            final_code = final_state.get(final_code_key, 'No refactored code produced.') if final_code_key else None
             
-            # --- Dynamically determine scene name --- 
-            # This is a simple approach; robust parsing might use AST
-            actual_scene_name = "ManimScene" # Default if not found
-            if final_code and isinstance(final_code, str):
-                match = re.search(r"class\s+([A-Za-z_][A-Za-z0-9_]*)\s*\(Scene\):", final_code)
-                if match:
-                    actual_scene_name = match.group(1)
-                    print(f"Job {job_id}: Dynamically determined scene name: {actual_scene_name}")
-                else:
-                    print(f"Job {job_id}: Could not dynamically determine scene name, using default: {actual_scene_name}")
-            # --- End dynamic scene name --- 
-
-            # --- Call Manim Execution Service --- 
+            # --- Call Manim Execution Service (with the fixer-agent repair loop) --- 
             video_url_path_part = None
             manim_processing_error = None
+            render_stats = {}
 
-            if final_code and "No refactored code produced." not in final_code:
-                print(f"Job {job_id}: Attempting Manim execution for scene: {actual_scene_name}")
-                video_url_path_part, manim_processing_error = await execute_manim_code(job_id_str, final_code, actual_scene_name)
+            if final_code and isinstance(final_code, str) and "No refactored code produced." not in final_code:
+                generated_code = final_code
+                video_url_path_part, manim_processing_error, final_code, render_attempts, repair_latency_ms = await render_with_repair(
+                    db, job_id, job_id_str, final_code, metrics
+                )
+                render_stats = {'render_attempts': render_attempts, 'repair_latency_ms': repair_latency_ms}
+                # The cached code failed to render; cache the repaired version so the next hit doesn't repeat the repair
+                if video_url_path_part and final_code != generated_code and final_code_key in stage_cache_keys:
+                    await asyncio.to_thread(agent_stage_cache.put, final_code_key, stage_cache_keys[final_code_key], final_code, STAGE_MODELS.get(final_code_key), replace=True)
             else:
                 print(f"Job {job_id}: Skipping Manim execution as no refactored code was produced.")
 
@@ -223,7 +695,7 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
                 db, job_id, job_id_str, 
                 JOB_STATUS_COMPLETED, 
                 "Agent pipeline completed.", 
-                data_to_save={'refactored_code': final_code}
+                data_to_save={'refactored_code': final_code, 'video_url': final_video_url, **render_stats}
             )
             
             # Send final result
@@ -231,7 +703,8 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
                 job_id=job_id, 
                 refactored_code=final_code, 
                 video_url=final_video_url, 
-                manim_error=manim_processing_error
+                manim_error=manim_processing_error,
+                stage_metrics=metrics.records()
             ).model_dump()
             
             print(f"Job {job_id}: PREPARING TO SEND FINAL RESULT. Video URL: {final_video_url}, Manim Error: {manim_processing_error}. Message: {ws_final_msg}")
@@ -280,4 +753,15 @@ async def process_agent_job(job_id: int, input_text: str, user_prompt: str | Non
         ws_err_msg = WebSocketError(job_id=job_id, error_message=error_message).model_dump()
         await manager.broadcast_to_job(job_id_str, ws_err_msg)
     finally:
+        if ocr_slot:
+            ocr_slot.release() # No-op if OCR already released it
+        if metrics:
+            try:
+                metrics.save(db, job_id)
+            except Exception as e:
+                db.rollback()
+                print(f"Job {job_id}: Failed to save stage metrics: {e}")
+        if session_created:
+            # The runner is shared, so finished sessions must not pile up in its session service
+            session_service.delete_session(app_name=APP_NAME, user_id=str(job_id), session_id=session_id)
         db.close() # Ensure session is closed 
\ No newline at end of file
@@ -0,0 +1,263 @@
+# app/backend/services/agent_stage_cache.py
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from app.backend.config import settings
+from app.backend.database import SessionLocal
+from app.backend.models.agent_stage_cache_entry import AgentStageCacheEntry
+
+# Run the persistent tier's TTL/size pruning once per this many writes
+PRUNE_EVERY_WRITES = 100
+
+
+def normalize_prompt_text(text: str | None) -> str:
+    """Case- and whitespace-insensitive form of a topic or user prompt, used in cache keys."""
+    return re.sub(r"\s+", " ", (text or "")).strip().lower()
+
+
+def stage_model_name(agent) -> str:
+    """
+    Model identifier of an LlmAgent (LiteLlm instances carry it in `.model`), with the endpoint
+    appended when the stage is pointed at a custom api_base (see AGENT_STAGE_MODELS).
+    """
+    name = str(getattr(agent.model, "model", agent.model))
+    api_base = (getattr(agent.model, "_additional_args", None) or {}).get("api_base")
+    return f"{name}@{api_base}" if api_base else name
+
+
+def stage_instruction_hash(agent) -> str:
+    instruction = agent.instruction
+    if getattr(instruction, "cache_identity", None) is not None:
+        # Budgeted instruction providers (services/prompt_budget.py): template plus context budget
+        instruction = instruction.cache_identity
+    elif callable(instruction):
+        # Instruction providers are keyed by their code location; change AGENT_STAGE_CACHE_VERSION when editing them
+        instruction = f"{instruction.__module__}.{getattr(instruction, '__qualname__', repr(instruction))}"
+    return hashlib.sha256(str(instruction).encode("utf-8")).hexdigest()
+
+
+class AgentStageCache:
+    """
+    Memoizes agent pipeline stage outputs.
+
+    A stage's key chains the key of the stage before it with the stage's own name, model and
+    instruction hash, starting from the normalized topic and user prompt. Changing a stage's
+    prompt or model therefore invalidates it and every stage after it, but not the ones before.
+
+    Like the OCR cache it has two tiers: a bounded in-process LRU and the
+    `agent_stage_cache_entries` table. Entries expire after `ttl_seconds` and the table is
+    pruned to `max_persistent_entries` (oldest first).
+    """
+
+    def __init__(self, max_memory_entries: int, persistent: bool, ttl_seconds: int, max_persistent_entries: int, version: str):
+        self.max_memory_entries = max(0, max_memory_entries)
+        self.persistent = persistent
+        self.ttl_seconds = max(0, ttl_seconds)
+        self.max_persistent_entries = max(0, max_persistent_entries)
+        self.version = version
+
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()  # key -> (output, stored_at)
+        self._lock = threading.Lock()
+        self._stage_stats: dict[str, dict[str, int]] = {}
+        self._writes_since_prune = 0
+        self._errors = 0
+
+    def _count(self, stage: str, counter: str):
+        with self._lock:
+            stats = self._stage_stats.setdefault(stage, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0})
+            stats[counter] += 1
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - stored_at > self.ttl_seconds
+
+    def make_keys(self, topic: str, user_prompt: str | None, agents: list) -> dict[str, str]:
+        """Chained cache key per stage (output key -> cache key), in pipeline order."""
+        previous = hashlib.sha256(
+            f"v={self.version}|topic={normalize_prompt_text(topic)}|prompt={normalize_prompt_text(user_prompt)}".encode("utf-8")
+        ).hexdigest()
+        keys = {}
+        for agent in agents:
+            if not agent.output_key:
+                continue
+            previous = hashlib.sha256(
+                f"{previous}|stage={agent.output_key}|model={stage_model_name(agent)}|instruction={stage_instruction_hash(agent)}".encode("utf-8")
+            ).hexdigest()
+            keys[agent.output_key] = previous
+        return keys
+
+    def _remember(self, key: str, output: str, stored_at: float):
+        if not self.max_memory_entries:
+            return
+        with self._lock:
+            self._memory[key] = (output, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, stage: str, key: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    del self._memory[key]
+                    entry = None
+                else:
+                    self._memory.move_to_end(key)
+        if entry is not None:
+            self._count(stage, "memory_hits")
+            return entry[0]
+
+        if self.persistent:
+            db = SessionLocal()
+            try:
+                query = db.query(AgentStageCacheEntry).filter(AgentStageCacheEntry.cache_key == key)
+                if self.ttl_seconds:
+                    query = query.filter(AgentStageCacheEntry.created_at >= datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds))
+                row = query.first()
+                if row:
+                    self._count(stage, "disk_hits")
+                    self._remember(key, row.output, row.created_at.timestamp() if row.created_at else time.time())
+                    return row.output
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                print(f"[Agent Stage Cache] Lookup in persistent tier failed: {e}")
+            finally:
+                db.close()
+
+        self._count(stage, "misses")
+        return None
+
+    def lookup_prefix(self, topic: str, user_prompt: str | None, agents: list) -> tuple[dict[str, str], dict[str, str]]:
+        """
+        Returns (cache keys per stage, cached outputs) where the outputs cover the longest run of
+        leading stages that are all cached. Later stages must run again, since their cached
+        outputs may have been derived from different upstream text.
+        """
+        keys = self.make_keys(topic, user_prompt, agents)
+        cached = {}
+        for stage, key in keys.items():
+            output = self.get(stage, key)
+            if output is None:
+                break
+            cached[stage] = output
+        return keys, cached
+
+    def put(self, stage: str, key: str, output: str, model: str | None = None, replace: bool = False):
+        """Stores a stage output. With `replace`, an existing entry for the key is overwritten instead of kept."""
+        self._remember(key, output, time.time())
+        self._count(stage, "writes")
+        if not self.persistent:
+            return
+
+        db = SessionLocal()
+        try:
+            if replace:
+                db.query(AgentStageCacheEntry).filter(AgentStageCacheEntry.cache_key == key).delete()
+            db.add(AgentStageCacheEntry(cache_key=key, stage=stage, model=model, output=output))
+            db.commit()
+        except IntegrityError:
+            # Same stage output stored by another job first
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._errors += 1
+            print(f"[Agent Stage Cache] Write to persistent tier failed: {e}")
+        finally:
+            db.close()
+
+        with self._lock:
+            self._writes_since_prune += 1
+            prune = self._writes_since_prune >= PRUNE_EVERY_WRITES
+            if prune:
+                self._writes_since_prune = 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Deletes expired rows and the oldest rows beyond max_persistent_entries. Returns the number deleted."""
+        if not self.persistent:
+            return 0
+        db = SessionLocal()
+        try:
+            deleted = 0
+            if self.ttl_seconds:
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+                deleted += db.query(AgentStageCacheEntry).filter(AgentStageCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+            if self.max_persistent_entries:
+                oldest_kept_id = (
+                    db.query(AgentStageCacheEntry.id)
+                    .order_by(AgentStageCacheEntry.id.desc())
+                    .offset(self.max_persistent_entries - 1)
+                    .limit(1)
+                    .scalar()
+                )
+                if oldest_kept_id is not None:
+                    deleted += db.query(AgentStageCacheEntry).filter(AgentStageCacheEntry.id < oldest_kept_id).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                print(f"[Agent Stage Cache] Pruned {deleted} persisted entries.")
+            return deleted
+        except Exception as e:
+            db.rollback()
+            print(f"[Agent Stage Cache] Pruning failed: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def invalidate(self, stage: str | None = None) -> int:
+        """Clears the memory tier and deletes persisted entries (of one stage, or all). Returns the number of deleted rows."""
+        with self._lock:
+            self._memory.clear()
+        if not self.persistent:
+            return 0
+
+        db = SessionLocal()
+        try:
+            query = db.query(AgentStageCacheEntry)
+            if stage:
+                query = query.filter(AgentStageCacheEntry.stage == stage)
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            print(f"[Agent Stage Cache] Invalidated {deleted} persisted entries (stage={stage or 'all'}).")
+            return deleted
+        except Exception as e:
+            db.rollback()
+            print(f"[Agent Stage Cache] Invalidation failed: {e}")
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stages = {}
+            for stage, counts in self._stage_stats.items():
+                hits = counts["memory_hits"] + counts["disk_hits"]
+                lookups = hits + counts["misses"]
+                stages[stage] = {**counts, "hit_rate": (hits / lookups) if lookups else 0.0}
+            return {
+                "persistent": self.persistent,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_memory_entries,
+                "max_persistent_entries": self.max_persistent_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "errors": self._errors,
+                "stages": stages,
+            }
+
+
+# Global instance of the AgentStageCache
+agent_stage_cache = AgentStageCache(
+    max_memory_entries=settings.AGENT_STAGE_CACHE_MEMORY_ENTRIES,
+    persistent=settings.AGENT_STAGE_CACHE_PERSISTENT,
+    ttl_seconds=settings.AGENT_STAGE_CACHE_TTL_SECONDS,
+    max_persistent_entries=settings.AGENT_STAGE_CACHE_MAX_ENTRIES,
+    version=settings.AGENT_STAGE_CACHE_VERSION,
+)
@@ -0,0 +1,202 @@
+# app/backend/services/image_fingerprint.py
+import io
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.backend.config import settings
+from app.backend.database import SessionLocal
+from app.backend.models.agent_job import AgentJob
+
+HASH_BITS = 64
+# New entries are scanned linearly until this many have accumulated, then the sorted band tables are rebuilt
+_PENDING_REBUILD_THRESHOLD = 4096
+
+
+def compute_dhash(image_source: bytes | str) -> int:
+    """
+    64-bit difference hash (dHash) of an image given as bytes or a file path.
+    Re-photographed or recompressed copies of the same page land within a few bits of each other.
+    """
+    image = Image.open(image_source if isinstance(image_source, str) else io.BytesIO(image_source))
+    image.draft("L", (64, 64))  # Let JPEG decode at reduced size; we only need 9x8 pixels
+    image = ImageOps.exif_transpose(image).convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def phash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0; ~100x faster than unpacking the bits
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, HASH_BITS).sum(axis=1)
+
+
+class PerceptualHashIndex:
+    """
+    In-memory index of recent uploads by perceptual hash, answering "is there a job whose image
+    is within `max_distance` bits?".
+
+    Uses multi-index hashing: the 64-bit hash is split into max_distance + 1 bands. By the
+    pigeonhole principle any hash within max_distance bits matches at least one band exactly, so
+    a lookup only compares against the entries sharing one of its band values. Each band keeps a
+    sorted array of band values (one binary search per band), plus a scan of the few entries added
+    since the last (background) re-sort; the Hamming distances of all candidates are computed in
+    one numpy pass. Capacity is bounded; the oldest entries are overwritten first.
+
+    With the default 7 bands, an entry takes about 100 bytes and a lookup at 1M entries (~7k
+    candidates) about 0.5 ms. The index is per process: each gunicorn worker holds and loads its
+    own copy.
+    """
+
+    def __init__(self, max_distance: int, capacity: int):
+        self.max_distance = max(0, min(max_distance, HASH_BITS - 1))
+        self.capacity = max(1, capacity)
+        band_count = self.max_distance + 1
+        band_width, remainder = divmod(HASH_BITS, band_count)
+        widths = [band_width + (1 if index < remainder else 0) for index in range(band_count)]
+        self._shifts = np.cumsum([0] + widths[:-1]).astype(np.uint64)
+        self._masks = np.array([(1 << width) - 1 for width in widths], dtype=np.uint64)
+        self._band_dtype = np.min_scalar_type(max(self._masks))
+
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(self.capacity, dtype=np.uint64)
+        self._band_values = np.zeros((self.capacity, band_count), dtype=self._band_dtype)
+        self._job_ids = np.full(self.capacity, -1, dtype=np.int64)
+        self._next_slot = 0
+        self._size = 0
+        # Per band: band values sorted, and the slots they belong to (may be stale for overwritten slots)
+        self._sorted_values = np.zeros((band_count, 0), dtype=self._band_dtype)
+        self._sorted_slots = np.zeros((band_count, 0), dtype=np.int64)
+        self._pending: list[int] = []
+        self._rebuilding = False
+        self._lookups = 0
+        self._matches = 0
+
+    def _band_values_of(self, value: int) -> np.ndarray:
+        return ((np.uint64(value) >> self._shifts) & self._masks).astype(self._band_dtype)
+
+    def add(self, value: int, job_id: int):
+        band_values = self._band_values_of(value)
+        with self._lock:
+            slot = self._next_slot
+            self._hashes[slot] = np.uint64(value)
+            self._band_values[slot] = band_values
+            self._job_ids[slot] = job_id
+            self._next_slot = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            self._pending.append(slot)
+        self._maybe_start_rebuild()
+
+    def _maybe_start_rebuild(self, force: bool = False):
+        """Starts a background re-sort once enough entries are pending (or any are, with `force`)."""
+        with self._lock:
+            if self._rebuilding or not self._pending:
+                return
+            if not force and len(self._pending) < _PENDING_REBUILD_THRESHOLD:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        """Re-sorts the band tables over all entries (off the request path); pending entries stay scannable meanwhile."""
+        try:
+            with self._lock:
+                size = self._size
+                covered = len(self._pending)
+                band_values = self._band_values[:size].copy()
+            order = np.argsort(band_values, axis=0, kind="stable").T.astype(np.int64)
+            values = np.take_along_axis(band_values.T, order, axis=1)
+            with self._lock:
+                self._sorted_values, self._sorted_slots = values, order
+                self._pending = self._pending[covered:]
+        finally:
+            with self._lock:
+                self._rebuilding = False
+        # Entries added while sorting may have crossed the threshold again
+        self._maybe_start_rebuild()
+
+    def find_nearest(self, value: int, max_distance: int | None = None) -> tuple[int, int] | None:
+        """Returns (job_id, distance) of the closest indexed image within max_distance bits, if any."""
+        matches = self.find_within(value, max_distance, limit=1)
+        return matches[0] if matches else None
+
+    def find_within(self, value: int, max_distance: int | None = None, limit: int = 10) -> list[tuple[int, int]]:
+        """Returns up to `limit` (job_id, distance) of indexed images within max_distance bits, closest first."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        band_values = self._band_values_of(value)
+        with self._lock:
+            self._lookups += 1
+            candidates = []
+            for band, band_value in enumerate(band_values):
+                values = self._sorted_values[band]
+                lo = np.searchsorted(values, band_value, side="left")
+                hi = np.searchsorted(values, band_value, side="right")
+                if hi > lo:
+                    candidates.append(self._sorted_slots[band, lo:hi])
+            if self._pending:
+                pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+                candidates.append(pending[(self._band_values[pending] == band_values).any(axis=1)])
+            if not candidates:
+                return []
+            # Stale sorted entries point at overwritten slots; their current hash is compared, which is still a real entry
+            slots = np.unique(np.concatenate(candidates))
+            slots = slots[self._job_ids[slots] >= 0]
+            distances = _popcount64(np.bitwise_xor(self._hashes[slots], np.uint64(value)))
+            within = distances <= max_distance
+            slots, distances = slots[within], distances[within]
+            if not len(slots):
+                return []
+            self._matches += 1
+            order = np.argsort(distances, kind="stable")[:limit]
+            return [(int(self._job_ids[slots[i]]), int(distances[i])) for i in order]
+
+    def load_recent_jobs(self):
+        """Fills the index from the most recent jobs that have a fingerprint and OCR text."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(AgentJob.id, AgentJob.input_image_phash)
+                .filter(
+                    AgentJob.input_image_phash.isnot(None),
+                    AgentJob.input_text.isnot(None),
+                    AgentJob.input_text != "",
+                    ~AgentJob.input_text.startswith("Error:"),
+                )
+                .order_by(AgentJob.id.desc())
+                .limit(self.capacity)
+                .all()
+            )
+            for job_id, phash_hex in reversed(rows):
+                self.add(int(phash_hex, 16), job_id)
+            # Sort the remainder too, so lookups do not scan up to a threshold's worth of pending entries
+            self._maybe_start_rebuild(force=True)
+            print(f"[Image Fingerprint] Loaded {len(rows)} perceptual hashes into the near-duplicate index.")
+        except Exception as e:
+            print(f"[Image Fingerprint] Could not load perceptual hashes: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "capacity": self.capacity,
+                "max_distance": self.max_distance,
+                "bands": len(self._masks),
+                "pending_unsorted": len(self._pending),
+                "lookups": self._lookups,
+                "matches": self._matches,
+            }
+
+
+# Global instance of the PerceptualHashIndex
+phash_index = PerceptualHashIndex(
+    max_distance=settings.OCR_PHASH_MAX_DISTANCE,
+    capacity=settings.OCR_PHASH_INDEX_MAX_ENTRIES,
+)
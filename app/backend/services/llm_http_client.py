@@ -0,0 +1,103 @@
+# app/backend/services/llm_http_client.py
+import asyncio
+import importlib.util
+import time
+
+import httpx
+import litellm
+
+from app.backend.config import settings
+
+
+def http2_available() -> bool:
+    """HTTP/2 in httpx needs the optional 'h2' package (pip install httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class LLMHttpClient:
+    """
+    One pooled, keep-alive httpx.AsyncClient per process, shared by every LiteLlm-backed agent
+    of every job via `litellm.aclient_session`, so LLM calls reuse open (TLS) connections
+    instead of setting up new ones.
+
+    The client belongs to the event loop that created it: `start()` runs in each worker's
+    startup hook (after a gunicorn fork), never at import time.
+    """
+
+    def __init__(self, max_connections: int, max_keepalive_connections: int, keepalive_expiry_seconds: float,
+                 timeout_seconds: float, http2: bool):
+        self.max_connections = max(1, max_connections)
+        self.max_keepalive_connections = max(0, min(max_keepalive_connections, self.max_connections))
+        self.keepalive_expiry_seconds = keepalive_expiry_seconds
+        self.timeout_seconds = timeout_seconds
+        self.http2 = http2 and http2_available()
+        self.client: httpx.AsyncClient | None = None
+        self._warmed_connections = 0
+        self._warm_up_ms: float | None = None
+        self._warm_up_error: str | None = None
+
+    def start(self) -> httpx.AsyncClient:
+        """Creates the shared client (once) and hands it to LiteLLM."""
+        if self.client is None:
+            if settings.LLM_HTTP2_ENABLED and not self.http2:
+                print("[LLM HTTP] HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1.")
+            self.client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry_seconds,
+                ),
+                timeout=httpx.Timeout(self.timeout_seconds, connect=min(10.0, self.timeout_seconds)),
+            )
+            litellm.aclient_session = self.client
+            print(f"[LLM HTTP] Shared client ready (http2={self.http2}, max_connections={self.max_connections}, keepalive={self.max_keepalive_connections}).")
+        return self.client
+
+    async def warm_up(self, urls: list[str], connections_per_url: int):
+        """
+        Opens `connections_per_url` keep-alive connections to every URL (DNS, TCP and TLS done
+        ahead of the first job). The responses, typically 401 without credentials, are ignored.
+        With HTTP/2 one connection per host is multiplexed, so a single request per URL suffices.
+        """
+        client = self.start()
+        per_url = 1 if self.http2 else max(1, min(connections_per_url, self.max_keepalive_connections or 1))
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[client.head(url) for url in urls for _ in range(per_url)],
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        self._warmed_connections = len(results) - len(errors)
+        self._warm_up_ms = (time.perf_counter() - started) * 1000
+        self._warm_up_error = str(errors[0]) if errors else None
+        print(f"[LLM HTTP] Pre-warmed {self._warmed_connections}/{len(results)} connection(s) in {self._warm_up_ms:.0f} ms.")
+
+    async def close(self):
+        if self.client is not None:
+            if litellm.aclient_session is self.client:
+                litellm.aclient_session = None
+            await self.client.aclose()
+            self.client = None
+
+    def stats(self) -> dict:
+        return {
+            "started": self.client is not None,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.keepalive_expiry_seconds,
+            "warmed_connections": self._warmed_connections,
+            "warm_up_ms": self._warm_up_ms,
+            "warm_up_error": self._warm_up_error,
+        }
+
+
+# Global instance of the LLMHttpClient
+llm_http_client = LLMHttpClient(
+    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry_seconds=settings.LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    timeout_seconds=settings.LLM_HTTP_TIMEOUT_SECONDS,
+    http2=settings.LLM_HTTP2_ENABLED,
+)
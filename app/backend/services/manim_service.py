@@ -4,6 +4,9 @@ import shutil
 from pathlib import Path
 import subprocess # For running Manim CLI
 
+from app.backend.config import settings
+from .manim_validator import strip_code_fences
+
 # This base directory path assumes manim_service.py is in app/backend/services/
 # and the static content is in app/backend/static_content/manim_videos/
 # Adjust if your project structure is different or use an absolute path from settings.
@@ -12,6 +15,25 @@ MANIM_OUTPUT_BASE_DIR = Path(__file__).resolve().parent.parent / "static_content
 # Ensure the base output directory exists upon module load
 MANIM_OUTPUT_BASE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Box-drawing characters of Manim's (rich) traceback frames
+_TRACEBACK_FRAME_CHARS = "│╭╮╰╯─ "
+
+def trim_manim_traceback(stderr: str, max_chars: int | None = None) -> str:
+    """
+    Reduces Manim's stderr to the part that explains a failed render: the last traceback without
+    rich's frame borders and blank lines, cut from the front to `max_chars` so the final exception
+    line is always kept.
+    """
+    max_chars = settings.MANIM_TRACEBACK_MAX_CHARS if max_chars is None else max_chars
+    start = stderr.rfind("Traceback")
+    if start > 0:
+        start = stderr.rfind("\n", 0, start) + 1
+    lines = [line.strip(_TRACEBACK_FRAME_CHARS) for line in stderr[max(start, 0):].splitlines()]
+    trimmed = "\n".join(line for line in lines if line)
+    if max_chars and len(trimmed) > max_chars:
+        trimmed = "..." + trimmed[-max_chars:]
+    return trimmed
+
 # Helper to run subprocess asynchronously
 async def run_manim_subprocess_async(command_list: list[str], cwd: Path) -> tuple[int, str, str]:
     """Runs a subprocess asynchronously and returns its exit code, stdout, and stderr."""
@@ -49,15 +71,7 @@ async def execute_manim_code(job_id: str, manim_code: str, scene_name: str = "Co
     manim_script_path = script_dir / "generated_scene.py"
 
     # --- Clean the Manim code from Markdown backticks --- 
-    cleaned_code = manim_code.strip()
-    if cleaned_code.startswith("```python"):
-        cleaned_code = cleaned_code[len("```python"):].lstrip()
-    elif cleaned_code.startswith("```"):
-        cleaned_code = cleaned_code[len("```"):].lstrip()
-        
-    if cleaned_code.endswith("```"):
-        cleaned_code = cleaned_code[:-len("```")]
-    cleaned_code = cleaned_code.strip() # Final strip for any residual newlines around the actual code
+    cleaned_code = strip_code_fences(manim_code)
     # --- End cleaning ---
 
     if not cleaned_code:
@@ -117,7 +131,7 @@ async def execute_manim_code(job_id: str, manim_code: str, scene_name: str = "Co
         return_code, stdout_str, stderr_str = await run_manim_subprocess_async(cmd, cwd=script_dir)
 
         if return_code != 0:
-            error_msg = f"Manim execution failed with code {return_code}. STDERR: {stderr_str[:1000]}..." # Increased length for better error visibility
+            error_msg = f"Manim execution failed with code {return_code}. STDERR: {trim_manim_traceback(stderr_str)}"
             print(f"[Manim Service] {error_msg}")
             return None, error_msg
 
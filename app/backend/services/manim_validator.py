@@ -0,0 +1,146 @@
+# app/backend/services/manim_validator.py
+import ast
+import re
+from dataclasses import dataclass
+
+# Classes the code generator is told never to use (they need LaTeX or external files)
+FORBIDDEN_CLASSES = {"Tex", "MathTex", "SVGMobject", "ImageMobject"}
+RATE_FUNC_KEYWORDS = {"rate_func", "rate_functions"}
+NO_ISSUES_MESSAGE = "No issues found by static validation."
+
+
+@dataclass
+class ValidationFinding:
+    rule: str
+    message: str
+    line: int | None = None
+
+    def __str__(self) -> str:
+        location = f"line {self.line}: " if self.line else ""
+        return f"- [{self.rule}] {location}{self.message}"
+
+
+def strip_code_fences(code: str) -> str:
+    """Removes the Markdown ```python fences the LLM wraps code in."""
+    cleaned = (code or "").strip()
+    if cleaned.startswith("```python"):
+        cleaned = cleaned[len("```python"):].lstrip()
+    elif cleaned.startswith("```"):
+        cleaned = cleaned[len("```"):].lstrip()
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-len("```")]
+    return cleaned.strip()
+
+
+def _called_name(call: ast.Call) -> str | None:
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return None
+
+
+def _is_self_play(call: ast.Call) -> bool:
+    func = call.func
+    return isinstance(func, ast.Attribute) and func.attr == "play" and isinstance(func.value, ast.Name) and func.value.id == "self"
+
+
+def _base_name(base: ast.expr) -> str | None:
+    if isinstance(base, ast.Name):
+        return base.id
+    if isinstance(base, ast.Attribute):
+        return base.attr
+    return None
+
+
+def _scene_classes(tree: ast.Module) -> list[ast.ClassDef]:
+    """Top-level classes deriving from a Manim `*Scene` (Scene, MovingCameraScene, ...) or from such a class defined earlier."""
+    scene_classes = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [_base_name(base) or "" for base in node.bases]
+        if any(base.endswith("Scene") or base in {cls.name for cls in scene_classes} for base in bases):
+            scene_classes.append(node)
+    return scene_classes
+
+
+def scene_class_names(code: str) -> list[str]:
+    """
+    Names of the renderable scene classes in the code, in definition order. Uses the same rule as
+    the validator's missing-scene check; code that doesn't parse falls back to a regex on `class X(...Scene):`.
+    """
+    source = strip_code_fences(code)
+    try:
+        return [node.name for node in _scene_classes(ast.parse(source))]
+    except SyntaxError:
+        return re.findall(r"^class\s+([A-Za-z_][A-Za-z0-9_]*)\s*\([^)]*Scene\s*\)\s*:", source, re.MULTILINE)
+
+
+def validate_manim_code(code: str) -> list[ValidationFinding]:
+    """
+    Checks generated Manim code against the rules the code generator is given:
+    no Tex/MathTex/SVGMobject/ImageMobject, no `corner_radius` on Rectangle, `rate_func` only on
+    `self.play(...)`, global helpers not called through `self.`, and a Scene subclass to render.
+    """
+    source = strip_code_fences(code)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return [ValidationFinding("syntax-error", f"Code does not parse: {e.msg}", e.lineno)]
+
+    findings = []
+    global_functions = {node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    if not _scene_classes(tree):
+        findings.append(ValidationFinding("missing-scene", "No class inheriting from Scene is defined, so there is nothing to render."))
+    methods = {
+        item.name
+        for node in tree.body if isinstance(node, ast.ClassDef)
+        for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+
+    for node in ast.walk(tree):
+        # Bare names, module attributes (`manim.MathTex`, `mn.Tex`) and imports (`from manim import Tex as T`)
+        forbidden = None
+        if isinstance(node, ast.Name) and node.id in FORBIDDEN_CLASSES:
+            forbidden = node.id
+        elif isinstance(node, ast.Attribute) and node.attr in FORBIDDEN_CLASSES:
+            forbidden = node.attr
+        elif isinstance(node, ast.ImportFrom):
+            forbidden = next((alias.name for alias in node.names if alias.name in FORBIDDEN_CLASSES and alias.asname), None)
+        if forbidden:
+            findings.append(ValidationFinding("forbidden-class", f"`{forbidden}` is not allowed; use `Text(...)` with Unicode instead.", node.lineno))
+        if not isinstance(node, ast.Call):
+            continue
+        called = _called_name(node)
+
+        if called == "Rectangle" and any(keyword.arg == "corner_radius" for keyword in node.keywords):
+            findings.append(ValidationFinding("rectangle-corner-radius", "`Rectangle` has no `corner_radius` argument; use `RoundedRectangle(corner_radius=...)`.", node.lineno))
+
+        if _is_self_play(node):
+            for animation in node.args:
+                if isinstance(animation, ast.Call) and any(keyword.arg in RATE_FUNC_KEYWORDS for keyword in animation.keywords):
+                    findings.append(ValidationFinding(
+                        "rate-func-in-animation",
+                        f"`rate_func` is passed to `{_called_name(animation)}(...)`; pass it to `self.play(...)` instead.",
+                        animation.lineno
+                    ))
+
+        func = node.func
+        if (
+            isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id == "self"
+            and func.attr in global_functions
+            and func.attr not in methods
+        ):
+            findings.append(ValidationFinding("self-call-to-global", f"`self.{func.attr}(...)` calls a module-level function; call `{func.attr}(...)` directly.", node.lineno))
+
+    return findings
+
+
+def format_findings(findings: list[ValidationFinding]) -> str:
+    """Findings as a bulleted list for prompts and logs."""
+    if not findings:
+        return NO_ISSUES_MESSAGE
+    return "\n".join(str(finding) for finding in findings)
@@ -0,0 +1,183 @@
+# app/backend/services/ocr_backends.py
+"""
+Inference backends for the EasyOCR detector (CRAFT) and recognizer.
+
+- "easyocr":      stock PyTorch fp32 models
+- "easyocr_int8": recognizer (LSTM + Linear layers) dynamically quantized to int8 with PyTorch, which is
+                  what easyocr.Reader does by default on CPU (quantize=True); CRAFT is convolution-only,
+                  which dynamic quantization doesn't cover, so it stays fp32
+- "onnx":         fp32 detector and recognizer exported once to ONNX and run with ONNX Runtime
+- "onnx_int8":    like "onnx", with ONNX Runtime dynamic int8 quantization of the exported models
+
+The Reader is always built with quantize=False, so int8 is applied only by the *_int8 backends and
+the ONNX export sees the fp32 networks. All backends keep EasyOCR's pre/post-processing; only the
+two networks are swapped, so they can be compared like for like (see benchmarks/ocr_benchmark.py).
+"""
+import hashlib
+import os
+from pathlib import Path
+
+import easyocr
+import torch
+
+from app.backend.config import settings
+
+OCR_BACKENDS = ("easyocr", "easyocr_int8", "onnx", "onnx_int8")
+# Engine and weight precision of each backend, as reported by the benchmark
+OCR_BACKEND_LABELS = {
+    "easyocr": "PyTorch fp32",
+    "easyocr_int8": "PyTorch dynamic int8 recognizer",
+    "onnx": "ONNX Runtime fp32",
+    "onnx_int8": "ONNX Runtime dynamic int8",
+}
+
+ONNX_MODEL_DIR = Path(settings.OCR_ONNX_MODEL_DIR) if settings.OCR_ONNX_MODEL_DIR else Path(__file__).resolve().parent.parent / "ocr_models" / "onnx"
+
+
+class _OnnxDetector(torch.nn.Module):
+    """Drop-in for the CRAFT module: easyocr calls `y, feature = net(x)` on a float NCHW tensor."""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def forward(self, x):
+        y, feature = self.session.run(None, {"input": x.detach().cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+
+class _OnnxRecognizer(torch.nn.Module):
+    """Drop-in for the recognizer: easyocr calls `model(image, text_for_pred)`; `text` is unused by the network."""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def forward(self, x, text=None):
+        (prediction,) = self.session.run(None, {"input": x.detach().cpu().numpy()})
+        return torch.from_numpy(prediction)
+
+
+class _RecognizerExportWrapper(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x, None)
+
+
+def _model_id(languages: list[str]) -> str:
+    # "fp32": exports from before the Reader was built unquantized may hold quantized modules
+    key = f"{getattr(easyocr, '__version__', 'unknown')}|{','.join(languages)}|fp32"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomically(path: Path, write):
+    """
+    Runs `write(tmp_path)` on a per-process temp file next to `path`, then renames it into place.
+    OCR workers warm up concurrently and may all export the same model; the rename is atomic, so
+    none of them can load a half-written file (the last identical export wins).
+    """
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _export_onnx_models(reader: easyocr.Reader, languages: list[str], quantize: bool) -> tuple[Path, Path | None]:
+    """Exports (once, cached on disk) the detector and recognizer. Returns their paths; recognizer may be None."""
+    ONNX_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    model_id = _model_id(languages)
+    detector_path = ONNX_MODEL_DIR / f"detector-{model_id}.onnx"
+    recognizer_path = ONNX_MODEL_DIR / f"recognizer-{model_id}.onnx"
+
+    if not detector_path.exists():
+        print(f"[OCR Backends] Exporting CRAFT detector to {detector_path}...")
+        _write_atomically(detector_path, lambda tmp_path: torch.onnx.export(
+            reader.detector,
+            torch.randn(1, 3, 640, 640),
+            str(tmp_path),
+            input_names=["input"],
+            output_names=["y", "feature"],
+            dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}, "y": {0: "batch", 1: "y_height", 2: "y_width"}, "feature": {0: "batch", 2: "f_height", 3: "f_width"}},
+            opset_version=17,
+        ))
+
+    if not recognizer_path.exists():
+        print(f"[OCR Backends] Exporting recognizer to {recognizer_path}...")
+        try:
+            _write_atomically(recognizer_path, lambda tmp_path: torch.onnx.export(
+                _RecognizerExportWrapper(reader.recognizer).eval(),
+                torch.randn(1, 1, 64, 256),
+                str(tmp_path),
+                input_names=["input"],
+                output_names=["prediction"],
+                dynamic_axes={"input": {0: "batch", 3: "width"}, "prediction": {0: "batch", 1: "sequence"}},
+                opset_version=17,
+            ))
+        except Exception as e:
+            # Some recognizer variants use ops the exporter can't map; fall back to PyTorch for them
+            print(f"[OCR Backends] WARNING: Recognizer ONNX export failed, OCR_BACKEND={'onnx_int8' if quantize else 'onnx'} "
+                  f"will run the PyTorch fp32 recognizer with the ONNX detector: {e}")
+            recognizer_path = None
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_paths = []
+        for path in (detector_path, recognizer_path):
+            if path is None:
+                quantized_paths.append(None)
+                continue
+            quantized_path = path.with_name(path.stem + "-int8.onnx")
+            if not quantized_path.exists():
+                print(f"[OCR Backends] Quantizing {path.name} to int8...")
+                _write_atomically(quantized_path, lambda tmp_path, path=path: quantize_dynamic(str(path), str(tmp_path), weight_type=QuantType.QInt8))
+            quantized_paths.append(quantized_path)
+        detector_path, recognizer_path = quantized_paths
+
+    return detector_path, recognizer_path
+
+
+def _onnx_session(path: Path):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    # Honour the per-worker thread budget set up by ocr_executor
+    options.intra_op_num_threads = torch.get_num_threads()
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def create_reader(languages: list[str], gpu: bool, backend: str | None = None) -> easyocr.Reader:
+    """Builds an easyocr.Reader whose networks run on the requested backend (default settings.OCR_BACKEND)."""
+    backend = backend or settings.OCR_BACKEND
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR_BACKEND '{backend}', expected one of {OCR_BACKENDS}")
+
+    # Unquantized, so "easyocr" really is fp32 and quantization is applied only where the backend asks for it
+    reader = easyocr.Reader(languages, gpu=gpu, quantize=False)
+    if backend == "easyocr":
+        return reader
+    if gpu:
+        print(f"[OCR Backends] OCR_BACKEND={backend} targets CPU inference; using the stock models because gpu=True.")
+        return reader
+
+    if backend == "easyocr_int8":
+        reader.recognizer = torch.quantization.quantize_dynamic(
+            reader.recognizer, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8
+        )
+        return reader
+
+    try:
+        import onnxruntime  # noqa: F401  (optional dependency, only needed for the onnx backends)
+    except ImportError:
+        raise RuntimeError(f"OCR_BACKEND={backend} requires the 'onnxruntime' package (and 'onnx' for onnx_int8).")
+
+    detector_path, recognizer_path = _export_onnx_models(reader, languages, quantize=(backend == "onnx_int8"))
+    reader.detector = _OnnxDetector(_onnx_session(detector_path))
+    if recognizer_path is not None:
+        reader.recognizer = _OnnxRecognizer(_onnx_session(recognizer_path))
+    return reader
@@ -0,0 +1,182 @@
+# app/backend/services/ocr_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+
+from sqlalchemy.exc import IntegrityError
+
+from app.backend.config import settings
+from app.backend.database import SessionLocal
+from app.backend.models.ocr_cache_entry import OCRCacheEntry
+
+
+def compute_image_hash(image_bytes: bytes) -> str:
+    """Content address of an upload: sha256 over the decoded image bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _easyocr_version() -> str:
+    # Read from the installed package metadata; importing easyocr just for its version pulls in torch
+    try:
+        return version("easyocr")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def current_ocr_namespace() -> str:
+    """
+    Hash of everything that changes OCR output for the same image bytes.
+    Changing the EasyOCR version, the backend, the language list, OCR_TILE_PARALLEL or OCR_CACHE_VERSION yields a new
+    namespace, which invalidates all previously cached results.
+    """
+    parts = [
+        f"easyocr={_easyocr_version()}",
+        f"backend={settings.OCR_BACKEND}",
+        f"languages={','.join(settings.ocr_languages_list)}",
+        # Tile-parallel recognition orders the text with sort_reading_order instead of EasyOCR's own order
+        f"tile_parallel={settings.OCR_TILE_PARALLEL}",
+        f"version={settings.OCR_CACHE_VERSION}",
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class OCRResultCache:
+    """
+    Two-tier, content-addressed cache of OCR results.
+
+    1. A bounded in-process LRU (fast, per process).
+    2. The `ocr_cache_entries` table (survives restarts, shared by all workers).
+    """
+
+    def __init__(self, max_memory_entries: int, persistent: bool):
+        self.max_memory_entries = max(0, max_memory_entries)
+        self.persistent = persistent
+        self.namespace = current_ocr_namespace()
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._errors = 0
+
+    def make_key(self, image_sha256: str, variant: str = "") -> str:
+        """`variant` captures request options that change the result for the same bytes."""
+        return hashlib.sha256(f"{self.namespace}|{image_sha256}|{variant}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, text: str):
+        if not self.max_memory_entries:
+            return
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, image_sha256: str, variant: str = "") -> str | None:
+        key = self.make_key(image_sha256, variant)
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return text
+
+        if self.persistent:
+            db = SessionLocal()
+            try:
+                entry = db.query(OCRCacheEntry).filter(OCRCacheEntry.cache_key == key).first()
+                if entry:
+                    with self._lock:
+                        self._disk_hits += 1
+                    self._remember(key, entry.extracted_text)
+                    return entry.extracted_text
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                print(f"[OCR Cache] Lookup in persistent tier failed: {e}")
+            finally:
+                db.close()
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, image_sha256: str, text: str, variant: str = ""):
+        key = self.make_key(image_sha256, variant)
+        self._remember(key, text)
+        with self._lock:
+            self._writes += 1
+        if not self.persistent:
+            return
+
+        db = SessionLocal()
+        try:
+            db.add(OCRCacheEntry(
+                cache_key=key,
+                namespace=self.namespace,
+                image_sha256=image_sha256,
+                extracted_text=text
+            ))
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same result first; nothing to do
+            db.rollback()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._errors += 1
+            print(f"[OCR Cache] Write to persistent tier failed: {e}")
+        finally:
+            db.close()
+
+    def invalidate(self, all_namespaces: bool = False) -> int:
+        """
+        Clears the memory tier and deletes persisted entries from stale namespaces
+        (or every entry when `all_namespaces` is True). Returns the number of deleted rows.
+        """
+        with self._lock:
+            self._memory.clear()
+        if not self.persistent:
+            return 0
+
+        db = SessionLocal()
+        try:
+            query = db.query(OCRCacheEntry)
+            if not all_namespaces:
+                query = query.filter(OCRCacheEntry.namespace != self.namespace)
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            print(f"[OCR Cache] Invalidated {deleted} persisted entries (all_namespaces={all_namespaces}).")
+            return deleted
+        except Exception as e:
+            db.rollback()
+            print(f"[OCR Cache] Invalidation failed: {e}")
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                "namespace": self.namespace,
+                "persistent": self.persistent,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_memory_entries,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "errors": self._errors,
+                "hit_rate": ((self._memory_hits + self._disk_hits) / lookups) if lookups else 0.0,
+            }
+
+
+# Global instance of the OCRResultCache
+ocr_result_cache = OCRResultCache(
+    max_memory_entries=settings.OCR_CACHE_MEMORY_ENTRIES,
+    persistent=settings.OCR_CACHE_PERSISTENT,
+)
@@ -0,0 +1,250 @@
+# app/backend/services/ocr_executor.py
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.backend.config import settings
+
+# NOTE: keep torch/easyocr imports out of module scope. Worker processes import this module
+# to run `_init_worker`, and the torch thread budget has to be applied before torch loads.
+
+
+class OCRQueueFullError(Exception):
+    """Raised when the OCR queue is at capacity; callers should retry later."""
+
+    def __init__(self, retry_after_seconds: int):
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__(f"OCR queue is full. Retry after {retry_after_seconds}s.")
+
+
+def _init_worker(torch_threads: int, ready_counter):
+    """
+    Initializer for OCR worker processes: apply the thread budget, warm a reader, then count
+    this worker as ready in the shared `ready_counter`.
+    """
+    threads = str(max(1, torch_threads))
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    import torch
+    torch.set_num_threads(max(1, torch_threads))
+
+    # One reader per worker process (OCR_READER_POOL_SIZE doesn't apply); work inside a worker is sequential anyway.
+    from app.backend.services.ocr_reader_pool import ocr_reader_pool
+    ocr_reader_pool.resize(1)
+    ocr_reader_pool.warm_up()
+    with ready_counter.get_lock():
+        ready_counter.value += 1
+
+
+def _ping_worker() -> int:
+    """No-op task used at startup to make the pool spawn its worker processes and surface start errors."""
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _timed_call(fn, args: tuple):
+    """Runs `fn(*args)` and reports when it started, so the caller can measure queue wait."""
+    return time.time(), fn(*args)
+
+
+class OCRExecutor:
+    """
+    Runs OCR work off the event loop with bounded concurrency.
+
+    With OCR_EXECUTOR_WORKERS > 0 work is sent to a process pool (each worker holds its own
+    warmed EasyOCR reader), so recognition isn't serialized behind the GIL. With 0 workers it
+    falls back to a thread using the in-process reader pool.
+
+    At most `workers + max_queued` calls are in flight; beyond that `OCRQueueFullError` is raised
+    so the API can answer 429 instead of queueing unboundedly.
+    """
+
+    def __init__(self, workers: int, torch_threads: int, max_queued: int, retry_after_seconds: int):
+        self.workers = max(0, workers)
+        self.torch_threads = torch_threads
+        self.max_queued = max(0, max_queued)
+        self.default_retry_after_seconds = max(1, retry_after_seconds)
+
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._pool: ProcessPoolExecutor | None = None
+        # Incremented by each worker's initializer once its reader is warm. Created in start(), so
+        # API processes forked from a preloading gunicorn master don't share one counter.
+        self._ready_counter = None
+        self._start_error: str | None = None
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._recent_run_seconds: deque[float] = deque(maxlen=256)
+        self._recent_wait_seconds: deque[float] = deque(maxlen=256)
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.workers) + self.max_queued
+
+    @property
+    def ready(self) -> bool:
+        if self.workers == 0:
+            from app.backend.services.ocr_reader_pool import ocr_reader_pool
+            return ocr_reader_pool.ready
+        return self._pool is not None and self._ready_workers() >= self.workers
+
+    async def start(self):
+        """
+        Creates the worker processes. Readiness is counted by the workers' initializers, so
+        `ready` turns True once every worker has warmed its reader.
+        """
+        if self.workers == 0:
+            from app.backend.services.ocr_reader_pool import ocr_reader_pool
+            await asyncio.get_running_loop().run_in_executor(None, ocr_reader_pool.warm_up)
+            return
+        if self._pool is not None:
+            return
+
+        print(f"[OCR Executor] Starting {self.workers} OCR worker process(es) with {self.torch_threads} torch thread(s) each...")
+        self._ready_counter = self._mp_context.Value("i", 0)
+        # Published right away: calls made while the workers warm up queue on the pool
+        self._pool = pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=(self.torch_threads, self._ready_counter),
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(*[loop.run_in_executor(pool, _ping_worker) for _ in range(self.workers)])
+        except Exception as e:
+            self._start_error = str(e)
+            print(f"[OCR Executor] Failed to start OCR workers: {e}")
+            self.shutdown()
+            return
+        self._start_error = None
+        print(f"[OCR Executor] Started. {self._ready_workers()}/{self.workers} worker(s) ready so far; answered by PIDs {sorted(set(pids))}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._ready_counter = None
+
+    def retry_after_seconds(self) -> int:
+        """Estimates how long until a queue slot frees up, based on recent OCR run times."""
+        with self._lock:
+            if not self._recent_run_seconds:
+                return self.default_retry_after_seconds
+            avg_run = sum(self._recent_run_seconds) / len(self._recent_run_seconds)
+            backlog = self._in_flight - max(1, self.workers) + 1
+        return max(1, math.ceil(avg_run * max(1, backlog) / max(1, self.workers)))
+
+    def reserve_slot(self) -> "OCRSlot":
+        """
+        Reserves a place in the OCR queue ahead of time, e.g. when a job is accepted but OCR
+        runs later in the background. Raises OCRQueueFullError when the queue is full.
+        """
+        with self._lock:
+            if self._in_flight < self.capacity:
+                self._in_flight += 1
+                return OCRSlot(self)
+            self._rejected += 1
+        raise OCRQueueFullError(self.retry_after_seconds())
+
+    def _ready_workers(self) -> int:
+        return self._ready_counter.value if self._ready_counter is not None else 0
+
+    def _worker_pool(self) -> ProcessPoolExecutor | None:
+        """The process pool to run on; None only in thread mode (0 workers)."""
+        if self.workers and self._pool is None:
+            raise RuntimeError(f"OCR workers are not running{f': {self._start_error}' if self._start_error else ''}.")
+        return self._pool
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def record_timings(self, wait_seconds: float, run_seconds: float):
+        """Feeds the Retry-After estimate; also used by callers that split one slot into sub-tasks."""
+        with self._lock:
+            self._completed += 1
+            self._recent_run_seconds.append(run_seconds)
+            self._recent_wait_seconds.append(max(0.0, wait_seconds))
+
+    async def run(self, fn, *args, slot: "OCRSlot | None" = None):
+        """
+        Runs the picklable, module-level function `fn(*args)` on the OCR workers.
+        Uses (and releases) `slot` if given, otherwise reserves one, raising
+        OCRQueueFullError when the queue is full.
+        """
+        slot = slot or self.reserve_slot()
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(self._worker_pool(), _timed_call, fn, args)
+            self.record_timings(started - submitted, time.time() - started)
+            return result
+        finally:
+            slot.release()
+
+    async def run_subtasks(self, fn, args_list: list[tuple]) -> list:
+        """
+        Fans `fn(*args)` for every args tuple out across the workers and returns results in order.
+        Meant for splitting up a call that already holds a slot (e.g. tile-parallel recognition),
+        so sub-tasks are not counted against the queue.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._worker_pool()
+        return await asyncio.gather(*[loop.run_in_executor(pool, fn, *args) for args in args_list])
+
+    def stats(self) -> dict:
+        """Queue depth and timing metrics (times in milliseconds)."""
+        with self._lock:
+            runs = list(self._recent_run_seconds)
+            waits = list(self._recent_wait_seconds)
+            return {
+                "ready": self.ready,
+                "mode": "process_pool" if self.workers else "thread",
+                "workers": self.workers,
+                "ready_workers": self._ready_workers(),
+                "start_error": self._start_error,
+                "torch_threads_per_worker": self.torch_threads,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "run_ms_avg": (sum(runs) / len(runs) * 1000) if runs else 0.0,
+                "queue_wait_ms_avg": (sum(waits) / len(waits) * 1000) if waits else 0.0,
+                "queue_wait_ms_max": (max(waits) * 1000) if waits else 0.0,
+            }
+
+
+class OCRSlot:
+    """A reserved place in the OCR queue. Releasing is idempotent."""
+
+    def __init__(self, executor: OCRExecutor):
+        self._executor = executor
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._executor._release_slot()
+
+
+def _default_torch_threads(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+# Global instance of the OCRExecutor.
+# With OCR_PRELOAD_MODELS each API worker runs OCR in-process on the readers it inherited from
+# the gunicorn master; spawning OCR worker processes would load private copies of the models again.
+ocr_executor = OCRExecutor(
+    workers=0 if settings.OCR_PRELOAD_MODELS else settings.OCR_EXECUTOR_WORKERS,
+    torch_threads=settings.OCR_TORCH_THREADS_PER_WORKER or _default_torch_threads(settings.OCR_EXECUTOR_WORKERS),
+    max_queued=settings.OCR_MAX_QUEUED_JOBS,
+    retry_after_seconds=settings.OCR_RETRY_AFTER_SECONDS,
+)
@@ -0,0 +1,141 @@
+# app/backend/services/ocr_preprocessing.py
+import io
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from pydantic import BaseModel
+
+from app.backend.config import settings
+
+
+class OCRPreprocessOptions(BaseModel):
+    """
+    Preprocessing applied to an upload before it reaches the OCR detector.
+    Detection cost grows with pixel count, so multi-megapixel phone photos are shrunk first.
+    """
+    enabled: bool = True
+    max_long_edge: int = 1600  # 0 disables downscaling
+    grayscale: bool = True
+    autocrop: bool = True
+    autocrop_tolerance: int = 24  # Grey-level distance from the background that counts as content
+    autocrop_margin: int = 8  # Pixels kept around the detected content
+    deskew: bool = False
+    max_deskew_angle: float = 15.0
+    # Optional (x, y, width, height) in pixels of the original image
+    crop_box: tuple[int, int, int, int] | None = None
+
+    def cache_variant(self) -> str:
+        """Stable description of the options, part of the OCR cache key."""
+        if not self.enabled:
+            return f"raw|crop={self.crop_box}"
+        return (
+            f"edge={self.max_long_edge}|gray={self.grayscale}|autocrop={self.autocrop}:"
+            f"{self.autocrop_tolerance}:{self.autocrop_margin}|deskew={self.deskew}:"
+            f"{self.max_deskew_angle}|crop={self.crop_box}"
+        )
+
+
+def build_preprocess_options(crop_box=None, **overrides) -> OCRPreprocessOptions:
+    """Options from settings.OCR_*; `crop_box` is any object with x/y/width/height (e.g. schemas CropBox)."""
+    options = {
+        "enabled": settings.OCR_PREPROCESS_ENABLED,
+        "max_long_edge": settings.OCR_MAX_LONG_EDGE,
+        "grayscale": settings.OCR_GRAYSCALE,
+        "autocrop": settings.OCR_AUTOCROP,
+        "deskew": settings.OCR_DESKEW,
+    }
+    if crop_box is not None:
+        options["crop_box"] = (crop_box.x, crop_box.y, crop_box.width, crop_box.height)
+    options.update(overrides)
+    return OCRPreprocessOptions(**options)
+
+
+def _apply_crop_box(image: Image.Image, crop_box: tuple[int, int, int, int]) -> Image.Image:
+    x, y, width, height = crop_box
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(image.width, x + width), min(image.height, y + height)
+    if right <= left or bottom <= top:
+        print(f"OCR Preprocessing: Crop box {crop_box} is outside the {image.size} image, ignoring it.")
+        return image
+    return image.crop((left, top, right, bottom))
+
+
+def _autocrop(gray: np.ndarray, tolerance: int, margin: int) -> tuple[int, int, int, int] | None:
+    """Bounding box (left, top, right, bottom) of everything that differs from the border colour."""
+    border = np.concatenate([gray[0, :], gray[-1, :], gray[:, 0], gray[:, -1]])
+    background = int(np.median(border))
+    mask = np.abs(gray.astype(np.int16) - background) > tolerance
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0 or cols.size == 0:
+        return None  # Blank image; leave it to OCR to report nothing
+    height, width = gray.shape
+    return (
+        max(0, int(cols[0]) - margin),
+        max(0, int(rows[0]) - margin),
+        min(width, int(cols[-1]) + margin + 1),
+        min(height, int(rows[-1]) + margin + 1),
+    )
+
+
+def _estimate_skew_angle(gray: np.ndarray, max_angle: float) -> float:
+    """Skew of the text block in degrees, from the minimum-area rectangle around dark pixels."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(binary)
+    if coords is None or len(coords) < 50:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    # OpenCV reports angles in [0, 90) (>=4.5) or [-90, 0) (older); fold into [-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return angle if abs(angle) <= max_angle else 0.0
+
+
+def _rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_image(image_bytes: bytes, options: OCRPreprocessOptions) -> np.ndarray | bytes:
+    """
+    Crop box -> downscale -> grayscale -> trim blank borders -> deskew.
+    Returns an array EasyOCR's readtext accepts (grayscale, or BGR like cv2.imread),
+    or the untouched bytes when preprocessing is disabled and there is no crop box.
+    """
+    if not options.enabled and options.crop_box is None:
+        return image_bytes
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if options.enabled and options.crop_box is None and options.max_long_edge:
+        # Let the JPEG decoder skip pixels we'd throw away anyway (no-op for other formats)
+        image.draft("L" if options.grayscale else "RGB", (options.max_long_edge, options.max_long_edge))
+    image = ImageOps.exif_transpose(image)  # Phone photos are often stored rotated
+
+    if options.crop_box is not None:
+        image = _apply_crop_box(image, options.crop_box)
+    if not options.enabled:
+        return np.array(image.convert("RGB"))[:, :, ::-1]
+
+    if options.max_long_edge and max(image.size) > options.max_long_edge:
+        image.thumbnail((options.max_long_edge, options.max_long_edge), Image.Resampling.LANCZOS)
+
+    gray = np.array(image.convert("L"))
+    pixels = gray if options.grayscale else np.array(image.convert("RGB"))[:, :, ::-1]
+
+    if options.autocrop:
+        box = _autocrop(gray, options.autocrop_tolerance, options.autocrop_margin)
+        if box is not None:
+            left, top, right, bottom = box
+            gray = gray[top:bottom, left:right]
+            pixels = pixels[top:bottom, left:right]
+
+    if options.deskew:
+        angle = _estimate_skew_angle(gray, options.max_deskew_angle)
+        if abs(angle) >= 0.5:
+            pixels = _rotate(pixels, angle)
+
+    return np.ascontiguousarray(pixels)
@@ -0,0 +1,180 @@
+# app/backend/services/ocr_reader_pool.py
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import easyocr
+import numpy as np
+
+from app.backend.config import settings
+from app.backend.services.ocr_backends import create_reader
+
+
+class OCRReaderPoolTimeout(Exception):
+    """Raised when no EasyOCR reader becomes available within the checkout timeout."""
+
+
+class OCRReaderPool:
+    """
+    A fixed-size pool of preloaded EasyOCR readers.
+
+    Building an `easyocr.Reader` loads the CRAFT detector and the recognizer weights
+    from disk, so we do it once per pool slot (at startup via `warm_up`) and hand the
+    same readers out for every request afterwards.
+    """
+
+    def __init__(self, size: int, languages: list[str], gpu: bool, checkout_timeout: float):
+        self.size = max(1, size)
+        self.languages = languages
+        self.gpu = gpu
+        self.checkout_timeout = checkout_timeout
+
+        self._readers: queue.Queue = queue.Queue()
+        self._warmup_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warming_up = False
+        self._warmup_error: str | None = None
+        self._warmup_seconds: float | None = None
+
+        # Checkout metrics, used to size the pool
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._recent_waits: deque[float] = deque(maxlen=1024)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def resize(self, size: int):
+        """Changes the number of readers. Only valid before the pool has been warmed up."""
+        if self.ready or self._readers.qsize():
+            raise RuntimeError("Cannot resize an OCR reader pool that is already warmed up.")
+        self.size = max(1, size)
+
+    @staticmethod
+    def _prime_reader(reader: easyocr.Reader):
+        # Run one tiny inference so lazily initialised parts of the models are loaded too
+        reader.readtext(np.full((32, 128), 255, dtype=np.uint8))
+
+    def _build_reader(self, run_inference: bool = True) -> easyocr.Reader:
+        reader = create_reader(self.languages, gpu=self.gpu)
+        if run_inference:
+            self._prime_reader(reader)
+        return reader
+
+    def warm_up(self, run_inference: bool = True):
+        """
+        Builds all readers of the pool. Safe to call more than once.
+
+        Pass `run_inference=False` to only load the weights, e.g. in a pre-fork master process:
+        running inference would start torch's OpenMP thread pool, which does not survive a fork.
+        Forked children then call `prime()` instead.
+        """
+        with self._warmup_lock:
+            if self.ready:
+                return
+            self._warming_up = True
+            started = time.perf_counter()
+            print(f"[OCR Reader Pool] Warming up {self.size} EasyOCR reader(s) for languages {self.languages} (gpu={self.gpu}, backend={settings.OCR_BACKEND})...")
+            try:
+                for _ in range(self.size - self._readers.qsize()):
+                    self._readers.put(self._build_reader(run_inference))
+                self._warmup_error = None
+                self._warmup_seconds = time.perf_counter() - started
+                self._ready.set()
+                print(f"[OCR Reader Pool] Ready with {self.size} reader(s) after {self._warmup_seconds:.2f}s.")
+            except Exception as e:
+                self._warmup_error = str(e)
+                print(f"[OCR Reader Pool] Warm-up failed: {e}")
+                raise
+            finally:
+                self._warming_up = False
+
+    def prime(self):
+        """Runs the tiny warm-up inference on every reader (for readers loaded with run_inference=False)."""
+        readers = [self._readers.get() for _ in range(self.size)]
+        try:
+            for reader in readers:
+                self._prime_reader(reader)
+        finally:
+            for reader in readers:
+                self._readers.put(reader)
+
+    @contextmanager
+    def checkout(self, timeout: float | None = None):
+        """
+        Borrows a reader from the pool and returns it when the block exits.
+
+        Usage:
+            with ocr_reader_pool.checkout() as reader:
+                results = reader.readtext(image_bytes)
+        """
+        if not self.ready:
+            # Startup warm-up may not have run (e.g. scripts, tests); warm lazily instead.
+            self.warm_up()
+
+        started = time.perf_counter()
+        try:
+            reader = self._readers.get(timeout=timeout if timeout is not None else self.checkout_timeout)
+        except queue.Empty:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise OCRReaderPoolTimeout(f"No OCR reader available after {self.checkout_timeout}s (pool size {self.size}).")
+        waited = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+            self._recent_waits.append(waited)
+        try:
+            yield reader
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._readers.put(reader)
+
+    def stats(self) -> dict:
+        """Readiness and checkout wait-time metrics (times in milliseconds)."""
+        with self._stats_lock:
+            recent = sorted(self._recent_waits)
+            checkouts = self._checkouts
+            stats = {
+                "ready": self.ready,
+                "warming_up": self._warming_up,
+                "warmup_error": self._warmup_error,
+                "warmup_seconds": self._warmup_seconds,
+                "size": self.size,
+                "in_use": self._in_use,
+                "available": self._readers.qsize(),
+                "checkouts": checkouts,
+                "checkout_timeouts": self._timeouts,
+                "wait_ms_avg": (self._total_wait_seconds / checkouts * 1000) if checkouts else 0.0,
+                "wait_ms_max": self._max_wait_seconds * 1000,
+            }
+        stats["wait_ms_p50"] = _percentile(recent, 50) * 1000
+        stats["wait_ms_p95"] = _percentile(recent, 95) * 1000
+        return stats
+
+
+def _percentile(sorted_values: list[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Global instance of the OCRReaderPool
+ocr_reader_pool = OCRReaderPool(
+    size=settings.OCR_READER_POOL_SIZE,
+    languages=settings.ocr_languages_list,
+    gpu=settings.OCR_USE_GPU,
+    checkout_timeout=settings.OCR_READER_CHECKOUT_TIMEOUT_SECONDS,
+)
@@ -2,18 +2,289 @@
 import base64
 # from PIL import Image # Example import for a library like Pillow/Tesseract
 # import io             # Example import for handling byte streams
+import asyncio
+import bisect
 import io
-import easyocr
+import time
 
-# Initialize the reader globally or manage its lifecycle appropriately
-# For a hackathon, initializing per call is simpler but less efficient.
-# For production, initialize once: reader = easyocr.Reader(['en'])
-# We will initialize it inside the function for simplicity here.
+import cv2
+import numpy as np
+from easyocr.utils import reformat_input
 
-async def extract_text_from_image(image_data_url: str) -> str:
+# EasyOCR readers are expensive to build (they load the CRAFT detector and recognizer
+# weights), so they are created once at startup and shared through a pool.
+from app.backend.services.ocr_reader_pool import ocr_reader_pool
+from app.backend.services.ocr_executor import ocr_executor, OCRQueueFullError
+from app.backend.services.ocr_cache import ocr_result_cache, compute_image_hash
+from app.backend.services.ocr_preprocessing import OCRPreprocessOptions, build_preprocess_options, preprocess_image
+from app.backend.config import settings
+
+
+def run_ocr(image_bytes: bytes, options: OCRPreprocessOptions) -> list[tuple[list, str, float]]:
+    """
+    Synchronous, CPU-heavy OCR step (preprocessing + recognition). Runs inside an OCR
+    worker (see ocr_executor), never directly on the event loop.
+    Returns a list of (bbox, text, prob) tuples with plain-Python bboxes so results pickle cheaply.
+    """
+    image = preprocess_image(image_bytes, options)
+    # Borrow a preloaded reader (languages/GPU are configured via settings.OCR_*)
+    with ocr_reader_pool.checkout() as reader:
+        results = reader.readtext(image)
+    return _plain_results(results)
+
+
+def _read_input(ocr_input: bytes | str) -> bytes:
+    """OCR inputs are either image bytes or the path of an uploaded image file."""
+    if isinstance(ocr_input, str):
+        with open(ocr_input, "rb") as f:
+            return f.read()
+    return ocr_input
+
+
+def run_ocr_file(image_path: str, options: OCRPreprocessOptions) -> list[tuple[list, str, float]]:
+    """Like run_ocr, but reads the image inside the worker so its bytes never cross processes."""
+    return run_ocr(_read_input(image_path), options)
+
+
+def _region_strip(img_cv_grey: np.ndarray, horizontal_list: list, free_list: list):
+    """
+    Packs the crops of the given detected regions into one image, stacked top to bottom, with
+    each region's box moved into its band. Returns (strip, horizontal boxes, free boxes,
+    placements) where placements are (band top, band height, x offset, y offset) per region, so
+    recognized boxes can be mapped back to image coordinates (see _unstrip_results).
+    """
+    height, width = img_cv_grey.shape[:2]
+    regions = [("h", box) for box in horizontal_list] + [("f", box) for box in free_list]
+    crops, strip_horizontal, strip_free, placements = [], [], [], []
+    band_top = 0
+    for kind, box in regions:
+        if kind == "h":
+            x_min, x_max, y_min, y_max = (int(v) for v in box)
+        else:
+            xs, ys = [int(p[0]) for p in box], [int(p[1]) for p in box]
+            x_min, x_max, y_min, y_max = min(xs), max(xs), min(ys), max(ys)
+        x_min, y_min = min(max(0, x_min), width - 1), min(max(0, y_min), height - 1)
+        x_max, y_max = min(width, max(x_max, x_min + 1)), min(height, max(y_max, y_min + 1))
+        crops.append(img_cv_grey[y_min:y_max, x_min:x_max])
+        if kind == "h":
+            strip_horizontal.append([0, x_max - x_min, band_top, band_top + (y_max - y_min)])
+        else:
+            strip_free.append([
+                [min(max(int(x), x_min), x_max) - x_min, min(max(int(y), y_min), y_max) - y_min + band_top]
+                for x, y in box
+            ])
+        placements.append((band_top, y_max - y_min, x_min, y_min))
+        band_top += y_max - y_min
+
+    strip_width = max((crop.shape[1] for crop in crops), default=1)
+    strip = np.full((max(1, band_top), strip_width), 255, dtype=img_cv_grey.dtype)
+    for crop, (top, band_height, _, _) in zip(crops, placements):
+        strip[top:top + band_height, :crop.shape[1]] = crop
+    return strip, strip_horizontal, strip_free, placements
+
+
+def _unstrip_results(results: list[tuple[list, str, float]], placements: list[tuple[int, int, int, int]]) -> list[tuple[list, str, float]]:
+    """Maps boxes recognized on a region strip back to the coordinates of the original image."""
+    tops = [top for top, _, _, _ in placements]
+    mapped = []
+    for bbox, text, prob in results:
+        centre_y = sum(y for _, y in bbox) / len(bbox)
+        top, _, x_offset, y_offset = placements[max(0, bisect.bisect_right(tops, centre_y) - 1)]
+        mapped.append(([[x + x_offset, y - top + y_offset] for x, y in bbox], text, prob))
+    return mapped
+
+
+def run_ocr_detect(ocr_input: bytes | str, options: OCRPreprocessOptions, min_regions: int, parts: int):
+    """
+    First half of tile-parallel OCR: run the text detector once.
+    Small images (< min_regions text regions) are recognized right away and return
+    ("results", results); otherwise returns ("regions", [region strip per part]) so recognition
+    can be fanned out across workers. Only the region crops cross processes, not the full image.
+    """
+    image = preprocess_image(_read_input(ocr_input), options)
+    with ocr_reader_pool.checkout() as reader:
+        _, img_cv_grey = reformat_input(image)
+        horizontal_lists, free_lists = reader.detect(image)
+        horizontal_list, free_list = horizontal_lists[0], free_lists[0]
+        if len(horizontal_list) + len(free_list) < min_regions:
+            return "results", _plain_results(reader.recognize(img_cv_grey, horizontal_list, free_list))
+    parts = max(1, min(parts, len(horizontal_list) + len(free_list)))
+    return "regions", [
+        _region_strip(img_cv_grey, horizontal_part, free_part)
+        for horizontal_part, free_part in zip(_split_evenly(horizontal_list, parts), _split_evenly(free_list, parts))
+    ]
+
+
+def run_ocr_recognize_regions(strip: np.ndarray, horizontal_list: list, free_list: list, placements: list) -> list[tuple[list, str, float]]:
+    """Second half of tile-parallel OCR: recognize one strip of region crops."""
+    if not horizontal_list and not free_list:
+        return []
+    with ocr_reader_pool.checkout() as reader:
+        results = _plain_results(reader.recognize(strip, horizontal_list, free_list))
+    return _unstrip_results(results, placements)
+
+
+def _split_evenly(items: list, parts: int) -> list[list]:
+    size, remainder = divmod(len(items), parts)
+    chunks, start = [], 0
+    for index in range(parts):
+        end = start + size + (1 if index < remainder else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def sort_reading_order(results: list[tuple[list, str, float]]) -> list[tuple[list, str, float]]:
+    """
+    Orders recognized boxes top-to-bottom, left-to-right. Boxes whose vertical centres are
+    within half a (median) line height of each other are treated as one line.
+    """
+    if not results:
+        return results
+    def top(result): return min(y for _, y in result[0])
+    def bottom(result): return max(y for _, y in result[0])
+    def left(result): return min(x for x, _ in result[0])
+
+    line_height = float(np.median([bottom(r) - top(r) for r in results])) or 1.0
+    lines: list[list] = []
+    for result in sorted(results, key=lambda r: (top(r) + bottom(r)) / 2):
+        centre = (top(result) + bottom(result)) / 2
+        if lines and abs(centre - lines[-1][0]) <= line_height / 2:
+            lines[-1][1].append(result)
+        else:
+            lines.append([centre, [result]])
+    return [result for _, line in lines for result in sorted(line, key=left)]
+
+
+async def _run_tile_parallel(ocr_input: bytes | str, options: OCRPreprocessOptions, ocr_slot=None) -> list[tuple[list, str, float]]:
+    """
+    Detect text regions once, then recognize region crops on all OCR workers in parallel.
+    The queue slot is held across detection and the fan-out, so the whole call counts once
+    against OCR_MAX_QUEUED_JOBS.
+    """
+    slot = ocr_slot or ocr_executor.reserve_slot()
+    started = time.time()
+    try:
+        detected = (await ocr_executor.run_subtasks(
+            run_ocr_detect,
+            [(ocr_input, options, settings.OCR_TILE_PARALLEL_MIN_REGIONS, ocr_executor.workers)]
+        ))[0]
+        if detected[0] == "results":
+            results = detected[1]
+        else:
+            strips = detected[1]
+            print(f"OCR Service: Tile-parallel recognition of {sum(len(placements) for *_, placements in strips)} regions in {len(strips)} part(s).")
+            chunks = await ocr_executor.run_subtasks(run_ocr_recognize_regions, strips)
+            results = sort_reading_order([result for chunk in chunks for result in chunk])
+    finally:
+        slot.release()
+    ocr_executor.record_timings(0.0, time.time() - started)
+    return results
+
+
+def _plain_results(results) -> list[tuple[list, str, float]]:
+    return [([[float(x), float(y)] for x, y in bbox], text, float(prob)) for bbox, text, prob in results]
+
+
+def _as_array(image: np.ndarray | bytes) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        return image
+    decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if decoded is None:
+        raise ValueError("Unsupported or corrupt image data")
+    return decoded
+
+
+def _pad_to_common_size(images: list[np.ndarray]) -> list[np.ndarray]:
+    """
+    readtext_batched needs equally sized inputs. Pad with white instead of resizing so
+    text keeps its aspect ratio; mixed grayscale/colour inputs are all turned to grayscale.
+    """
+    if any(image.ndim == 2 for image in images):
+        images = [image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in images]
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    padded = []
+    for image in images:
+        pad = [(0, height - image.shape[0]), (0, width - image.shape[1])] + [(0, 0)] * (image.ndim - 2)
+        padded.append(np.pad(image, pad, mode="constant", constant_values=255))
+    return padded
+
+
+def run_ocr_batched(images: list[bytes], options: list[OCRPreprocessOptions]) -> list[list[tuple[list, str, float]] | str]:
+    """
+    Batched variant of run_ocr: the detector and recognizer run on stacked inputs via
+    EasyOCR's readtext_batched. Returns one entry per image, either its (bbox, text, prob)
+    results or an "Error: ..." string if that image couldn't be preprocessed.
+    """
+    outputs: list = [None] * len(images)
+    arrays, indices = [], []
+    for index, (image_bytes, image_options) in enumerate(zip(images, options)):
+        try:
+            arrays.append(_as_array(preprocess_image(image_bytes, image_options)))
+            indices.append(index)
+        except Exception as e:
+            outputs[index] = f"Error: Image preprocessing failed - {e}"
+
+    if arrays:
+        with ocr_reader_pool.checkout() as reader:
+            batched_results = reader.readtext_batched(
+                _pad_to_common_size(arrays),
+                batch_size=settings.OCR_RECOGNIZER_BATCH_SIZE
+            )
+        for index, results in zip(indices, batched_results):
+            outputs[index] = _plain_results(results)
+    return outputs
+
+
+def decode_image_data_url(image_data_url: str) -> bytes:
+    """Decodes a `data:<mime>;base64,<data>` URL. Raises ValueError with a readable message."""
+    try:
+        header, encoded_data = image_data_url.split(",", 1)
+    except ValueError:
+        raise ValueError("Invalid Data URL format")
+    try:
+        return base64.b64decode(encoded_data)
+    except base64.binascii.Error as e:
+        raise ValueError(f"Base64 decoding failed - {e}")
+
+
+async def _recognize_with_cache(image_hash: str, ocr_fn, ocr_input, crop_box=None, ocr_slot=None) -> str:
+    """Shared cache lookup + OCR worker call for single images; `ocr_fn(ocr_input, options)` runs in the worker."""
+    options = build_preprocess_options(crop_box)
+
+    # Same image bytes (and preprocessing) -> same text; skip OCR for re-uploads
+    # (the cache may hit the database, so it runs in a thread to keep the event loop free)
+    if settings.OCR_CACHE_ENABLED:
+        cached_text = await asyncio.to_thread(ocr_result_cache.get, image_hash, options.cache_variant())
+        if cached_text is not None:
+            print(f"OCR Service: Cache hit for image {image_hash[:12]}: '{cached_text}'")
+            return cached_text
+
+    # Read text on the OCR workers so the event loop stays responsive
+    # The result is a list of (bbox, text, prob) tuples
+    if settings.OCR_TILE_PARALLEL and ocr_executor.workers > 1:
+        results = await _run_tile_parallel(ocr_input, options, ocr_slot)
+    else:
+        results = await ocr_executor.run(ocr_fn, ocr_input, options, slot=ocr_slot)
+
+    # Combine all detected text pieces
+    extracted_text = " ".join([text for _, text, _ in results])
+
+    if settings.OCR_CACHE_ENABLED:
+        await asyncio.to_thread(ocr_result_cache.put, image_hash, extracted_text, options.cache_variant())
+
+    print(f"OCR Service: Extracted text: '{extracted_text}'")
+    return extracted_text
+
+
+async def extract_text_from_image(image_data_url: str, crop_box=None, ocr_slot=None) -> str:
     """
     Extracts text from an image provided as a Data URL.
-    Uses EasyOCR for text recognition.
+    Uses EasyOCR for text recognition after the configured preprocessing
+    (downscale, grayscale, auto-crop, deskew). `crop_box` optionally restricts OCR
+    to a region of the image; `ocr_slot` is a queue slot reserved earlier via
+    ocr_executor.reserve_slot() (the caller must still release it if OCR is skipped).
     """
     print(f"OCR Service: Received image data URL (first 100 chars): {image_data_url[:100]}...")
     
@@ -25,25 +296,82 @@ async def extract_text_from_image(image_data_url: str) -> str:
 
     try:
         image_bytes = base64.b64decode(encoded_data)
-        
-        # Initialize EasyOCR reader
-        # For mathematical formulas, 'en' should be sufficient.
-        # You could add other languages if needed: ['en', 'ch_sim'], etc.
-        reader = easyocr.Reader(['en'], gpu=False) # Specify gpu=False if not using GPU, True otherwise
-        
-        # Read text from image bytes
-        # The result is a list of (bbox, text, prob) tuples
-        results = reader.readtext(image_bytes)
-        
-        # Combine all detected text pieces
-        extracted_text = " ".join([text for _, text, _ in results])
-        
-        print(f"OCR Service: Extracted text: '{extracted_text}'")
-        return extracted_text
+
+        return await _recognize_with_cache(image_hash=compute_image_hash(image_bytes), ocr_fn=run_ocr, ocr_input=image_bytes, crop_box=crop_box, ocr_slot=ocr_slot)
     except base64.binascii.Error as e:
         print(f"OCR Service: Base64 decoding error: {e}")
         return f"Error: Base64 decoding failed - {e}"
+    except OCRQueueFullError:
+        # Let the caller turn this into a 429 instead of an "Error: ..." text
+        raise
     except Exception as e:
         # Catching general exceptions from EasyOCR or other image processing steps
         print(f"OCR Service: Error during OCR processing: {e}")
-        return f"Error: OCR processing failed - {e}" 
\ No newline at end of file
+        return f"Error: OCR processing failed - {e}" 
+
+
+async def extract_texts_from_images(image_data_urls: list[str], crop_boxes: list | None = None, ocr_slot=None) -> list[str]:
+    """
+    Batch version of extract_text_from_image. Cache hits are answered directly, the
+    remaining images go to the OCR workers as a single batched call.
+    Returns one text per image; failures are reported per image as "Error: ..." strings.
+    As with extract_text_from_image, the caller releases `ocr_slot` if no OCR call was needed.
+    """
+    crop_boxes = crop_boxes or [None] * len(image_data_urls)
+    print(f"OCR Service: Received batch of {len(image_data_urls)} image(s).")
+
+    texts: list[str | None] = [None] * len(image_data_urls)
+    pending = []  # (index, image bytes, image hash, options) still needing OCR
+    for index, (image_data_url, crop_box) in enumerate(zip(image_data_urls, crop_boxes)):
+        try:
+            image_bytes = decode_image_data_url(image_data_url)
+        except ValueError as e:
+            texts[index] = f"Error: {e}"
+            continue
+        options = build_preprocess_options(crop_box)
+        image_hash = compute_image_hash(image_bytes)
+        cached_text = await asyncio.to_thread(ocr_result_cache.get, image_hash, options.cache_variant()) if settings.OCR_CACHE_ENABLED else None
+        if cached_text is not None:
+            texts[index] = cached_text
+        else:
+            pending.append((index, image_bytes, image_hash, options))
+
+    if pending:
+        try:
+            batch_results = await ocr_executor.run(
+                run_ocr_batched,
+                [image_bytes for _, image_bytes, _, _ in pending],
+                [options for _, _, _, options in pending],
+                slot=ocr_slot
+            )
+        except OCRQueueFullError:
+            raise
+        except Exception as e:
+            print(f"OCR Service: Error during batched OCR processing: {e}")
+            batch_results = [f"Error: OCR processing failed - {e}"] * len(pending)
+
+        for (index, _, image_hash, options), results in zip(pending, batch_results):
+            if isinstance(results, str):
+                texts[index] = results
+                continue
+            texts[index] = " ".join([text for _, text, _ in results])
+            if settings.OCR_CACHE_ENABLED:
+                await asyncio.to_thread(ocr_result_cache.put, image_hash, texts[index], options.cache_variant())
+
+    print(f"OCR Service: Batch done, {len(image_data_urls) - len(pending)} cached/failed early, {len(pending)} recognized.")
+    return texts
+
+
+async def extract_text_from_image_file(image_path: str, image_sha256: str, crop_box=None, ocr_slot=None) -> str:
+    """
+    Extracts text from an uploaded image stored on disk (see upload_service).
+    The sha256 was computed while streaming the upload, so cache hits never touch the file.
+    """
+    print(f"OCR Service: Received image file {image_path}")
+    try:
+        return await _recognize_with_cache(image_hash=image_sha256, ocr_fn=run_ocr_file, ocr_input=image_path, crop_box=crop_box, ocr_slot=ocr_slot)
+    except OCRQueueFullError:
+        raise
+    except Exception as e:
+        print(f"OCR Service: Error during OCR processing of {image_path}: {e}")
+        return f"Error: OCR processing failed - {e}"
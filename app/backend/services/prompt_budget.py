@@ -0,0 +1,189 @@
+# app/backend/services/prompt_budget.py
+import math
+import re
+import threading
+
+from app.backend.config import settings
+
+# Rough tokens-per-character ratio of English/German prose and Python for GPT-style tokenizers.
+# An estimate is enough for budgeting and keeps pruning deterministic and model-independent.
+CHARS_PER_TOKEN = 4
+# Upstream outputs that are code: never trimmed (a cut script is useless), only blank-line runs collapsed
+CODE_CONTEXT_KEYS = {"generated_code", "refactored_code", "failing_code"}
+# Text kept of a field when the budget runs out, so the model still sees what the field was
+MIN_FIELD_TOKENS = 32
+TRUNCATION_MARKER = "\n[... trimmed to fit the prompt budget ...]"
+
+_PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+# Braces of substituted values are swapped for private-use characters until the model call (see
+# unescape_instruction_braces): ADK 0.x runs its `{state_key}` injection on instruction-provider
+# output too, and would treat `{i}` in an f-string or `\frac{a}{b}` in LaTeX as a state lookup.
+_ESCAPE_BRACES = str.maketrans({"{": "\ue000", "}": "\ue001"})
+_UNESCAPE_BRACES = str.maketrans({"\ue000": "{", "\ue001": "}"})
+_EMPTY_SECTION_BODY_RE = re.compile(r"^[\s\-*•]*(none|n/?a|nothing|no issues?( found)?|-)?[\s.]*$", re.IGNORECASE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str | None) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def normalize_whitespace(text: str) -> str:
+    """Strips trailing spaces and collapses runs of blank lines into one."""
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def drop_empty_sections(text: str) -> str:
+    """
+    Removes review sections that carry nothing: a heading (markdown heading or "Title:" line)
+    whose body is empty or just "None"/"N/A"/"No issues".
+    """
+    blocks = re.split(r"\n\s*\n", text)
+    kept = []
+    for block in blocks:
+        lines = block.strip().splitlines()
+        if not lines:
+            continue
+        heading = lines[0].strip()
+        is_heading = heading.startswith("#") or heading.rstrip("*").endswith(":")
+        if is_heading and _EMPTY_SECTION_BODY_RE.match("\n".join(lines[1:])):
+            continue
+        kept.append(block.strip())
+    return "\n\n".join(kept)
+
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END_RE.split(text.strip(), maxsplit=1)[0]
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Deterministically shortens structured text (storyboards, explanations) to about `max_tokens`:
+    first every paragraph is cut to its first line plus the first sentence after it, then paragraphs
+    from the end on are cut to their first line only (step titles survive longest), and only then
+    the text is cut off.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    paragraphs = [p.strip().splitlines() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+    summaries = [
+        "\n".join([lines[0], _first_sentence(" ".join(lines[1:]))]) if len(lines) > 1 else lines[0]
+        for lines in paragraphs
+    ]
+    titles = [lines[0] for lines in paragraphs]
+    for keep in range(len(paragraphs), -1, -1):
+        trimmed = "\n\n".join(summaries[:keep] + titles[keep:])
+        if estimate_tokens(trimmed) <= max_tokens:
+            return trimmed
+    titles = "\n".join(titles)
+
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    cut = titles[:max_chars]
+    if "\n" in cut:
+        cut = cut[:cut.rfind("\n")]
+    return cut + TRUNCATION_MARKER
+
+
+def prune_context(values: dict[str, str], max_tokens: int | None) -> dict[str, str]:
+    """
+    Prunes the upstream outputs injected into one stage's prompt. Structural pruning (whitespace,
+    empty review sections) always applies; if the result still exceeds `max_tokens`, the text
+    fields share what the code fields leave over, in proportion to their size.
+    """
+    pruned = {}
+    for key, value in values.items():
+        value = normalize_whitespace(value)
+        if key == "review_comments":
+            value = drop_empty_sections(value)
+        pruned[key] = value
+
+    total = sum(estimate_tokens(v) for v in pruned.values())
+    if not max_tokens or total <= max_tokens:
+        return pruned
+
+    text_keys = [key for key in pruned if key not in CODE_CONTEXT_KEYS]
+    code_tokens = sum(estimate_tokens(pruned[key]) for key in pruned if key in CODE_CONTEXT_KEYS)
+    text_tokens = sum(estimate_tokens(pruned[key]) for key in text_keys)
+    available = max(0, max_tokens - code_tokens)
+    for key in text_keys:
+        share = estimate_tokens(pruned[key]) / text_tokens if text_tokens else 0
+        pruned[key] = trim_to_tokens(pruned[key], max(MIN_FIELD_TOKENS, int(available * share)))
+    return pruned
+
+
+class PromptBudgetStats:
+    """Per-stage totals of injected context tokens before and after pruning (the tokens-saved report)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict[str, int]] = {}
+
+    def record(self, stage: str, tokens_before: int, tokens_after: int):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"calls": 0, "pruned_calls": 0, "context_tokens_before": 0, "context_tokens_after": 0})
+            stats["calls"] += 1
+            stats["pruned_calls"] += int(tokens_after < tokens_before)
+            stats["context_tokens_before"] += tokens_before
+            stats["context_tokens_after"] += tokens_after
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {}
+            for stage, stats in self._stages.items():
+                saved = stats["context_tokens_before"] - stats["context_tokens_after"]
+                report[stage] = {
+                    **stats,
+                    "tokens_saved": saved,
+                    "tokens_saved_avg": saved / stats["calls"] if stats["calls"] else 0.0,
+                    "max_context_tokens": settings.agent_stage_max_context_tokens.get(stage),
+                    "max_output_tokens": settings.agent_stage_max_output_tokens.get(stage),
+                }
+            return {"pruning_enabled": settings.AGENT_CONTEXT_PRUNING_ENABLED, "stages": report}
+
+
+class BudgetedInstruction:
+    """
+    Instruction provider for an LlmAgent: fills the `{state_key}` placeholders of `template`
+    (like ADK's own state injection) with the upstream outputs pruned to the stage's context
+    budget (AGENT_STAGE_MAX_CONTEXT_TOKENS, keyed by the stage's output key).
+    """
+
+    def __init__(self, template: str, stage: str):
+        self.template = template
+        self.stage = stage
+        self.placeholders = list(dict.fromkeys(_PLACEHOLDER_RE.findall(template)))
+
+    @property
+    def cache_identity(self) -> str:
+        """What the stage output cache keys this instruction by: a different budget means a different prompt."""
+        budget = settings.agent_stage_max_context_tokens.get(self.stage) if settings.AGENT_CONTEXT_PRUNING_ENABLED else None
+        return f"{self.template}\n[max_context_tokens={budget}]"
+
+    def __call__(self, context) -> str:
+        values = {key: "" if context.state.get(key) is None else str(context.state.get(key)) for key in self.placeholders}
+        if settings.AGENT_CONTEXT_PRUNING_ENABLED:
+            pruned = prune_context(values, settings.agent_stage_max_context_tokens.get(self.stage))
+            tokens_before = sum(estimate_tokens(v) for v in values.values())
+            tokens_after = sum(estimate_tokens(v) for v in pruned.values())
+            prompt_budget_stats.record(self.stage, tokens_before, tokens_after)
+            if tokens_after < tokens_before:
+                print(f"[Prompt Budget] {self.stage}: upstream context {tokens_before} -> {tokens_after} tokens (estimated)")
+            values = pruned
+        return _PLACEHOLDER_RE.sub(
+            lambda m: values[m.group(1)].translate(_ESCAPE_BRACES) if m.group(1) in values else m.group(0),
+            self.template,
+        )
+
+
+def unescape_instruction_braces(callback_context, llm_request) -> None:
+    """before_model_callback of every stage with a BudgetedInstruction: restores the escaped braces."""
+    instruction = llm_request.config.system_instruction
+    if isinstance(instruction, str):
+        llm_request.config.system_instruction = instruction.translate(_UNESCAPE_BRACES)
+    return None
+
+
+# Global instance of the tokens-saved report
+prompt_budget_stats = PromptBudgetStats()
@@ -1,8 +1,18 @@
 from google.adk.agents import SequentialAgent, LlmAgent
+from google.adk.models.base_llm import BaseLlm
 from google.adk.models.lite_llm import LiteLlm
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from pydantic import BaseModel, Field
+import json
 import os
 from dotenv import load_dotenv
 
+from app.backend.config import settings
+from app.backend.services.manim_validator import format_findings, validate_manim_code
+from app.backend.services.prompt_budget import BudgetedInstruction, unescape_instruction_braces
+from app.backend.services.stub_llm import STUB_MODEL_PREFIX, StubLlm
+
 # Load environment variables
 load_dotenv()
 
@@ -11,18 +21,97 @@ load_dotenv()
 # if not GOOGLE_API_KEY:
 #     raise ValueError("GOOGLE_API_KEY environment variable not found. Please add it to your .env file.")
 
-# Get OpenAI API key from environment
+# Get OpenAI API key from environment (not needed with the offline stub backend, AGENT_LLM_BACKEND=stub)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable not found. Please add it to your .env file.")
+if not OPENAI_API_KEY and settings.AGENT_LLM_BACKEND != "stub":
+    print("[Root Agent] WARNING: OPENAI_API_KEY environment variable not found. Please add it to your .env file; calls to OpenAI models will fail.")
+
+
+def stage_model(output_key: str) -> BaseLlm:
+    """
+    The stage's model: its AGENT_STAGE_MODELS entry (model id plus options like api_base), else
+    AGENT_DEFAULT_MODEL; with AGENT_LLM_BACKEND=stub the offline stub answering for this stage.
+    """
+    if settings.AGENT_LLM_BACKEND == "stub":
+        return StubLlm(model=f"{STUB_MODEL_PREFIX}{output_key}")
+    spec = settings.agent_stage_models.get(output_key) or {"model": settings.AGENT_DEFAULT_MODEL}
+    return LiteLlm(**spec)
+
+
+def stage_generation_config(output_key: str) -> types.GenerateContentConfig | None:
+    """Caps the stage's completion at its AGENT_STAGE_MAX_OUTPUT_TOKENS budget, if it has one."""
+    max_output_tokens = settings.agent_stage_max_output_tokens.get(output_key)
+    return types.GenerateContentConfig(max_output_tokens=max_output_tokens) if max_output_tokens else None
+
+
+# Output key of every stage, by agent name (used by skip_if_output_in_state). Filled as the
+# builders run, so it covers exactly the agents of the pipelines that were built.
+STAGE_OUTPUT_KEYS: dict[str, str] = {}
+
+
+def _register_stage(agent: LlmAgent) -> LlmAgent:
+    if agent.output_key:
+        STAGE_OUTPUT_KEYS[agent.name] = agent.output_key
+    return agent
+
+
+def skip_if_output_in_state(callback_context: CallbackContext) -> types.Content | None:
+    """
+    before_agent_callback shared by all stages: if the stage's output is already in the session
+    state (restored from the stage cache), skip the LLM call and emit the stored output instead.
+    """
+    output_key = STAGE_OUTPUT_KEYS.get(callback_context.agent_name)
+    existing_output = callback_context.state.get(output_key) if output_key else None
+    if existing_output:
+        return types.Content(role="model", parts=[types.Part(text=str(existing_output))])
+    return None
+
+
+def _validation_findings(callback_context: CallbackContext) -> str | None:
+    """Static validation of the generated code, computed once per job and kept in the state for the reviewer prompt."""
+    state = callback_context.state
+    if state.get("validation_findings") is None:
+        findings = validate_manim_code(str(state.get("generated_code") or ""))
+        state["validation_findings"] = format_findings(findings)
+        state["validation_passed"] = not findings
+    return state.get("validation_findings")
+
+
+def review_only_if_validation_fails(callback_context: CallbackContext) -> types.Content | None:
+    """
+    before_agent_callback of the reviewer: the LLM review only runs when the static validator
+    (services/manim_validator.py) finds problems; otherwise the code is accepted as is.
+    """
+    cached = skip_if_output_in_state(callback_context)
+    if cached or not settings.AGENT_STATIC_VALIDATION_ENABLED:
+        if not cached:
+            callback_context.state["validation_findings"] = "(static validation disabled)"
+        return cached
+    _validation_findings(callback_context)
+    if callback_context.state.get("validation_passed"):
+        review = f"No major issues found. {format_findings([])}"
+        callback_context.state["review_comments"] = review
+        return types.Content(role="model", parts=[types.Part(text=review)])
+    return None
+
+
+def refactor_only_if_validation_failed(callback_context: CallbackContext) -> types.Content | None:
+    """before_agent_callback of the refactorer: with a clean validation the generated code is the final code."""
+    cached = skip_if_output_in_state(callback_context)
+    if cached or not settings.AGENT_STATIC_VALIDATION_ENABLED:
+        return cached
+    _validation_findings(callback_context)
+    if callback_context.state.get("validation_passed"):
+        code = str(callback_context.state.get("generated_code") or "")
+        callback_context.state["refactored_code"] = code
+        return types.Content(role="model", parts=[types.Part(text=code)])
+    return None
+
 
 # --- 1. Define Sub-Agents for Each Pipeline Stage ---
 
 # Clear Explanation Agent
-clear_explanation_agent = LlmAgent(
-    name="ClearExplanationAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""
+CLEAR_EXPLANATION_INSTRUCTION = """
 Du bist ein hilfreicher Erklärer von technischen und abstrakten Konzepten.
 Der Benutzer hat ein Bild bereitgestellt (was zum Thema führt: {topic}).
 Er hat möglicherweise auch eine spezifische Aufforderung gegeben: {user_prompt}.
@@ -31,58 +120,88 @@ Basierend auf dem Thema aus dem Bild und geleitet von der Aufforderung des Benut
 Wenn die user_prompt leer ist oder nicht eindeutig auf die Verfeinerung der Erklärung des Themas anwendbar ist, konzentriere dich primär auf das Thema.
 Vermeide Fachbegriffe, es sei denn, sie sind notwendig, und erkläre Begriffe, wenn sie verwendet werden.
 Gib nur die Erklärung aus.
-""",
-    description="Generates clear explanations of topics, guided by user prompts.",
-    output_key='explanation'
-    # input_keys parameter is not supported and was causing the Pydantic error
-    # The agent automatically infers input keys from the placeholders in the instruction template.
-)
+"""
+
+
+def build_clear_explanation_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="ClearExplanationAgent",
+        model=stage_model("explanation"),
+        before_agent_callback=skip_if_output_in_state,
+        instruction=BudgetedInstruction(CLEAR_EXPLANATION_INSTRUCTION, "explanation"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("explanation"),
+        description="Generates clear explanations of topics, guided by user prompts.",
+        output_key="explanation",
+    ))
+
 
 # Concept Separator Agent
-concept_separator_agent = LlmAgent(
-    name="ConceptSeparatorAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""
+CONCEPT_SEPARATOR_INSTRUCTION = """
 You are an expert at identifying key components of explanations.
 Take the {explanation} and break it down into a list of its fundamental concepts.
 Output only the list of concepts as bullet points.
-""",
-    description="Breaks down explanations into key concepts.",
-    output_key='concepts',
-)
+"""
+
+
+def build_concept_separator_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="ConceptSeparatorAgent",
+        model=stage_model("concepts"),
+        before_agent_callback=skip_if_output_in_state,
+        instruction=BudgetedInstruction(CONCEPT_SEPARATOR_INSTRUCTION, "concepts"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("concepts"),
+        description="Breaks down explanations into key concepts.",
+        output_key="concepts",
+    ))
+
 
 # Storyboard Creator Agent
-storyboard_creator_agent = LlmAgent(
-    name="StoryboardCreatorAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""
+STORYBOARD_CREATOR_INSTRUCTION = """
 You are a storyboard planner.
 Given a list of concepts: {concepts}, create an ordered storyboard with visual scenes and brief captions to teach each concept clearly.
 Structure it as a list of steps with short titles and descriptions.
-""",
-    description="Creates a storyboard from a list of concepts.",
-    output_key='storyboard',
-)
+"""
+
+
+def build_storyboard_creator_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="StoryboardCreatorAgent",
+        model=stage_model("storyboard"),
+        before_agent_callback=skip_if_output_in_state,
+        instruction=BudgetedInstruction(STORYBOARD_CREATOR_INSTRUCTION, "storyboard"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("storyboard"),
+        description="Creates a storyboard from a list of concepts.",
+        output_key="storyboard",
+    ))
+
 
 # Storyboard Enhancer Agent
-storyboard_enhancer_agent = LlmAgent(
-    name="StoryboardEnhancerAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""
+STORYBOARD_ENHANCER_INSTRUCTION = """
 You are a visual storyteller.
 Enhance the provided storyboard: {storyboard} by adding narration, transitions, and visual suggestions for each step. You have to clearly state 
 which objects are going to appear, how they move and interact and how long they stay on the screen.
 Keep it suitable for an animated explainer using Manim.
-""",
-    description="Improves the storyboard with narration and visuals.",
-    output_key='enhanced_storyboard',
-)
+"""
+
+
+def build_storyboard_enhancer_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="StoryboardEnhancerAgent",
+        model=stage_model("enhanced_storyboard"),
+        before_agent_callback=skip_if_output_in_state,
+        instruction=BudgetedInstruction(STORYBOARD_ENHANCER_INSTRUCTION, "enhanced_storyboard"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("enhanced_storyboard"),
+        description="Improves the storyboard with narration and visuals.",
+        output_key="enhanced_storyboard",
+    ))
+
 
 # Code Generator Agent
-code_generator_agent = LlmAgent(
-    name="CodeGeneratorAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction='''
+CODE_GENERATOR_INSTRUCTION = '''
 You are an expert Manim animation code generator, creating scripts for Manim Community v0.18.0 or newer.
 Given an enhanced storyboard: {enhanced_storyboard}, write a complete Python script to visualize the content.
 Output *only* the raw Python code, enclosed in triple backticks: ```python ... ```
@@ -160,18 +279,25 @@ Output *only* the raw Python code, enclosed in triple backticks: ```python ... `
             ```
 
 Remember to output *only* the Python code block.
-''',
-    description="Generates asset-free Manim code with strict rules for shapes, colors, rate functions, and no external files.",
-    output_key='generated_code',
-)
+'''
+
+
+def build_code_generator_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="CodeGeneratorAgent",
+        model=stage_model("generated_code"),
+        before_agent_callback=skip_if_output_in_state,
+        instruction=BudgetedInstruction(CODE_GENERATOR_INSTRUCTION, "generated_code"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("generated_code"),
+        description="Generates asset-free Manim code with strict rules for shapes, colors, rate functions, and no external files.",
+        output_key="generated_code",
+    ))
 
 
 # Code Reviewer Agent
 # Takes the code generated by the previous agent (read from state) and provides feedback.
-code_reviewer_agent = LlmAgent(
-    name="CodeReviewerAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""You are an expert Python Code Reviewer. 
+CODE_REVIEWER_INSTRUCTION = """You are an expert Python Code Reviewer. 
     Your task is to provide constructive feedback on the provided code.
 
     **Code to Review:**
@@ -179,6 +305,11 @@ code_reviewer_agent = LlmAgent(
     {generated_code}
     ```
 
+**Static Validation Findings:**
+An automated check of the code against the rules the code generator was given reported:
+{validation_findings}
+Every finding is a real rule violation; your review MUST include a concrete fix for each one.
+
 **Review Criteria:**
 1.  **Correctness:** Does the code work as intended? Are there logic errors?
 2.  **Readability:** Is the code clear and easy to understand? Follows PEP 8 style guidelines?
@@ -190,18 +321,25 @@ code_reviewer_agent = LlmAgent(
 Provide your feedback as a concise, bulleted list. Focus on the most important points for improvement.
 If the code is excellent and requires no changes, simply state: "No major issues found."
 Output *only* the review comments or the "No major issues" statement.
-""",
-    description="Reviews code and provides feedback.",
-    output_key="review_comments",
-)
+"""
+
+
+def build_code_reviewer_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="CodeReviewerAgent",
+        model=stage_model("review_comments"),
+        before_agent_callback=review_only_if_validation_fails,
+        instruction=BudgetedInstruction(CODE_REVIEWER_INSTRUCTION, "review_comments"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("review_comments"),
+        description="Reviews code and provides feedback.",
+        output_key="review_comments",
+    ))
 
 
 # Code Refactorer Agent
 # Takes the original code and the review comments (read from state) and refactors the code.
-code_refactorer_agent = LlmAgent(
-    name="CodeRefactorerAgent",
-    model=LiteLlm(model="openai/gpt-4o"),
-    instruction="""You are a Python Code Refactoring AI.
+CODE_REFACTORER_INSTRUCTION = """You are a Python Code Refactoring AI.
 Your goal is to improve the given Python code based on the provided review comments.
 
   **Original Code:**
@@ -220,32 +358,189 @@ Ensure the final code is complete, functional, and includes necessary imports an
 **Output:**
 Output *only* the final, refactored Python code block, enclosed in triple backticks (```python ... ```). 
 Do not add any other text before or after the code block.
-""",
-    description="Refactors code based on review comments.",
-    output_key="refactored_code",
-)
-
-
-# --- 2. Create the Sequential Orchestration Agent ---
-
-root_agent = SequentialAgent(
-    name="root_agent",  # Must be named root_agent for ADK compatibility
-    description="Executes a pipeline to generate a Manim animation from a concept.",
-    #     instruction="""
-    # Follow these steps in order to generate a Manim video from a user-supplied concept:
-    # 1. Generate a clear explanation of the topic.
-    # 2. Break the explanation into distinct concepts.
-    # 3. Create a storyboard to teach those concepts.
-    # 4. Enhance the storyboard with narration and visual ideas.
-    # 5. Generate Manim code to animate the storyboard.
-    # """,
-    sub_agents=[
-        clear_explanation_agent,
-        concept_separator_agent,
-        storyboard_creator_agent,
-        storyboard_enhancer_agent,
-        code_generator_agent,
-        code_reviewer_agent,
-        code_refactorer_agent
+"""
+
+
+def build_code_refactorer_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="CodeRefactorerAgent",
+        model=stage_model("refactored_code"),
+        before_agent_callback=refactor_only_if_validation_failed,
+        instruction=BudgetedInstruction(CODE_REFACTORER_INSTRUCTION, "refactored_code"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("refactored_code"),
+        description="Refactors code based on review comments.",
+        output_key="refactored_code",
+    ))
+
+
+# Code Fixer Agent
+# Not part of a pipeline profile: runs in its own session after a failed render, with the
+# failing code and the trimmed Manim traceback in the state (see services/agent_service.py).
+CODE_FIXER_INSTRUCTION = """You are an expert Manim Community (v0.18.0+) debugger.
+The following Manim script failed to render.
+
+  **Failing Code:**
+  ```python
+  {failing_code}
+  ```
+
+  **Render Error (end of the Manim traceback):**
+  ```
+  {render_error}
+  ```
+
+  **Static Validation Findings:**
+  {validation_findings}
+
+**Task:**
+Fix the cause of the render error and every static validation finding, changing as little else as possible.
+Keep the same Scene class name. Do not use Tex, MathTex, SVGMobject, ImageMobject or any other LaTeX or external asset; use Text instead.
+
+**Output:**
+Output *only* the complete, fixed Python code block, enclosed in triple backticks (```python ... ```).
+Do not add any other text before or after the code block.
+"""
+
+
+def build_code_fixer_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="CodeFixerAgent",
+        model=stage_model("fixed_code"),
+        instruction=BudgetedInstruction(CODE_FIXER_INSTRUCTION, "fixed_code"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("fixed_code"),
+        description="Repairs Manim code that failed to render, guided by the render error.",
+        output_key="fixed_code",
+    ))
+
+
+# Outline Agent ("fast" profile)
+# Produces explanation, concepts and storyboard in one structured call instead of three.
+class PipelineOutline(BaseModel):
+    explanation: str = Field(description="Clear explanation of the topic for a general audience")
+    concepts: str = Field(description="The fundamental concepts of the explanation, as bullet points")
+    storyboard: str = Field(description="Ordered storyboard steps with short titles and descriptions teaching each concept")
+
+
+OUTLINE_INSTRUCTION = """
+You are a helpful explainer of technical and abstract concepts and a storyboard planner.
+The user provided an image whose text gives the topic: {topic}.
+They may also have given a specific request: {user_prompt}. If it is empty or unrelated, focus on the topic.
+
+Produce, in one answer:
+1. explanation: a clear and concise explanation of the topic for a general audience. Avoid jargon unless necessary and explain terms you use.
+2. concepts: the fundamental concepts of that explanation, as bullet points.
+3. storyboard: an ordered storyboard with visual scenes and brief captions teaching each concept, as a list of steps with short titles and descriptions.
+
+Answer in the JSON format requested, with plain text values.
+"""
+
+OUTLINE_OUTPUT_KEYS = ("explanation", "concepts", "storyboard")
+
+
+def _outline_from_state(state) -> dict | None:
+    outline = state.get("outline")
+    if isinstance(outline, str):
+        try:
+            outline = json.loads(outline)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(outline, BaseModel):
+        outline = outline.model_dump()
+    return outline if isinstance(outline, dict) else None
+
+
+def split_outline_into_state(callback_context: CallbackContext) -> types.Content | None:
+    """after_agent_callback of the outline agent: store its parts under the regular stage keys."""
+    outline = _outline_from_state(callback_context.state)
+    if outline:
+        for key in OUTLINE_OUTPUT_KEYS:
+            if outline.get(key) and not callback_context.state.get(key):
+                callback_context.state[key] = str(outline[key])
+    return None
+
+
+def skip_outline_if_in_state(callback_context: CallbackContext) -> types.Content | None:
+    """
+    before_agent_callback of the outline agent: skip it when the outline (stage cache) or all of
+    its parts (similar-topic reuse) are already in the session state.
+    """
+    state = callback_context.state
+    if state.get("outline"):
+        split_outline_into_state(callback_context)
+        return types.Content(role="model", parts=[types.Part(text=str(state.get("outline")))])
+    if all(state.get(key) for key in OUTLINE_OUTPUT_KEYS):
+        outline = json.dumps({key: state.get(key) for key in OUTLINE_OUTPUT_KEYS}, ensure_ascii=False)
+        return types.Content(role="model", parts=[types.Part(text=outline)])
+    return None
+
+
+def build_outline_agent() -> LlmAgent:
+    return _register_stage(LlmAgent(
+        name="OutlineAgent",
+        model=stage_model("outline"),
+        before_agent_callback=skip_outline_if_in_state,
+        after_agent_callback=split_outline_into_state,
+        instruction=BudgetedInstruction(OUTLINE_INSTRUCTION, "outline"),
+        before_model_callback=unescape_instruction_braces,
+        generate_content_config=stage_generation_config("outline"),
+        description="Explains the topic, lists its concepts and drafts a storyboard in one structured answer.",
+        output_schema=PipelineOutline,
+        output_key="outline",
+    ))
+
+
+# --- 2. Create the Sequential Orchestration Agents ---
+
+PIPELINE_PROFILES = ("full", "fast", "text-only")
+DEFAULT_PIPELINE_PROFILE = "full"
+
+# Stages of each profile, in order. Agents are built per pipeline because an ADK agent can
+# only belong to one parent agent.
+PROFILE_STAGE_BUILDERS = {
+    # Today's seven-stage chain
+    "full": [
+        build_clear_explanation_agent,
+        build_concept_separator_agent,
+        build_storyboard_creator_agent,
+        build_storyboard_enhancer_agent,
+        build_code_generator_agent,
+        build_code_reviewer_agent,
+        build_code_refactorer_agent,
+    ],
+    # One structured call for explanation/concepts/storyboard, no review/refactor round-trips
+    "fast": [
+        build_outline_agent,
+        build_storyboard_enhancer_agent,
+        build_code_generator_agent,
+    ],
+    # Stops before code generation; no video
+    "text-only": [
+        build_clear_explanation_agent,
+        build_concept_separator_agent,
+        build_storyboard_creator_agent,
+        build_storyboard_enhancer_agent,
     ],
-)
+}
+
+# State key holding the code to render for each profile (None: the profile produces no code)
+PROFILE_FINAL_CODE_KEYS = {
+    "full": "refactored_code",
+    "fast": "generated_code",
+    "text-only": None,
+}
+
+
+def build_root_agent(profile: str = DEFAULT_PIPELINE_PROFILE) -> SequentialAgent:
+    """Builds a fresh pipeline for one of PIPELINE_PROFILES."""
+    if profile not in PROFILE_STAGE_BUILDERS:
+        raise ValueError(f"Unknown pipeline profile '{profile}'. Expected one of {PIPELINE_PROFILES}.")
+    return SequentialAgent(
+        name="root_agent",  # Must be named root_agent for ADK compatibility
+        description="Executes a pipeline to generate a Manim animation from a concept.",
+        sub_agents=[build_stage() for build_stage in PROFILE_STAGE_BUILDERS[profile]],
+    )
+
+
+root_agent = build_root_agent(DEFAULT_PIPELINE_PROFILE)
@@ -0,0 +1,100 @@
+# app/backend/services/stage_metrics.py
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from app.backend.models.agent_job_stage_metric import AgentJobStageMetric
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class StageMetricsRecorder:
+    """
+    Collects per-stage wall time and token usage of one job from the ADK event stream.
+
+    A stage starts when the previous one finished (or when the recorder was created) and ends
+    with its last non-partial event, so the durations add up to the pipeline's wall time.
+    Tokens are summed from the `usage_metadata` of non-partial events; streamed partial events
+    are skipped so usage isn't counted twice. Stages whose output came from a cache make no
+    LLM call and keep `prompt_tokens`/`completion_tokens` at None.
+    """
+
+    def __init__(self, agent_output_keys: dict[str, str], agent_models: dict[str, str]):
+        self.agent_output_keys = agent_output_keys
+        self.agent_models = agent_models
+        self._records: list[dict] = []
+        self._open: dict[tuple[str, int], dict] = {}
+        self._last_finished = _utcnow()
+
+    def _record(self, stage: str, attempt: int, started_at: datetime) -> dict:
+        record = self._open.get((stage, attempt))
+        if record is None:
+            record = {
+                "stage": stage,
+                "attempt": attempt,
+                "output_key": self.agent_output_keys.get(stage),
+                "model": self.agent_models.get(stage),
+                "started_at": started_at,
+                "finished_at": None,
+                "prompt_tokens": None,
+                "completion_tokens": None,
+                "llm_calls": 0,
+                "cached": False,
+            }
+            self._open[(stage, attempt)] = record
+            self._records.append(record)
+        return record
+
+    def observe(self, event, attempt: int = 1):
+        """Feeds one runner event; events of authors that aren't known agents (e.g. "user") are ignored."""
+        author = getattr(event, "author", None)
+        if author not in self.agent_output_keys:
+            return
+        record = self._record(author, attempt, self._last_finished)
+        if event.partial:
+            return
+        usage = getattr(event, "usage_metadata", None)
+        if usage is not None:
+            record["llm_calls"] += 1
+            record["prompt_tokens"] = (record["prompt_tokens"] or 0) + (usage.prompt_token_count or 0)
+            record["completion_tokens"] = (record["completion_tokens"] or 0) + (usage.candidates_token_count or 0)
+        record["finished_at"] = self._last_finished = _utcnow()
+
+    def record_span(self, stage: str, started_at: datetime, finished_at: datetime, attempt: int = 1):
+        """Records a non-agent step, e.g. a Manim render."""
+        record = self._record(stage, attempt, started_at)
+        record["finished_at"] = self._last_finished = finished_at
+
+    def mark_cached(self, output_keys):
+        output_keys = set(output_keys)
+        for record in self._records:
+            if record["output_key"] in output_keys:
+                record["cached"] = True
+
+    def records(self) -> list[dict]:
+        """JSON-ready stage metrics in execution order (timestamps as ISO 8601 strings)."""
+        result = []
+        for record in self._records:
+            finished_at = record["finished_at"]
+            result.append({
+                **record,
+                "started_at": record["started_at"].isoformat(),
+                "finished_at": finished_at.isoformat() if finished_at else None,
+                "duration_ms": int((finished_at - record["started_at"]).total_seconds() * 1000) if finished_at else None,
+            })
+        return result
+
+    def save(self, db: Session, job_id: int):
+        """Stores the recorded stages as agent_job_stage_metrics rows of the job."""
+        if not self._records:
+            return
+        for record in self._records:
+            finished_at = record["finished_at"]
+            db.add(AgentJobStageMetric(
+                job_id=job_id,
+                duration_ms=int((finished_at - record["started_at"]).total_seconds() * 1000) if finished_at else None,
+                **record,
+            ))
+        db.commit()
@@ -0,0 +1,63 @@
+# app/backend/services/stream_coalescer.py
+import asyncio
+from typing import Awaitable, Callable
+
+
+class StreamDeltaCoalescer:
+    """
+    Buffers streamed LLM text deltas and emits them in frames, so subscribers get one WebSocket
+    message every `flush_interval_ms` (or every `flush_bytes` of text) instead of one per token.
+
+    `send(result_type, text, seq)` is awaited for every frame; `seq` counts frames per result type
+    so clients can detect gaps. Call `flush()` when a stage finishes, before sending its final value.
+    """
+
+    def __init__(self, send: Callable[[str, str, int], Awaitable[None]], flush_interval_ms: int, flush_bytes: int):
+        self._send = send
+        self.flush_interval_seconds = max(0, flush_interval_ms) / 1000
+        self.flush_bytes = max(1, flush_bytes)
+        self._result_type: str | None = None
+        self._buffer: list[str] = []
+        self._buffered_bytes = 0
+        self._seq: dict[str, int] = {}
+        self._timer: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.frames_sent = 0
+        self.deltas_received = 0
+
+    async def add(self, result_type: str, delta: str):
+        if not delta:
+            return
+        self.deltas_received += 1
+        if self._result_type != result_type:
+            await self.flush()  # Never mix two stages in one frame
+            self._result_type = result_type
+        self._buffer.append(delta)
+        self._buffered_bytes += len(delta.encode("utf-8"))
+        if self._buffered_bytes >= self.flush_bytes or self.flush_interval_seconds == 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval_seconds)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Sends whatever is buffered as one frame."""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            result_type, text = self._result_type, "".join(self._buffer)
+            self._buffer, self._buffered_bytes = [], 0
+            seq = self._seq.get(result_type, 0)
+            self._seq[result_type] = seq + 1
+            self.frames_sent += 1
+            await self._send(result_type, text, seq)
+
+    async def close(self):
+        await self.flush()
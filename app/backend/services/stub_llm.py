@@ -0,0 +1,150 @@
+# app/backend/services/stub_llm.py
+import asyncio
+import json
+import math
+import random
+import zlib
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+from app.backend.config import settings
+from app.backend.services.prompt_budget import estimate_tokens
+
+STUB_MODEL_PREFIX = "stub/"
+STUB_LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+# Streamed responses are split into this many partial chunks
+STUB_STREAM_CHUNKS = 8
+
+# Renders with a plain Manim Community install (no LaTeX, no external assets) and passes
+# services/manim_validator.py, so review/refactor are skipped like for clean LLM code.
+STUB_MANIM_CODE = '''```python
+from manim import *
+
+
+class StubExplainerScene(Scene):
+    def construct(self):
+        title = Text("Offline stub animation", font_size=40)
+        self.play(Write(title))
+        self.wait(0.5)
+        self.play(title.animate.to_edge(UP))
+
+        circle = Circle(radius=1.2, color=BLUE)
+        square = Square(side_length=2, color=GREEN).next_to(circle, RIGHT, buff=1)
+        self.play(Create(circle), Create(square))
+        self.play(Transform(square, Circle(radius=1, color=YELLOW).move_to(square)))
+
+        caption = Text("Shapes can change form", font_size=28).to_edge(DOWN)
+        self.play(FadeIn(caption))
+        self.wait(1)
+        self.play(FadeOut(circle), FadeOut(square), FadeOut(caption), FadeOut(title))
+```'''
+
+_STUB_EXPLANATION = (
+    "This is a canned explanation from the offline stub model. The topic is broken into a few "
+    "simple ideas, each explained in plain words with one small example."
+)
+_STUB_CONCEPTS = "- The main idea of the topic\n- A worked example\n- How the parts fit together"
+_STUB_STORYBOARD = (
+    "1. Title: Introduce the topic with its name on screen.\n"
+    "2. Shapes: Show a circle and a square side by side.\n"
+    "3. Change: Transform the square into a circle to show how one thing becomes another.\n"
+    "4. Recap: Fade everything out after a one-line caption."
+)
+
+# Canned output per stage output key (see stage_model in services/root_agent/agent.py)
+STUB_OUTPUTS = {
+    "explanation": _STUB_EXPLANATION,
+    "concepts": _STUB_CONCEPTS,
+    "storyboard": _STUB_STORYBOARD,
+    "enhanced_storyboard": (
+        f"{_STUB_STORYBOARD}\n\n"
+        "Narration: 'Let's look at this step by step.' Each object stays on screen for about two "
+        "seconds; transitions use Create, Transform and FadeOut."
+    ),
+    "generated_code": STUB_MANIM_CODE,
+    "review_comments": "No major issues found.",
+    "refactored_code": STUB_MANIM_CODE,
+    "fixed_code": STUB_MANIM_CODE,
+    "outline": json.dumps({"explanation": _STUB_EXPLANATION, "concepts": _STUB_CONCEPTS, "storyboard": _STUB_STORYBOARD}),
+}
+
+
+class StubLlmError(RuntimeError):
+    """Simulated model failure (AGENT_STUB_FAILURE_RATE)."""
+
+
+def _request_text(llm_request: LlmRequest) -> str:
+    parts = [str(llm_request.config.system_instruction or "")] if llm_request.config else []
+    for content in llm_request.contents or []:
+        parts.extend(part.text or "" for part in content.parts or [])
+    return "\n".join(parts)
+
+
+class StubLlm(BaseLlm):
+    """
+    Offline stand-in for LiteLlm (AGENT_LLM_BACKEND=stub): answers each stage with its canned
+    STUB_OUTPUTS entry after a simulated latency, and fails with AGENT_STUB_FAILURE_RATE.
+    The stage is taken from the model name, "stub/<output_key>".
+
+    Latency is drawn per call from AGENT_STUB_LATENCY_DISTRIBUTION around the stage's
+    AGENT_STUB_STAGE_LATENCY_MS entry (else AGENT_STUB_LATENCY_MS). With AGENT_STUB_SEED set,
+    each stage draws from its own seeded generator, so runs are reproducible.
+    Token usage is reported with the same 4-characters-per-token estimate as the prompt budgets.
+    """
+
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def model_post_init(self, __context) -> None:
+        super().model_post_init(__context)
+        if settings.AGENT_STUB_SEED is not None:
+            self._rng = random.Random(settings.AGENT_STUB_SEED ^ zlib.crc32(self.model.encode("utf-8")))
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"stub/.*"]
+
+    @property
+    def stage(self) -> str:
+        return self.model[len(STUB_MODEL_PREFIX):] if self.model.startswith(STUB_MODEL_PREFIX) else self.model
+
+    def _latency_seconds(self) -> float:
+        latency_ms = settings.agent_stub_stage_latency_ms.get(self.stage, settings.AGENT_STUB_LATENCY_MS)
+        distribution = settings.AGENT_STUB_LATENCY_DISTRIBUTION
+        if distribution == "uniform":
+            latency_ms = self._rng.uniform(0.5 * latency_ms, 1.5 * latency_ms)
+        elif distribution == "lognormal":
+            # latency_ms is the median; sigma sets the tail
+            latency_ms = self._rng.lognormvariate(math.log(max(latency_ms, 1e-3)), settings.AGENT_STUB_LATENCY_SIGMA)
+        return max(0.0, latency_ms) / 1000
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        latency = self._latency_seconds()
+        fails = self._rng.random() < settings.AGENT_STUB_FAILURE_RATE
+        text = STUB_OUTPUTS.get(self.stage, _STUB_EXPLANATION)
+        usage = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=estimate_tokens(_request_text(llm_request)),
+            candidates_token_count=estimate_tokens(text),
+            total_token_count=estimate_tokens(_request_text(llm_request)) + estimate_tokens(text),
+        )
+
+        if not stream:
+            await asyncio.sleep(latency)
+            if fails:
+                raise StubLlmError(f"Simulated failure of stub model '{self.model}'")
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), usage_metadata=usage)
+            return
+
+        # Streaming: the latency is spread over the chunks, a failure happens mid-stream
+        chunk_size = math.ceil(len(text) / STUB_STREAM_CHUNKS)
+        for index, start in enumerate(range(0, len(text), chunk_size)):
+            await asyncio.sleep(latency / STUB_STREAM_CHUNKS)
+            if fails and index >= STUB_STREAM_CHUNKS // 2:
+                raise StubLlmError(f"Simulated failure of stub model '{self.model}'")
+            chunk = text[start:start + chunk_size]
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), usage_metadata=usage, turn_complete=True)
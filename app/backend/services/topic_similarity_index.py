@@ -0,0 +1,222 @@
+# app/backend/services/topic_similarity_index.py
+import hashlib
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from app.backend.config import settings
+from app.backend.database import SessionLocal
+from app.backend.models.agent_job import AgentJob
+from app.backend.services.agent_stage_cache import normalize_prompt_text
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_SHINGLE_SIZE = 3
+# New entries are scanned linearly until this many have accumulated, then the sorted band tables are rebuilt
+_PENDING_REBUILD_THRESHOLD = 4096
+
+
+def _topic_shingles(topic: str) -> np.ndarray:
+    """crc32 of the character 3-grams of a topic with case and all whitespace removed (OCR spacing is unreliable)."""
+    text = re.sub(r"\s+", "", (topic or "").lower())
+    if len(text) <= _SHINGLE_SIZE:
+        grams = {text}
+    else:
+        grams = {text[i:i + _SHINGLE_SIZE] for i in range(len(text) - _SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def _prompt_hash(user_prompt: str | None) -> np.uint64:
+    digest = hashlib.blake2b(normalize_prompt_text(user_prompt).encode("utf-8"), digest_size=8).digest()
+    return np.frombuffer(digest, dtype=np.uint64)[0]
+
+
+def _choose_band_rows(num_perm: int, threshold: float) -> int:
+    """
+    Rows per LSH band. Picks the most selective banding whose candidate threshold (1/b)^(1/r)
+    stays well below the similarity threshold, so near matches are still found reliably.
+    """
+    best = 1
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows == 0 and (rows / num_perm) ** (1 / rows) <= threshold * 0.75:
+            best = rows
+    return best
+
+
+class TopicSimilarityIndex:
+    """
+    Finds earlier jobs whose OCR topic is nearly the same text (and whose user prompt is the
+    same), so their explanation/concepts/storyboard can be reused.
+
+    Topics are compared by MinHash over character 3-grams (estimated Jaccard similarity), with
+    LSH banding for candidate lookup; everything is computed locally with numpy.
+    Signatures are stored as 16-bit values (b-bit MinHash) in a fixed-capacity ring buffer.
+    Each band keeps a sorted array of band hashes, so a lookup is one binary search per band
+    plus a scan of the few entries added since the last (background) re-sort.
+
+    Memory is about 528 bytes per entry with the default 64 permutations (16 bands), allocated
+    per process: each gunicorn worker holds and loads its own copy, and a re-sort briefly needs
+    another copy of the band hashes.
+    """
+
+    def __init__(self, threshold: float, num_perm: int, capacity: int, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = max(1, num_perm)
+        self.capacity = max(1, capacity)
+        self.rows = _choose_band_rows(self.num_perm, threshold)
+        self.bands = self.num_perm // self.rows
+
+        rng = np.random.default_rng(seed)
+        self._perm_a = rng.integers(1, int(_MERSENNE_PRIME), size=self.num_perm, dtype=np.uint64)
+        self._perm_b = rng.integers(0, int(_MERSENNE_PRIME), size=self.num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._signatures = np.zeros((self.capacity, self.num_perm), dtype=np.uint16)
+        self._band_hashes = np.zeros((self.capacity, self.bands), dtype=np.uint64)
+        self._prompt_hashes = np.zeros(self.capacity, dtype=np.uint64)
+        self._job_ids = np.full(self.capacity, -1, dtype=np.int64)
+        self._next_slot = 0
+        self._size = 0
+        # Per band: band hashes sorted, and the slots they belong to (may be stale for overwritten slots)
+        self._sorted_values = np.zeros((self.bands, 0), dtype=np.uint64)
+        self._sorted_slots = np.zeros((self.bands, 0), dtype=np.int64)
+        self._pending: list[int] = []
+        self._rebuilding = False
+        self._lookups = 0
+        self._matches = 0
+
+    def signature(self, topic: str) -> np.ndarray:
+        shingles = _topic_shingles(topic)
+        hashes = (np.outer(shingles, self._perm_a) + self._perm_b) % _MERSENNE_PRIME & _MAX_HASH
+        return (hashes.min(axis=0) & np.uint64(0xFFFF)).astype(np.uint16)
+
+    def _band_hashes_of(self, signatures: np.ndarray) -> np.ndarray:
+        """FNV-style fold of each band's rows into one uint64 (works on one or many signatures)."""
+        bands = signatures.reshape(*signatures.shape[:-1], self.bands, self.rows).astype(np.uint64)
+        folded = np.full(bands.shape[:-1], np.uint64(0xCBF29CE484222325), dtype=np.uint64)
+        for row in range(self.rows):
+            folded = (folded ^ bands[..., row]) * np.uint64(0x100000001B3)
+        return folded
+
+    def add(self, topic: str, user_prompt: str | None, job_id: int):
+        signature = self.signature(topic)
+        band_hashes = self._band_hashes_of(signature)
+        with self._lock:
+            slot = self._next_slot
+            self._signatures[slot] = signature
+            self._band_hashes[slot] = band_hashes
+            self._prompt_hashes[slot] = _prompt_hash(user_prompt)
+            self._job_ids[slot] = job_id
+            self._next_slot = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+            self._pending.append(slot)
+        self._maybe_start_rebuild()
+
+    def _maybe_start_rebuild(self, force: bool = False):
+        """Starts a background re-sort once enough entries are pending (or any are, with `force`)."""
+        with self._lock:
+            if self._rebuilding or not self._pending:
+                return
+            if not force and len(self._pending) < _PENDING_REBUILD_THRESHOLD:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        """Re-sorts the band tables over all entries (off the request path); pending entries stay scannable meanwhile."""
+        try:
+            with self._lock:
+                size = self._size
+                covered = len(self._pending)
+                band_hashes = self._band_hashes[:size].copy()
+            order = np.argsort(band_hashes, axis=0, kind="stable").T.astype(np.int64)
+            values = np.take_along_axis(band_hashes.T, order, axis=1)
+            with self._lock:
+                self._sorted_values, self._sorted_slots = values, order
+                self._pending = self._pending[covered:]
+        finally:
+            with self._lock:
+                self._rebuilding = False
+        # Entries added while sorting may have crossed the threshold again
+        self._maybe_start_rebuild()
+
+    def find_similar(self, topic: str, user_prompt: str | None) -> tuple[int, float] | None:
+        """Returns (job_id, estimated Jaccard similarity) of the most similar indexed topic above the threshold."""
+        signature = self.signature(topic)
+        band_hashes = self._band_hashes_of(signature)
+        prompt_hash = _prompt_hash(user_prompt)
+        with self._lock:
+            self._lookups += 1
+            candidates = []
+            for band in range(self.bands):
+                values = self._sorted_values[band]
+                lo = np.searchsorted(values, band_hashes[band], side="left")
+                hi = np.searchsorted(values, band_hashes[band], side="right")
+                if hi > lo:
+                    candidates.append(self._sorted_slots[band, lo:hi])
+            if self._pending:
+                pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+                candidates.append(pending[(self._band_hashes[pending] == band_hashes).any(axis=1)])
+            if not candidates:
+                return None
+            slots = np.unique(np.concatenate(candidates))
+            # Drop stale sorted entries (slot overwritten since) and other prompts
+            slots = slots[
+                (self._band_hashes[slots] == band_hashes).any(axis=1)
+                & (self._prompt_hashes[slots] == prompt_hash)
+                & (self._job_ids[slots] >= 0)
+            ]
+            if not len(slots):
+                return None
+            similarities = (self._signatures[slots] == signature).mean(axis=1)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            self._matches += 1
+            return int(self._job_ids[slots[best]]), float(similarities[best])
+
+    def load_recent_jobs(self):
+        """Fills the index from the most recent jobs that have a storyboard."""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(AgentJob.id, AgentJob.input_text, AgentJob.user_prompt)
+                .filter(AgentJob.storyboard.isnot(None))
+                .order_by(AgentJob.id.desc())
+                .limit(self.capacity)
+                .all()
+            )
+            for job_id, input_text, user_prompt in reversed(rows):
+                if input_text and not input_text.startswith("Error:"):
+                    self.add(input_text, user_prompt, job_id)
+            # Sort the remainder too, so lookups do not scan up to a threshold's worth of pending entries
+            self._maybe_start_rebuild(force=True)
+            print(f"[Topic Similarity] Loaded {len(rows)} topics into the similarity index.")
+        except Exception as e:
+            print(f"[Topic Similarity] Could not load topics: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "num_perm": self.num_perm,
+                "bands": self.bands,
+                "rows_per_band": self.rows,
+                "pending_unsorted": len(self._pending),
+                "lookups": self._lookups,
+                "matches": self._matches,
+            }
+
+
+# Global instance of the TopicSimilarityIndex
+topic_similarity_index = TopicSimilarityIndex(
+    threshold=settings.AGENT_TOPIC_SIMILARITY_THRESHOLD,
+    num_perm=settings.AGENT_TOPIC_SIMILARITY_NUM_PERM,
+    capacity=settings.AGENT_TOPIC_SIMILARITY_MAX_ENTRIES,
+)
@@ -0,0 +1,131 @@
+# app/backend/services/upload_service.py
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator
+
+from app.backend.config import settings
+
+# Uploaded images are stored content-addressed (<sha256><ext>) so re-uploads share one file.
+UPLOAD_DIR = Path(settings.UPLOAD_DIR) if settings.UPLOAD_DIR else Path(__file__).resolve().parent.parent / "uploads"
+# Old uploads are pruned every this many stored uploads (and on startup)
+PRUNE_EVERY_UPLOADS = 100
+# Spool files of uploads that never finished (e.g. the process died mid-request)
+STALE_SPOOL_SECONDS = 3600
+
+_prune_lock = threading.Lock()
+_uploads_since_prune = 0
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds settings.MAX_UPLOAD_BYTES."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes.")
+
+
+class EmptyUploadError(Exception):
+    """Raised when an upload has no body."""
+
+    def __init__(self):
+        super().__init__("Upload is empty.")
+
+
+def prune_uploads(retention_seconds: int | None = None) -> int:
+    """
+    Deletes stored uploads not written (or re-uploaded) within `retention_seconds`
+    (default settings.UPLOAD_RETENTION_DAYS; 0 keeps them forever) and abandoned spool files.
+    Returns the number of files deleted.
+    """
+    if retention_seconds is None:
+        retention_seconds = settings.UPLOAD_RETENTION_DAYS * 86400
+    if not UPLOAD_DIR.is_dir():
+        return 0
+    now = time.time()
+    deleted = 0
+    for path in UPLOAD_DIR.iterdir():
+        try:
+            age = now - path.stat().st_mtime
+            if not path.is_file():
+                continue
+            if path.suffix == ".part":
+                expired = age > STALE_SPOOL_SECONDS
+            else:
+                expired = retention_seconds > 0 and age > retention_seconds
+            if expired:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            continue  # Removed concurrently (another worker pruning, or a spool file renamed into place)
+    if deleted:
+        print(f"[Upload Service] Pruned {deleted} old upload file(s) from {UPLOAD_DIR}")
+    return deleted
+
+
+def _maybe_prune_uploads():
+    global _uploads_since_prune
+    with _prune_lock:
+        _uploads_since_prune += 1
+        prune = _uploads_since_prune >= PRUNE_EVERY_UPLOADS
+        if prune:
+            _uploads_since_prune = 0
+    if prune:
+        prune_uploads()
+
+
+def _finish_spool(spool_name: str, stored_path: Path):
+    try:
+        # Same bytes were uploaded before: keep the existing file, but restart its retention period
+        os.utime(stored_path)
+        os.unlink(spool_name)
+    except FileNotFoundError:
+        os.replace(spool_name, stored_path)
+    _maybe_prune_uploads()
+
+
+def _discard_spool(spool):
+    spool.close()
+    if os.path.exists(spool.name):
+        os.unlink(spool.name)
+
+
+async def store_upload_stream(chunks: AsyncIterator[bytes], content_type: str, max_bytes: int) -> tuple[Path, str, int]:
+    """
+    Streams an upload to disk chunk by chunk, hashing as it goes, so the full image is never
+    held in memory; file I/O runs in threads to keep the event loop free.
+    Returns (stored path, sha256 hex digest, size in bytes).
+    Raises UploadTooLargeError as soon as the stream passes `max_bytes`, EmptyUploadError for an empty body.
+    """
+    await asyncio.to_thread(UPLOAD_DIR.mkdir, parents=True, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    spool = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=UPLOAD_DIR, suffix=".part", delete=False)
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            hasher.update(chunk)
+            await asyncio.to_thread(spool.write, chunk)
+        if size == 0:
+            raise EmptyUploadError()
+        await asyncio.to_thread(spool.close)
+
+        digest = hasher.hexdigest()
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".img"
+        stored_path = UPLOAD_DIR / f"{digest}{extension}"
+        await asyncio.to_thread(_finish_spool, spool.name, stored_path)
+        print(f"[Upload Service] Stored upload of {size} bytes at {stored_path}")
+        return stored_path, digest, size
+    except BaseException:
+        # If this is interrupted too, prune_uploads removes the spool file later
+        await asyncio.to_thread(_discard_spool, spool)
+        raise
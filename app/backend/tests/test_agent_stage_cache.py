@@ -0,0 +1,92 @@
+# app/backend/tests/test_agent_stage_cache.py
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.backend.database import Base
+from app.backend.models.agent_stage_cache_entry import AgentStageCacheEntry
+from app.backend.services import agent_stage_cache as stage_cache_module
+from app.backend.services.agent_stage_cache import AgentStageCache, stage_model_name
+
+
+def _agent(output_key: str, instruction: str = "Explain {topic}", model: str = "openai/gpt-4o", **model_args):
+    llm = SimpleNamespace(model=model, _additional_args=model_args)
+    return SimpleNamespace(output_key=output_key, model=llm, instruction=instruction)
+
+
+PIPELINE = [_agent("explanation"), _agent("concepts", "List concepts of {explanation}"), _agent("storyboard", "Storyboard {concepts}")]
+
+
+def _cache(persistent: bool = False, ttl_seconds: int = 0) -> AgentStageCache:
+    return AgentStageCache(max_memory_entries=100, persistent=persistent, ttl_seconds=ttl_seconds, max_persistent_entries=1000, version="1")
+
+
+@pytest.fixture
+def database(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[AgentStageCacheEntry.__table__])
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(stage_cache_module, "SessionLocal", session_factory)
+    return session_factory
+
+
+def test_keys_chain_through_upstream_stages():
+    cache = _cache()
+    keys = cache.make_keys("x^2", "simple", PIPELINE)
+    assert list(keys) == ["explanation", "concepts", "storyboard"]
+    # Topic and prompt are compared case- and whitespace-insensitively
+    assert cache.make_keys("  X^2 ", "Simple", PIPELINE) == keys
+
+    changed = cache.make_keys("x^2", "simple", [PIPELINE[0], _agent("concepts", "New prompt {explanation}"), PIPELINE[2]])
+    assert changed["explanation"] == keys["explanation"]
+    assert changed["concepts"] != keys["concepts"]
+    assert changed["storyboard"] != keys["storyboard"]  # Downstream of the changed stage
+
+    other_model = cache.make_keys("x^2", "simple", [_agent("explanation", model="openai/gpt-4o-mini"), *PIPELINE[1:]])
+    assert all(other_model[stage] != keys[stage] for stage in keys)
+    assert AgentStageCache(100, False, 0, 1000, version="2").make_keys("x^2", "simple", PIPELINE) != keys
+
+
+def test_stage_model_name_includes_custom_endpoint():
+    assert stage_model_name(_agent("concepts")) == "openai/gpt-4o"
+    assert stage_model_name(_agent("concepts", api_base="http://localhost:11434/v1")) == "openai/gpt-4o@http://localhost:11434/v1"
+
+
+def test_lookup_prefix_stops_at_the_first_missing_stage():
+    cache = _cache()
+    keys = cache.make_keys("x^2", None, PIPELINE)
+    cache.put("explanation", keys["explanation"], "an explanation")
+    cache.put("storyboard", keys["storyboard"], "a storyboard")  # Unusable: concepts would run again
+    lookup_keys, cached = cache.lookup_prefix("x^2", None, PIPELINE)
+    assert lookup_keys == keys
+    assert cached == {"explanation": "an explanation"}
+    assert cache.stats()["stages"]["concepts"]["misses"] == 1
+
+
+def test_memory_entries_expire_after_the_ttl(monkeypatch):
+    cache = _cache(ttl_seconds=60)
+    cache.put("explanation", "key", "text")
+    assert cache.get("explanation", "key") == "text"
+    now = stage_cache_module.time.time()
+    monkeypatch.setattr(stage_cache_module.time, "time", lambda: now + 61)
+    assert cache.get("explanation", "key") is None
+
+
+def test_persistent_tier_survives_a_new_process_and_can_be_replaced(database):
+    keys = _cache().make_keys("x^2", None, PIPELINE)
+    _cache(persistent=True).put("explanation", keys["explanation"], "generated")
+
+    fresh = _cache(persistent=True)  # Empty memory tier, like another worker
+    assert fresh.get("explanation", keys["explanation"]) == "generated"
+    assert fresh.stats()["stages"]["explanation"]["disk_hits"] == 1
+
+    fresh.put("explanation", keys["explanation"], "ignored duplicate")
+    assert _cache(persistent=True).get("explanation", keys["explanation"]) == "generated"
+    fresh.put("explanation", keys["explanation"], "repaired", replace=True)
+    assert _cache(persistent=True).get("explanation", keys["explanation"]) == "repaired"
+
+    assert fresh.invalidate(stage="explanation") == 1
+    assert _cache(persistent=True).get("explanation", keys["explanation"]) is None
@@ -0,0 +1,83 @@
+# app/backend/tests/test_image_fingerprint.py
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.backend.services.image_fingerprint import PerceptualHashIndex, compute_dhash, phash_to_hex
+
+
+def _formula_image(text: str, scale: float = 1.0, quality=95) -> bytes:
+    image = Image.new("RGB", (640, 240), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 20, 620, 220), outline="black", width=4)
+    draw.text((60, 120), text, fill="black")
+    draw.ellipse((440, 40, 580, 180), fill="gray")
+    if scale != 1.0:
+        image = image.resize((int(640 * scale), int(240 * scale)), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def test_dhash_is_stable_under_recompression_and_rescaling():
+    original = compute_dhash(_formula_image("x^2 + y^2 = r^2"))
+    assert _distance(original, compute_dhash(_formula_image("x^2 + y^2 = r^2", quality=40))) <= 6
+    assert _distance(original, compute_dhash(_formula_image("x^2 + y^2 = r^2", scale=2.0))) <= 6
+    assert len(phash_to_hex(original)) == 16
+
+
+def test_dhash_separates_different_images():
+    other = Image.linear_gradient("L").rotate(90).resize((640, 240))
+    buffer = io.BytesIO()
+    other.save(buffer, format="PNG")
+    assert _distance(compute_dhash(_formula_image("x^2")), compute_dhash(buffer.getvalue())) > 6
+
+
+@pytest.mark.parametrize("rebuild", [False, True])
+def test_index_matches_brute_force(rebuild):
+    rng = np.random.default_rng(0)
+    hashes = [int(h) for h in rng.integers(0, 2**63, size=5000, dtype=np.int64)]
+    index = PerceptualHashIndex(max_distance=6, capacity=10_000)
+    for job_id, value in enumerate(hashes):
+        index.add(value, job_id)
+    if rebuild:
+        index._rebuild()
+        assert index.stats()["pending_unsorted"] == 0
+
+    for query_id in rng.integers(0, len(hashes), size=50):
+        query = hashes[query_id]
+        for bit in rng.choice(64, size=rng.integers(0, 7), replace=False):
+            query ^= 1 << int(bit)
+        expected = sorted((_distance(query, value), job_id) for job_id, value in enumerate(hashes) if _distance(query, value) <= 6)
+        assert index.find_within(query, limit=len(hashes)) == [(job_id, distance) for distance, job_id in expected]
+        assert index.find_nearest(query) == (expected[0][1], expected[0][0])
+
+
+def test_find_within_orders_by_distance_and_respects_the_limit():
+    index = PerceptualHashIndex(max_distance=6, capacity=100)
+    base = 0x0F0F_F0F0_1234_5678
+    index.add(base ^ 0b111, 1)
+    index.add(base ^ 0b1, 2)
+    index.add(base, 3)
+    index.add(base ^ 0xFF, 4)  # 8 bits away
+    assert index.find_within(base) == [(3, 0), (2, 1), (1, 3)]
+    assert index.find_within(base, max_distance=1) == [(3, 0), (2, 1)]
+    assert index.find_within(base, limit=1) == [(3, 0)]
+    assert index.find_nearest(base ^ 0xFFFF_0000) is None
+
+
+def test_ring_buffer_overwrites_the_oldest_entry():
+    index = PerceptualHashIndex(max_distance=2, capacity=2)
+    index.add(0xAAAA, 1)
+    index._rebuild()
+    index.add(0xBBBB_0000, 2)
+    index.add(0xCCCC_0000_0000, 3)  # overwrites job 1's slot
+    assert index.find_nearest(0xAAAA) is None
+    assert index.find_nearest(0xCCCC_0000_0000) == (3, 0)
+    assert index.stats()["entries"] == 2
@@ -0,0 +1,100 @@
+# app/backend/tests/test_manim_validator.py
+import pytest
+
+from app.backend.services.manim_validator import (
+    NO_ISSUES_MESSAGE,
+    format_findings,
+    scene_class_names,
+    strip_code_fences,
+    validate_manim_code,
+)
+
+VALID_CODE = '''```python
+from manim import *
+
+def make_label(text):
+    return Text(text, font_size=36)
+
+class PythagorasScene(Scene):
+    def construct(self):
+        label = make_label("a² + b² = c²")
+        box = RoundedRectangle(corner_radius=0.2, width=4, height=2)
+        self.play(Create(box), Write(label), rate_func=smooth)
+        self.wait(1)
+```'''
+
+
+def _rules(code: str) -> list[str]:
+    return [finding.rule for finding in validate_manim_code(code)]
+
+
+def test_valid_code_has_no_findings():
+    assert validate_manim_code(VALID_CODE) == []
+    assert format_findings([]) == NO_ISSUES_MESSAGE
+
+
+def test_strip_code_fences():
+    assert strip_code_fences("```python\nx = 1\n```") == "x = 1"
+    assert strip_code_fences("```\nx = 1\n```") == "x = 1"
+    assert strip_code_fences("x = 1") == "x = 1"
+
+
+def test_syntax_error():
+    findings = validate_manim_code("class A(Scene):\n    def construct(self)\n        pass")
+    assert [finding.rule for finding in findings] == ["syntax-error"]
+    assert findings[0].line == 2
+
+
+@pytest.mark.parametrize("expression", [
+    'MathTex(r"x^2")',
+    'Tex("x")',
+    'manim.MathTex(r"x^2")',
+    'mn.Tex("x")',
+    'SVGMobject("logo.svg")',
+    'ImageMobject("photo.png")',
+])
+def test_forbidden_classes_bare_and_as_attributes(expression):
+    code = f"import manim\nimport manim as mn\nclass A(Scene):\n    def construct(self):\n        self.add({expression})\n"
+    assert _rules(code) == ["forbidden-class"]
+
+
+def test_forbidden_class_imported_under_an_alias():
+    code = "from manim import Scene, MathTex as M\nclass A(Scene):\n    def construct(self):\n        self.add(M('x'))\n"
+    assert _rules(code) == ["forbidden-class"]
+
+
+def test_rectangle_corner_radius_and_rate_func_placement():
+    code = (
+        "class A(Scene):\n"
+        "    def construct(self):\n"
+        "        box = Rectangle(corner_radius=0.1)\n"
+        "        self.play(Create(box, rate_func=linear))\n"
+    )
+    findings = validate_manim_code(code)
+    assert [(finding.rule, finding.line) for finding in findings] == [("rectangle-corner-radius", 3), ("rate-func-in-animation", 4)]
+
+
+def test_self_call_to_module_level_function():
+    code = "def helper():\n    return Dot()\nclass A(Scene):\n    def construct(self):\n        self.add(self.helper())\n"
+    assert _rules(code) == ["self-call-to-global"]
+    with_method = code.replace("    def construct", "    def helper(self):\n        return Dot()\n    def construct")
+    assert _rules(with_method) == []
+
+
+def test_missing_scene():
+    assert _rules("class Helper:\n    pass\n") == ["missing-scene"]
+
+
+@pytest.mark.parametrize("code, names", [
+    (VALID_CODE, ["PythagorasScene"]),
+    ("class Zoom(MovingCameraScene):\n    pass\n", ["Zoom"]),
+    ("class Spin(manim.ThreeDScene):\n    pass\n", ["Spin"]),
+    ("class Base(Scene):\n    pass\nclass Main(Base):\n    pass\n", ["Base", "Main"]),
+    ("class Helper:\n    pass\n", []),
+    # Doesn't parse: regex fallback with the same `*Scene` rule
+    ("class Zoom(MovingCameraScene):\n    def construct(self)\n", ["Zoom"]),
+])
+def test_scene_class_names_match_the_validator(code, names):
+    assert scene_class_names(code) == names
+    if names and "def construct(self)\n" not in code:
+        assert "missing-scene" not in _rules(code)
@@ -0,0 +1,46 @@
+# app/backend/tests/test_ocr_executor.py
+import asyncio
+
+import pytest
+
+from app.backend.services.ocr_executor import OCRExecutor, OCRQueueFullError
+
+
+def _executor(workers: int = 2, max_queued: int = 1) -> OCRExecutor:
+    return OCRExecutor(workers=workers, torch_threads=1, max_queued=max_queued, retry_after_seconds=7)
+
+
+def test_reserve_slot_rejects_beyond_capacity():
+    executor = _executor()
+    assert executor.capacity == 3
+    slots = [executor.reserve_slot() for _ in range(3)]
+    with pytest.raises(OCRQueueFullError) as exc_info:
+        executor.reserve_slot()
+    assert exc_info.value.retry_after_seconds == 7  # No run times recorded yet: the configured default
+    stats = executor.stats()
+    assert stats["in_flight"] == 3 and stats["rejected"] == 1
+
+    slots[0].release()
+    slots[0].release()  # Idempotent
+    assert executor.stats()["in_flight"] == 2
+    executor.reserve_slot()
+    assert executor.stats()["in_flight"] == 3
+
+
+def test_retry_after_follows_recent_run_times():
+    executor = _executor()
+    for _ in range(3):
+        executor.reserve_slot()
+    executor.record_timings(0.0, 4.0)
+    # Two workers busy and one queued: the next slot frees up after about one run
+    assert executor.retry_after_seconds() == 4
+    with pytest.raises(OCRQueueFullError) as exc_info:
+        executor.reserve_slot()
+    assert exc_info.value.retry_after_seconds == 4
+
+
+def test_run_without_started_workers_fails_instead_of_running_in_process():
+    executor = _executor()
+    with pytest.raises(RuntimeError, match="OCR workers are not running"):
+        asyncio.run(executor.run(len, "abc"))
+    assert executor.stats()["in_flight"] == 0  # The reserved slot was released
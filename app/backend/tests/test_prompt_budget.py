@@ -0,0 +1,103 @@
+# app/backend/tests/test_prompt_budget.py
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app.backend.config import settings
+from app.backend.services.prompt_budget import (
+    TRUNCATION_MARKER,
+    BudgetedInstruction,
+    estimate_tokens,
+    prune_context,
+    trim_to_tokens,
+    unescape_instruction_braces,
+)
+
+CODE_WITH_BRACES = '''from manim import *
+
+class FractionScene(Scene):
+    def construct(self):
+        for i in range(3):
+            label = Text(f"Step {i}: {i + 1}")
+        formula = MathTex(r"\\frac{a}{b} = x^{2}")
+        self.play(Write(formula))
+'''
+
+
+def _adk_inject_session_state(template: str, state: dict) -> str:
+    """The `{state_key}` injection ADK 0.x applies to every instruction, provider output included."""
+    def replace(match):
+        name = match.group().lstrip("{").rstrip("}").strip()
+        if not name.isidentifier():
+            return match.group()
+        if name not in state:
+            raise KeyError(f"Context variable not found: `{name}`.")
+        return str(state[name])
+    return re.sub(r"{+[^{}]*}+", replace, template)
+
+
+def _render(instruction: BudgetedInstruction, state: dict) -> str:
+    """Instruction as the model receives it: provider, ADK state injection, then the before_model_callback."""
+    text = _adk_inject_session_state(instruction(SimpleNamespace(state=state)), state)
+    request = SimpleNamespace(config=SimpleNamespace(system_instruction=text))
+    assert unescape_instruction_braces(None, request) is None
+    return request.config.system_instruction
+
+
+@pytest.fixture
+def no_pruning(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_CONTEXT_PRUNING_ENABLED", False)
+
+
+def test_instruction_fills_placeholders(no_pruning):
+    instruction = BudgetedInstruction("Topic: {topic}\nPrompt: {user_prompt}", "explanation")
+    assert _render(instruction, {"topic": "x^2", "user_prompt": None}) == "Topic: x^2\nPrompt: "
+
+
+def test_code_with_braces_survives_state_injection(no_pruning):
+    instruction = BudgetedInstruction("Review this code:\n{generated_code}\nTopic: {topic}", "review_comments")
+    state = {"generated_code": CODE_WITH_BRACES, "topic": "fractions {a}/{b}"}
+    assert _render(instruction, state) == f"Review this code:\n{CODE_WITH_BRACES}\nTopic: fractions {{a}}/{{b}}"
+
+
+def test_unescaped_code_would_break_state_injection():
+    with pytest.raises(KeyError, match="Context variable not found"):
+        _adk_inject_session_state(CODE_WITH_BRACES, {})
+
+
+def test_pruned_instruction_keeps_code_and_braces(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_CONTEXT_PRUNING_ENABLED", True)
+    monkeypatch.setattr(settings, "AGENT_STAGE_MAX_CONTEXT_TOKENS", '{"refactored_code": 200}')
+    storyboard = "\n\n".join(f"Step {n}: show {{x}}\n" + "Explain the idea in detail. " * 20 for n in range(10))
+    instruction = BudgetedInstruction("{enhanced_storyboard}\n---\n{generated_code}", "refactored_code")
+    rendered = _render(instruction, {"enhanced_storyboard": storyboard, "generated_code": CODE_WITH_BRACES})
+    assert rendered.endswith(CODE_WITH_BRACES.strip())
+    assert "Step 0: show {x}" in rendered
+    assert estimate_tokens(rendered) < estimate_tokens(storyboard)
+
+
+def test_trim_to_tokens_keeps_titles_longest():
+    text = "\n\n".join(f"Step {n}\nFirst sentence {n}. " + "More detail here. " * 30 for n in range(8))
+    trimmed = trim_to_tokens(text, 120)
+    assert estimate_tokens(trimmed) <= 120
+    assert all(f"Step {n}" in trimmed for n in range(8))
+    assert "First sentence 0." in trimmed
+    assert trim_to_tokens("short", 10) == "short"
+
+
+def test_trim_to_tokens_cuts_off_when_titles_do_not_fit():
+    text = "\n\n".join(f"Step {n} with a rather long title\nBody." for n in range(50))
+    trimmed = trim_to_tokens(text, 40)
+    assert trimmed.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(trimmed) <= 40
+
+
+def test_prune_context_never_trims_code_and_drops_empty_review_sections():
+    code = "x = 1\n\n\n\n" + "y = 2\n" * 200
+    review = "## Errors:\nNone\n\n## Style:\nUse Create instead of ShowCreation."
+    pruned = prune_context({"generated_code": code, "review_comments": review, "storyboard": "Step 1\n" + "text. " * 400}, 300)
+    assert pruned["generated_code"] == "x = 1\n\n" + ("y = 2\n" * 200).strip()
+    assert pruned["review_comments"] == "## Style:\nUse Create instead of ShowCreation."
+    assert pruned["storyboard"].startswith("Step 1")
+    assert estimate_tokens(pruned["storyboard"]) < 400
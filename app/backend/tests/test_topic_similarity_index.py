@@ -0,0 +1,70 @@
+# app/backend/tests/test_topic_similarity_index.py
+import time
+
+import pytest
+
+from app.backend.services.topic_similarity_index import TopicSimilarityIndex
+
+TOPICS = [
+    "The derivative of sin(x) is cos(x)",
+    "Integral of x^2 dx from 0 to 1 equals 1/3",
+    "Pythagorean theorem a^2 + b^2 = c^2 for right triangles",
+    "Euler's identity e^(i*pi) + 1 = 0",
+    "Sum of the first n natural numbers is n(n+1)/2",
+]
+
+
+def _index(capacity: int = 1000) -> TopicSimilarityIndex:
+    index = TopicSimilarityIndex(threshold=0.8, num_perm=64, capacity=capacity)
+    for job_id, topic in enumerate(TOPICS):
+        index.add(topic, "explain simply", job_id)
+    return index
+
+
+@pytest.mark.parametrize("rebuild", [False, True])
+def test_finds_ocr_variants_of_the_same_topic(rebuild):
+    index = _index()
+    if rebuild:
+        index._rebuild()
+        assert index.stats()["pending_unsorted"] == 0
+    # OCR spacing and case vary between uploads of the same formula
+    match = index.find_similar("the derivative of sin (x)  is cos(x)", "Explain  simply")
+    assert match is not None
+    job_id, similarity = match
+    assert job_id == 0 and similarity >= 0.8
+    assert index.find_similar("Integral of x^2 dx from 0 to 1 equals 1/3", "explain simply")[0] == 1
+
+
+def test_different_topic_or_prompt_does_not_match():
+    index = _index()
+    assert index.find_similar("Bayes theorem P(A|B) = P(B|A)P(A)/P(B)", "explain simply") is None
+    assert index.find_similar("The derivative of sin(x) is cos(x)", "explain for experts") is None
+
+
+def test_signature_estimates_jaccard_similarity():
+    index = _index()
+    same = index.signature("Euler's identity e^(i*pi) + 1 = 0")
+    assert (same == index.signature("euler's identity  e^(i*pi)+1=0")).all()
+    unrelated = index.signature("Sum of the first n natural numbers is n(n+1)/2")
+    assert (same == unrelated).mean() < 0.3
+
+
+def test_ring_buffer_overwrites_the_oldest_topic():
+    index = _index(capacity=len(TOPICS))
+    index._rebuild()
+    index.add("Area of a circle is pi r^2", "explain simply", 99)  # overwrites job 0
+    assert index.find_similar("The derivative of sin(x) is cos(x)", "explain simply") is None
+    assert index.find_similar("Area of a circle is pi r^2", "explain simply")[0] == 99
+    assert index.stats()["entries"] == len(TOPICS)
+
+
+def test_forced_rebuild_sorts_the_pending_tail():
+    index = _index()
+    assert index.stats()["pending_unsorted"] == len(TOPICS)
+    index._maybe_start_rebuild(force=True)  # What load_recent_jobs does after filling the index
+    deadline = time.monotonic() + 5
+    while (index._rebuilding or index.stats()["pending_unsorted"]) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.stats()["pending_unsorted"] == 0
+    assert not index._rebuilding
+    assert index.find_similar(TOPICS[4], "explain simply")[0] == 4
@@ -3,6 +3,7 @@ import type {
     AgentWebSocketMessage, 
     WebSocketStatusUpdateMessage, 
     WebSocketPartialResultMessage, 
+    WebSocketStreamDeltaMessage,
     WebSocketFinalResultMessage, 
     WebSocketErrorMessage,
     PartialResultType
@@ -149,6 +150,14 @@ export function useAgentProcessor() {
                             setChatMessages(prev => [...prev, { id: Date.now().toString(), sender: 'agent', text: partial.content, type: 'partial' }]);
                         }
                         break;
+                    case 'stream_delta':
+                        const streamDelta = message as WebSocketStreamDeltaMessage;
+                        if (streamDelta.result_type !== 'refactored_code') {
+                            const resultType = streamDelta.result_type;
+                            // A new stage starts from an empty buffer; the partial_result that follows replaces it
+                            setPartialResults(prev => ({ ...prev, [resultType]: (streamDelta.seq === 0 ? '' : prev[resultType] || '') + streamDelta.delta }));
+                        }
+                        break;
                     case 'final_result':
                         const final = message as WebSocketFinalResultMessage;
                         console.log('Final Result: Video URL:', final.video_url, 'Manim Error:', final.manim_error);
@@ -224,10 +233,13 @@ export function useAgentProcessor() {
         setErrorMessage(null);
 
         try {
-            const response = await fetch(`${API_BASE_URL}${VERSIONED_API_PATH}/agent/jobs`, {
+            // Send the screenshot as a binary body instead of a base64 data URL inside JSON (~33% smaller)
+            const imageBlob = await (await fetch(capturedImageDataUrl)).blob();
+            const uploadParams = new URLSearchParams({ user_prompt: userPrompt });
+            const response = await fetch(`${API_BASE_URL}${VERSIONED_API_PATH}/agent/jobs/upload?${uploadParams}`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json', },
-                body: JSON.stringify({ image_data_url: capturedImageDataUrl, user_prompt: userPrompt }),
+                headers: { 'Content-Type': imageBlob.type || 'image/png', },
+                body: imageBlob,
             });
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({ detail: 'Unknown initiation error.' }));
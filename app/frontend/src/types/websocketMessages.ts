@@ -24,11 +24,35 @@ export interface WebSocketPartialResultMessage extends WebSocketMessageBase {
     content: string;
 }
 
+// Coalesced token deltas of a stage that is still generating. The stage's partial_result
+// (or final_result for refactored_code) carries the authoritative complete value.
+export interface WebSocketStreamDeltaMessage extends WebSocketMessageBase {
+    type: "stream_delta";
+    result_type: PartialResultType | "refactored_code";
+    delta: string;
+    seq: number;
+}
+
+export interface AgentStageMetric {
+    stage: string;
+    attempt: number;
+    output_key?: string | null;
+    model?: string | null;
+    started_at: string;
+    finished_at?: string | null;
+    duration_ms?: number | null;
+    prompt_tokens?: number | null;
+    completion_tokens?: number | null;
+    llm_calls: number;
+    cached: boolean;
+}
+
 export interface WebSocketFinalResultMessage extends WebSocketMessageBase {
     type: "final_result";
     refactored_code?: string | null;
     video_url?: string | null;
     manim_error?: string | null;
+    stage_metrics?: AgentStageMetric[] | null;
     message?: string;
 }
 
@@ -40,5 +64,6 @@ export interface WebSocketErrorMessage extends WebSocketMessageBase {
 export type AgentWebSocketMessage = 
     | WebSocketStatusUpdateMessage 
     | WebSocketPartialResultMessage 
+    | WebSocketStreamDeltaMessage
     | WebSocketFinalResultMessage 
     | WebSocketErrorMessage; 
\ No newline at end of file